@@ -0,0 +1,95 @@
+# app/async_database.py
+"""
+Async database layer on asyncpg, used when settings.database_mode is "async". pgvector columns work
+unchanged, since asyncpg exchanges vectors in the text format the pgvector types produce and parse.
+Background work and routes that call synchronous components keep using database.SessionLocal.
+"""
+from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from . import dependencies, models, schemas
+from .config import settings
+from .database import DB_URL
+from .oauth2 import credentials_exception, verify_token
+from .user_cache import user_cache
+
+ASYNC_DB_URL = DB_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# pgvector types whose values are exchanged as text; halfvec needs pgvector 0.7
+VECTOR_TYPES = ("vector", "halfvec")
+
+async_engine = create_async_engine(
+    ASYNC_DB_URL,
+    pool_size=settings.async_pool_size,
+    max_overflow=settings.async_max_overflow,
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def register_vector_codecs(conn):
+    for type_name in VECTOR_TYPES:
+        try:
+            await conn.set_type_codec(type_name, schema="public", encoder=str, decoder=str, format="text")
+        except ValueError:
+            # the type does not exist in this database
+            pass
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def on_connect(dbapi_connection, connection_record):
+    dbapi_connection.run_async(register_vector_codecs)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_current_user(token: str = Depends(dependencies.oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> schemas.User:
+    """Async counterpart of oauth2.get_current_user, sharing its user cache."""
+    token_data = verify_token(token, credentials_exception())
+    user = user_cache.get(token_data.user_id)
+    if user is not None:
+        return user
+    user = await db.scalar(select(models.User).where(models.User.user_id == token_data.user_id))
+    if user is None:
+        raise credentials_exception()
+    return user_cache.put(user)
+
+
+# User-related database functions, mirroring database.py
+
+async def create_user(db: AsyncSession, user):
+    if await db.scalar(select(models.User.user_id).where(models.User.username == user.username)) is not None:
+        raise HTTPException(status_code=400, detail="Username already exists!")
+    db_user = models.User(**user.model_dump())
+    # bcrypt is deliberately slow, so it runs off the event loop
+    db_user = await run_in_threadpool(dependencies.hash_user_password, db_user)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def modify_user(db: AsyncSession, user_id, user):
+    db_user = await db.scalar(select(models.User).where(models.User.user_id == user_id))
+    if not db_user:
+        raise HTTPException(status_code=404, detail=f"No user found with the ID {user_id}")
+    for k, v in user.model_dump(exclude_unset=True).items():
+        setattr(db_user, k, v)
+    db_user = await run_in_threadpool(dependencies.hash_user_password, db_user)
+    await db.commit()
+    user_cache.invalidate(db_user.user_id)
+    await db.refresh(db_user)
+    return db_user
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(models.User).offset(skip).limit(limit))).all()
+
+async def get_user(db: AsyncSession, user_id: str):
+    db_user = await db.scalar(select(models.User).where(models.User.user_id == user_id))
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
@@ -0,0 +1,162 @@
+# app/chat.py
+import json
+import re
+
+from .chunking import estimate_tokens
+from .config import settings
+from .llm import LLMService, AsyncLLMService
+
+# chatbot configuration keys that are passed through to LLMService
+LLM_CONFIG_KEYS = (
+    "inference_provider",
+    "inference_url",
+    "token",
+    "stream",
+    "temperature",
+    "max_response_tokens",
+    "system_context_allowed",
+    "top_p",
+    "context_window",
+)
+
+# tokens the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# LLMService's default, used when a chatbot does not configure max_response_tokens
+DEFAULT_MAX_RESPONSE_TOKENS = 2000
+
+
+def context_window(chatbot) -> int:
+    """Context window of a chatbot's model, used both for the prompt budget and as ollama's num_ctx."""
+    return (chatbot.configuration or {}).get("context_window") or settings.default_context_window
+
+
+def llm_service_for_chatbot(chatbot, asynchronous: bool = False, **overrides) -> LLMService:
+    """Build an LLMService (or AsyncLLMService) from a chatbot's model name and configuration, ignoring non-LLM configuration keys."""
+    configuration = chatbot.configuration or {}
+    options = {k: v for k, v in configuration.items() if k in LLM_CONFIG_KEYS}
+    options["context_window"] = context_window(chatbot)
+    options.update(overrides)
+    service_class = AsyncLLMService if asynchronous else LLMService
+    return service_class(model_name=chatbot.model_name, **options)
+
+
+def add_context_to_conversation(conversation_history, context_message, use_system_role=False):
+    """Adds the specified context message to the conversation history based on the model's formatting requirements."""
+    if use_system_role:
+        # create a system message that includes the given context message and explains to the system that it should use the context as necessary
+        full_system_prompt = f"You are a helpful assistant. When responding to the user, you should refer to the following context as necessary to help you answer the user's question. \
+            START OF CONTEXT:\n\n{context_message}\n\nEND OF CONTEXT.\n\nIf the context is not necessary to answer the user's question, you should ignore the context. If the context is necessary, \
+            incorporate it into your response in a clear and natural way while still using your own words. In all cases, do not explicitly state that you are using the context."
+        # prepend the system message to the conversation history
+        conversation_history.insert(0, {"role": "system", "content": full_system_prompt})
+    else:
+        # create a user message that includes the given context message
+        full_context_prompt = f"Please respond to my next message by referring to this context. START OF CONTEXT:\n\n{context_message}\n\nEND OF CONTEXT\n\nNow, please respond to my \
+            next message by using that context as necessary. If the context is not necessary, you should ignore the context and answer as normal. Either way, respond without explicitly \
+            mentioning the context."
+        # Add the context message as a user message
+        conversation_history.append({"role": "user", "content": full_context_prompt})
+
+
+def summary_message(summary: str, system_context_allowed=False) -> dict:
+    """The message that gives the model the summary of the earlier part of the conversation."""
+    return {
+        "role": "system" if system_context_allowed else "user",
+        "content": f"Summary of the earlier part of this conversation, for reference:\n\n{summary}",
+    }
+
+
+def build_prompt(history, user_message_text, context_chunks, system_context_allowed=False, summary=None):
+    """
+    The chat messages ("role" and "content") for one turn: the summary, the history, the context chunks
+    wrapped in instructions, and the user's message.
+    """
+    prompt = [{"role": message["role"], "content": message["message_text"]} for message in history]
+    if summary:
+        prompt.insert(0, summary_message(summary, system_context_allowed))
+    context_message = "\n\n".join(chunk["chunk_text"] for chunk in context_chunks)
+    if context_message:
+        add_context_to_conversation(prompt, context_message, use_system_role=system_context_allowed)
+    elif system_context_allowed:
+        prompt.insert(0, {"role": "system", "content": "You are a helpful assistant."})
+    prompt.append({"role": "user", "content": user_message_text})
+    return prompt
+
+
+def message_tokens(text: str) -> int:
+    """Fast estimate of the tokens a chat message takes up in the prompt."""
+    return estimate_tokens([text])[0] + MESSAGE_OVERHEAD_TOKENS
+
+
+def prompt_token_budget(chatbot) -> int:
+    """Prompt tokens for a chatbot: its context window less the estimate margin and the response tokens, capped by prompt_token_budget."""
+    configuration = chatbot.configuration or {}
+    usable_window = int(context_window(chatbot) * (1 - settings.prompt_token_margin))
+    budget = usable_window - (configuration.get("max_response_tokens") or DEFAULT_MAX_RESPONSE_TOKENS)
+    cap = configuration.get("prompt_token_budget") or settings.prompt_token_budget
+    if cap:
+        budget = min(budget, cap)
+    return max(budget, 0)
+
+
+def assemble_prompt(history, user_message_text, context_chunks, token_budget: int, system_context_allowed=False, summary=None):
+    """
+    Build the prompt for one turn within token_budget, filled by priority: the system prompt and user message,
+    then context chunks in retrieval order, the summary, and as many recent history messages as fit.
+    Returns the prompt and a report of the estimated tokens and what was dropped.
+    """
+    # the instructions wrapped around the context are paid for once, by the first chunk that is included
+    wrapper = []
+    add_context_to_conversation(wrapper, "", use_system_role=system_context_allowed)
+    context_overhead = message_tokens(wrapper[0]["content"])
+    used = message_tokens(user_message_text)
+    if system_context_allowed:
+        used += message_tokens("You are a helpful assistant.")
+        context_overhead -= message_tokens("You are a helpful assistant.")
+
+    kept_chunks = []
+    for chunk in context_chunks:
+        cost = estimate_tokens([chunk["chunk_text"]])[0] + (max(context_overhead, 0) if not kept_chunks else 1)
+        if used + cost <= token_budget:
+            kept_chunks.append(chunk)
+            used += cost
+
+    if summary:
+        cost = message_tokens(summary_message(summary, system_context_allowed)["content"])
+        if used + cost <= token_budget:
+            used += cost
+        else:
+            summary = None
+
+    kept_history = []
+    for message in reversed(history):
+        cost = message_tokens(message["message_text"])
+        if used + cost > token_budget:
+            break
+        kept_history.append(message)
+        used += cost
+    kept_history.reverse()
+
+    report = {
+        "token_budget": token_budget,
+        "estimated_tokens": used,
+        "context_chunks": len(kept_chunks),
+        "dropped_context_chunks": len(context_chunks) - len(kept_chunks),
+        "dropped_chunk_ids": [chunk.get("chunk_id") for chunk in context_chunks if chunk not in kept_chunks],
+        "history_messages": len(kept_history),
+        "dropped_history_messages": len(history) - len(kept_history),
+        "summary": bool(summary),
+        "over_budget": used > token_budget,
+    }
+    return build_prompt(kept_history, user_message_text, kept_chunks, system_context_allowed, summary=summary), report
+
+
+def answer_pieces(text: str) -> list[str]:
+    """Splits a stored answer into word-sized pieces so it can be streamed like a generated one."""
+    return re.findall(r"\s*\S+\s*", text) or [text]
+
+
+def sse_event(event: str, data) -> str:
+    """Formats a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,172 @@
+# app/chunking.py
+import re
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+
+from .config import settings
+
+# Fallback sentence splitter: break at whitespace after ., ! or ? (or one closing quote/bracket after them),
+# or after the full-width 。！？ (and any closing quote) which CJK text does not follow with a space
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["\')\]])\s+|(?<=[。！？])(?![」』）"\')\]])\s*|(?<=[。！？][」』）])\s*')
+_WHITESPACE = re.compile(r"\s+")
+
+_splitter: Optional[Callable[[str], list[str]]] = None
+_splitter_lock = threading.Lock()
+
+
+def regex_split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+
+def get_sentence_splitter() -> Callable[[str], list[str]]:
+    """
+    Return the sentence splitter, loading it on first use. NLTK punkt is used when its data is already installed;
+    it is never downloaded at request time. Otherwise a regex splitter is used.
+    """
+    global _splitter
+    if _splitter is not None:
+        return _splitter
+    with _splitter_lock:
+        if _splitter is None:
+            try:
+                import nltk
+                from nltk.tokenize import sent_tokenize
+                try:
+                    nltk.data.find('tokenizers/punkt_tab')
+                except LookupError:
+                    nltk.data.find('tokenizers/punkt')
+                sent_tokenize("Warm up the tokenizer. It is loaded lazily.")
+                _splitter = sent_tokenize
+            except Exception:
+                _splitter = regex_split_sentences
+    return _splitter
+
+
+def estimate_tokens(texts: list[str]) -> list[int]:
+    """
+    Cheap token estimate used when no tokenizer is available: about four ASCII characters per token, and one
+    token per other character, since CJK and other non-Latin scripts take a token or more per character.
+    """
+    counts = []
+    for t in texts:
+        ascii_chars = len(t.encode("ascii", "ignore"))
+        counts.append(ascii_chars // 4 + (len(t) - ascii_chars) + 1)
+    return counts
+
+
+def model_token_counter(model_name: str = None) -> tuple[Callable[[list[str]], list[int]], int]:
+    """
+    Return a batch token counter for the embedding model and the number of tokens the model accepts per input.
+    Falls back to estimate_tokens and a 384 token budget if the model cannot be loaded.
+    """
+    try:
+        from .embeddings import registry
+        model = registry.get(model_name)
+        tokenizer = model.tokenizer
+        # leave room for the special tokens the model adds around every input
+        max_tokens = model.max_seq_length - 2
+
+        def count(texts: list[str]) -> list[int]:
+            return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+        return count, max_tokens
+    except Exception as e:
+        print(f"Error loading the embedding tokenizer, estimating token counts instead: {e}")
+        return estimate_tokens, 384
+
+
+def _split_long_sentence(sentence: str, tokens: int, max_tokens: int, max_chars: int) -> list[str]:
+    """
+    Split a sentence that is over the token budget into pieces that should fit, estimating tokens per character.
+    Pieces break between words; a word that is over the budget on its own (a URL, an encoded blob, or text
+    written without spaces) is cut into character runs.
+    """
+    chars_per_token = len(sentence) / max(tokens, 1)
+    piece_chars = max(min(int((max_tokens - 1) * chars_per_token), max_chars), 1)
+    pieces = []
+    current = ""
+    for word in sentence.split():
+        while len(word) > piece_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:piece_chars])
+            word = word[piece_chars:]
+        if current and len(current) + 1 + len(word) > piece_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_to_budget(sentence: str, tokens: int, max_tokens: int, max_chars: int,
+                     token_counter: Callable[[list[str]], list[int]]) -> list[tuple[str, int]]:
+    """Split an over-budget sentence and recount the pieces, splitting again any piece the counter still finds too long."""
+    pieces = _split_long_sentence(sentence, tokens, max_tokens, max_chars)
+    result = []
+    for piece, piece_tokens in zip(pieces, token_counter(pieces)):
+        if piece_tokens > max_tokens and len(piece) > 1:
+            result.extend(_split_to_budget(piece, piece_tokens, max_tokens, max_chars, token_counter))
+        else:
+            result.append((piece, piece_tokens))
+    return result
+
+
+def iter_chunks(segments: Iterable, max_tokens: int = None, max_chars: int = None, overlap_sentences: int = None,
+                token_counter: Callable[[list[str]], list[int]] = None) -> Iterator[tuple[str, dict]]:
+    """
+    Pack sentences from strings or (text, metadata) segments into chunks of at most max_tokens and max_chars,
+    repeating the last overlap_sentences sentences between chunks. Segment "page" metadata becomes
+    page_start and page_end on the chunks. Budgets default to the settings and the embedding model's limit.
+    """
+    if token_counter is None:
+        token_counter, model_max_tokens = model_token_counter()
+        max_tokens = max_tokens or settings.chunk_max_tokens or model_max_tokens
+    max_tokens = max_tokens or settings.chunk_max_tokens or 384
+    max_chars = max_chars or settings.chunk_size
+    overlap_sentences = settings.chunk_overlap_sentences if overlap_sentences is None else overlap_sentences
+    split_sentences = get_sentence_splitter()
+
+    # each entry is (sentence, tokens, page)
+    current = []
+    current_tokens = 0
+    current_chars = 0
+
+    def emit():
+        chunk_metadata = {}
+        pages = [page for _, _, page in current if page is not None]
+        if pages:
+            chunk_metadata = {"page_start": min(pages), "page_end": max(pages)}
+        return " ".join(sentence for sentence, _, _ in current), chunk_metadata
+
+    for segment in segments:
+        segment_text, segment_metadata = segment if isinstance(segment, tuple) else (segment, None)
+        page = (segment_metadata or {}).get("page")
+        sentences = [_WHITESPACE.sub(" ", s).strip() for s in split_sentences(segment_text)]
+        sentences = [s for s in sentences if s]
+        if not sentences:
+            continue
+        for sentence, tokens in zip(sentences, token_counter(sentences)):
+            if tokens > max_tokens or len(sentence) > max_chars:
+                pieces = _split_to_budget(sentence, tokens, max_tokens, max_chars, token_counter)
+            else:
+                pieces = [(sentence, tokens)]
+            for piece, piece_tokens in pieces:
+                if current and (current_tokens + piece_tokens > max_tokens or current_chars + len(piece) > max_chars):
+                    yield emit()
+                    current = current[-overlap_sentences:] if overlap_sentences else []
+                    # drop overlap that would not leave room for the next sentence
+                    while current and (sum(t for _, t, _ in current) + piece_tokens > max_tokens
+                                       or sum(len(s) + 1 for s, _, _ in current) + len(piece) > max_chars):
+                        current.pop(0)
+                    current_tokens = sum(t for _, t, _ in current)
+                    current_chars = sum(len(s) + 1 for s, _, _ in current)
+                current.append((piece, piece_tokens, page))
+                current_tokens += piece_tokens
+                current_chars += len(piece) + 1
+
+    if current:
+        yield emit()
@@ -10,18 +10,81 @@ class Settings(BaseSettings):
     db_port: str
     db_name: str
     db_username: str
+    database_mode: str = "sync" # "sync" or "async"; async serves the database-only routes on asyncpg
+    async_pool_size: int = 20
+    async_max_overflow: int = 40
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 60.0 # how long other processes may serve a user after it changes
     domains: Set[str] = set()
     hf_token: str
     default_hf_model: str
     inference_provider: str
     default_ollama_model: str
     inference_url: str
+    llm_client_cache_size: int = 32 # provider clients kept open, one per provider, host, model and token
     chunk_size: int
+    chunk_max_tokens: int = 0 # 0 uses the embedding model's max_seq_length
+    chunk_overlap_sentences: int = 1
     num_context_chunks: int
+    default_context_window: int = 4096
+    prompt_token_budget: int = 0 # 0 fills the context window minus the response tokens
+    prompt_token_margin: float = 0.1 # share of the context window left unused to absorb token estimate errors
+    conversation_memory_enabled: bool = True # chatbots can opt out with the "conversation_memory" configuration key
+    summary_trigger_messages: int = 24 # unsummarized messages that trigger a new summary
+    summary_keep_recent_messages: int = 8 # most recent messages left out of the summary
+    summary_max_words: int = 250
+    message_page_size: int = 50
+    max_page_size: int = 200
+    context_similarity_threshold: float = 0.4
+    retrieval_mode: str = "hybrid" # "hybrid" or "vector"
+    hybrid_vector_weight: float = 1.0
+    hybrid_lexical_weight: float = 1.0
+    hybrid_candidates: int = 20 # candidates taken from each ranking before fusion
+    rrf_k: int = 60
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_enabled: bool = False # chatbots opt in with the "rerank" configuration key
+    preload_rerank_model: bool = False
+    rerank_candidates: int = 20
+    rerank_budget_ms: float = 200.0
+    rerank_batch_size: int = 32
+    rerank_workers: int = 1
+    response_cache_enabled: bool = False # chatbots opt in with the "response_cache" configuration key
+    response_cache_similarity: float = 0.95
+    response_cache_ttl_seconds: float = 24 * 3600
+    response_cache_size: int = 5000
+    response_cache_first_turn_only: bool = True
+    embedding_model: str = "all-mpnet-base-v2"
+    preload_embedding_model: bool = True
+    embedding_batch_size: int = 32
+    embedding_cache_size: int = 10000
+    embedding_cache_persistent: bool = True
+    embed_max_texts: int = 256 # per /documents/embed request
+    embed_max_text_chars: int = 20000
+    run_migrations_on_startup: bool = True
+    vector_index_type: str = "hnsw" # "hnsw", "ivfflat", "all" or "none"
+    manage_vector_indexes: bool = True
+    embedding_quantization: str = "none" # "none", "halfvec" or "binary"; the coarse search representation
+    quantization_rerank_factor: int = 4
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+    vector_iterative_scan: str = "relaxed_order" # "off", "relaxed_order" or "strict_order"; needs pgvector 0.8
+    ivfflat_lists: int = 100
+    ivfflat_probes: int = 10
     app_dir: str = os.path.dirname(os.path.abspath(__file__))
+    pdf_extract_processes: int = 4
+    pdf_pages_per_task: int = 25
+    ingest_spool_dir: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool")
+    ingest_workers: int = 2
+    upload_block_size: int = 1024 * 1024
+    upload_max_bytes: int = 512 * 1024 * 1024
+    ingest_max_jobs_per_user: int = 1
+    ingest_max_attempts: int = 3
+    ingest_poll_seconds: float = 2.0
+    ingest_job_stale_seconds: int = 300
 
     model_config: SettingsConfigDict = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
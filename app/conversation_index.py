@@ -0,0 +1,90 @@
+# app/conversation_index.py
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .rag_utils import chunk_text, texts_to_embeddings
+from .response_cache import invalidate_knowledge_base
+
+ROLE_CONTEXTS = {
+    "user": "The following is a statement made by the user during a conversation with you, the assistant: ",
+    "assistant": "The following is a statement made by you, the assistant, during a conversation with the user: ",
+    "system": "The following is information that you should incorporate as part of your background knowledge only if it is relevant to the conversation: ",
+}
+
+
+def conversation_document_id(conversation_id) -> uuid.UUID:
+    """The knowledge base document that stores a remembered conversation has an ID derived from the conversation ID."""
+    return uuid.uuid5(uuid.NAMESPACE_URL, str(conversation_id))
+
+
+def index_remembered_conversation(db: Session, conversation_id) -> int:
+    """
+    Add the not yet indexed messages of a remembered conversation to the chatbot's knowledge base and commit,
+    so each call costs in proportion to the new messages. Messages locked by a concurrent call are skipped.
+    Returns the number of messages indexed.
+    """
+    conversation = db.query(models.Conversation).filter(models.Conversation.conversation_id == conversation_id).first()
+    if conversation is None:
+        return 0
+    messages = (
+        db.query(models.Message)
+        .filter(models.Message.conversation_id == conversation.conversation_id)
+        .filter(models.Message.indexed_at.is_(None))
+        .order_by(models.Message.timestamp, models.Message.message_id)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not messages:
+        db.rollback()
+        return 0
+
+    document_id = conversation_document_id(conversation.conversation_id)
+    db.execute(
+        insert(models.KnowledgeBaseDocument)
+        .values(
+            document_id=document_id,
+            chatbot_id=conversation.chatbot_id,
+            file_name=f"conversation_{str(conversation.conversation_id)[-6:]}",
+            context=conversation.description,
+            created_at=conversation.start_time,
+        )
+        .on_conflict_do_nothing(index_elements=[models.KnowledgeBaseDocument.document_id])
+    )
+
+    chunk_texts = []
+    chunk_metadatas = []
+    for message in messages:
+        for c in chunk_text(message.message_text):
+            chunk_texts.append(c)
+            chunk_metadatas.append({"context": ROLE_CONTEXTS.get(message.role, ""), "message_id": str(message.message_id)})
+    if chunk_texts:
+        embeddings = texts_to_embeddings(chunk_texts, db=db)
+        db.execute(insert(models.DocumentChunk).values([
+            {
+                "chunk_id": uuid.uuid4(),
+                "document_id": document_id,
+                "chatbot_id": conversation.chatbot_id,
+                "chunk_text": c,
+                "chunk_metadata": chunk_metadata,
+                "chunk_embedding": embedding.tolist(),
+            }
+            for c, chunk_metadata, embedding in zip(chunk_texts, chunk_metadatas, embeddings)
+        ]))
+
+    # append the new messages to the document text instead of rewriting it
+    new_text = "\n\n".join([message.role+": "+message.message_text for message in messages])
+    db.query(models.KnowledgeBaseDocument).filter(models.KnowledgeBaseDocument.document_id == document_id).update(
+        {models.KnowledgeBaseDocument.raw_text: func.coalesce(models.KnowledgeBaseDocument.raw_text + "\n\n", "") + new_text},
+        synchronize_session=False,
+    )
+    indexed_at = datetime.now(timezone.utc)
+    for message in messages:
+        message.indexed_at = indexed_at
+    invalidate_knowledge_base(db, conversation.chatbot_id)
+    db.commit()
+    return len(messages)
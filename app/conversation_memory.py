@@ -0,0 +1,157 @@
+# app/conversation_memory.py
+"""
+Rolling summaries of long conversations.
+
+Older messages are folded into a summary stored on the conversation row, together with the last message it
+covers, so chat turns prompt with the summary plus only the messages after it.
+"""
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+from .chat import llm_service_for_chatbot, message_tokens, prompt_token_budget
+from .config import settings
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a conversation between a user and an assistant. "
+    "Rewrite the summary so it also covers the new messages. Keep names, facts, decisions, open questions "
+    "and the user's preferences; drop small talk. Write at most {max_words} words of plain prose and "
+    "reply with the summary only."
+)
+
+# conversations being summarized by this process
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+
+def memory_enabled_for(chatbot: models.Chatbot) -> bool:
+    return bool((chatbot.configuration or {}).get("conversation_memory", settings.conversation_memory_enabled))
+
+
+def unsummarized_messages_query(db: Session, conversation: models.Conversation):
+    """Messages of a conversation that come after the last message covered by its summary, oldest first."""
+    query = db.query(models.Message).filter(models.Message.conversation_id == conversation.conversation_id)
+    if conversation.summary_message_id is not None:
+        query = query.filter(
+            tuple_(models.Message.timestamp, models.Message.message_id)
+            > tuple_(conversation.summary_timestamp, conversation.summary_message_id)
+        )
+    return query.order_by(models.Message.timestamp, models.Message.message_id)
+
+
+def transcript_line(message: models.Message) -> str:
+    return f"{message.role}: {message.message_text}"
+
+
+def build_summary_prompt(previous_summary: Optional[str], messages: list[models.Message], transcript: str = None) -> list[dict]:
+    if transcript is None:
+        transcript = "\n\n".join(transcript_line(message) for message in messages)
+    return [
+        {"role": "user", "content": (
+            SUMMARY_INSTRUCTIONS.format(max_words=settings.summary_max_words)
+            + f"\n\nCURRENT SUMMARY:\n{previous_summary or '(none yet)'}"
+            + f"\n\nNEW MESSAGES:\n{transcript}"
+        )},
+    ]
+
+
+def next_summary_batch(previous_summary: Optional[str], messages: list[models.Message], token_budget: int) -> tuple[list[models.Message], str]:
+    """
+    The oldest messages (at least one, clipped if it alone is too long) whose transcript fits the token budget
+    with the previous summary, and that transcript.
+    """
+    available = token_budget - message_tokens(build_summary_prompt(previous_summary, [], transcript="")[0]["content"])
+    batch, lines, used = [], [], 0
+    for message in messages:
+        line = transcript_line(message)
+        tokens = message_tokens(line)
+        if batch and used + tokens > available:
+            break
+        if tokens > available:
+            line = line[:len(line) * max(available, 0) // tokens]
+        batch.append(message)
+        lines.append(line)
+        used += tokens
+    return batch, "\n\n".join(lines)
+
+
+def summarize_conversation(db: Session, conversation_id) -> bool:
+    """
+    Fold older unsummarized messages into the conversation's summary in budget-sized batches, committing after
+    each. LLM calls hold no locks, and a summary is only saved if no concurrent call has moved it on.
+    Returns whether the summary was updated.
+    """
+    conversation = (
+        db.query(models.Conversation)
+        .options(joinedload(models.Conversation.chatbot).undefer(models.Chatbot.configuration))
+        .filter(models.Conversation.conversation_id == conversation_id)
+        .first()
+    )
+    if conversation is None or not memory_enabled_for(conversation.chatbot):
+        return False
+    messages = unsummarized_messages_query(db, conversation).all()
+    if len(messages) <= settings.summary_trigger_messages:
+        return False
+    to_summarize = messages[:len(messages) - settings.summary_keep_recent_messages]
+    summary = conversation.summary
+    previous_message_id = conversation.summary_message_id
+    max_response_tokens = settings.summary_max_words * 2
+    token_budget = prompt_token_budget(conversation.chatbot)
+    service = llm_service_for_chatbot(conversation.chatbot, stream=False, max_response_tokens=max_response_tokens)
+
+    summarized = False
+    while to_summarize:
+        batch, transcript = next_summary_batch(summary, to_summarize, token_budget)
+        covered_until = batch[-1]
+        new_summary = service.generate_text(build_summary_prompt(summary, batch, transcript=transcript))
+        if not new_summary:
+            print(f"Error summarizing conversation {conversation_id}: the model returned no summary")
+            return summarized
+
+        updated = (
+            db.query(models.Conversation)
+            .filter(models.Conversation.conversation_id == conversation.conversation_id)
+            .filter(
+                models.Conversation.summary_message_id.is_(None) if previous_message_id is None
+                else models.Conversation.summary_message_id == previous_message_id
+            )
+            .update({
+                models.Conversation.summary: new_summary.strip(),
+                models.Conversation.summary_message_id: covered_until.message_id,
+                models.Conversation.summary_timestamp: covered_until.timestamp,
+                models.Conversation.summary_updated_at: datetime.now(timezone.utc),
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if updated != 1:
+            return summarized
+        summarized = True
+        summary = new_summary.strip()
+        previous_message_id = covered_until.message_id
+        to_summarize = to_summarize[len(batch):]
+    return summarized
+
+
+def summarize_conversation_task(conversation_id):
+    """Background task: summarize a conversation with its own session, skipping it if this process is already on it."""
+    from .database import SessionLocal
+
+    key = str(conversation_id)
+    with _in_progress_lock:
+        if key in _in_progress:
+            return
+        _in_progress.add(key)
+    db = SessionLocal()
+    try:
+        summarize_conversation(db, conversation_id)
+    except Exception as e:
+        db.rollback()
+        print(f"Error summarizing conversation {conversation_id}: {e}")
+    finally:
+        db.close()
+        with _in_progress_lock:
+            _in_progress.discard(key)
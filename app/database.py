@@ -1,10 +1,14 @@
 import sqlalchemy
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timezone
+import uuid
 from dotenv import load_dotenv
 from fastapi import HTTPException
 import os
 from . import models, dependencies
 from .config import settings
+from .user_cache import user_cache
 
 load_dotenv()
 db_hostname = os.getenv("db_hostname")
@@ -53,6 +57,7 @@ def modify_user(db: Session, user_id: str, user):
         setattr(db_user, k, v)
     db_user = dependencies.hash_user_password(db_user)
     db.commit()
+    user_cache.invalidate(db_user.user_id)
     db.refresh(db_user)
     return db_user
 
@@ -63,4 +68,64 @@ def get_user(db: Session, user_id: str):
     db_user = db.query(models.User).filter(models.User.user_id == user_id).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return db_user
\ No newline at end of file
+    return db_user
+
+# Conversation-related database functions
+def append_messages_statement(conversation_id, messages: list[dict], **conversation_values):
+    """
+    Build a single bulk INSERT of messages that also bumps the conversation's last_modified (and any other
+    given conversation columns) through a CTE in the same statement.
+
+    Args:
+        conversation_id: ID of the conversation the messages belong to.
+        messages (list[dict]): Messages with "role", "message_text" and optionally "message_id" and "timestamp".
+        **conversation_values: Extra conversation columns to update, e.g. description or is_remembered.
+
+    Returns:
+        Insert: The statement, returning the inserted message rows, or None if there are no messages.
+    """
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "message_id": message.get("message_id") or uuid.uuid4(),
+            "conversation_id": conversation_id,
+            "role": message["role"],
+            "message_text": message["message_text"],
+            "timestamp": message.get("timestamp") or now,
+        }
+        for message in messages
+    ]
+    if not rows:
+        return None
+    conversation_values["last_modified"] = max(row["timestamp"] for row in rows)
+    bump_conversation = (
+        sqlalchemy.update(models.Conversation)
+        .where(models.Conversation.conversation_id == conversation_id)
+        .values(**conversation_values)
+        .cte("bump_conversation")
+    )
+    return (
+        insert(models.Message)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[models.Message.message_id])
+        .returning(models.Message.message_id, models.Message.conversation_id, models.Message.role, models.Message.message_text, models.Message.timestamp)
+        .add_cte(bump_conversation)
+    )
+
+def append_messages(db: Session, conversation_id, messages: list[dict], **conversation_values):
+    """
+    Append messages to a conversation in one statement; see append_messages_statement.
+
+    Args:
+        db (Session): Database session. The caller is responsible for committing.
+        conversation_id: ID of the conversation the messages belong to.
+        messages (list[dict]): Messages with "role", "message_text" and optionally "message_id" and "timestamp".
+        **conversation_values: Extra conversation columns to update, e.g. description or is_remembered.
+
+    Returns:
+        list: The inserted message rows.
+    """
+    statement = append_messages_statement(conversation_id, messages, **conversation_values)
+    if statement is None:
+        return []
+    return db.execute(statement).all()
@@ -0,0 +1,130 @@
+# app/embedding_cache.py
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different copies of a text share a cache key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by (model name, SHA-256 of the normalized text): a bounded in-process LRU, backed by
+    the embeddingcache table when a database session is given.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_memory(self, key) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+            return embedding
+
+    def _put_memory(self, key, embedding: np.ndarray):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, model_name: str, texts: list[str], compute: Callable[[list[str]], np.ndarray], db: Optional[Session] = None) -> np.ndarray:
+        """Embeddings for texts in order, calling compute once with only the texts missing from both tiers."""
+        hashes = [content_hash(t) for t in texts]
+        found = {}
+        for h in set(hashes):
+            embedding = self._get_memory((model_name, h))
+            if embedding is not None:
+                found[h] = embedding
+        with self._lock:
+            self.memory_hits += sum(1 for h in hashes if h in found)
+
+        missing = [h for h in dict.fromkeys(hashes) if h not in found]
+        if missing and db is not None and settings.embedding_cache_persistent:
+            rows = (
+                db.query(models.EmbeddingCacheEntry.content_hash, models.EmbeddingCacheEntry.embedding)
+                .filter(models.EmbeddingCacheEntry.model_name == model_name)
+                .filter(models.EmbeddingCacheEntry.content_hash.in_(missing))
+                .all()
+            )
+            for row in rows:
+                embedding = np.asarray(row.embedding, dtype=np.float32)
+                found[row.content_hash] = embedding
+                self._put_memory((model_name, row.content_hash), embedding)
+            loaded = {row.content_hash for row in rows}
+            with self._lock:
+                self.persistent_hits += sum(1 for h in hashes if h in loaded)
+            missing = [h for h in missing if h not in found]
+
+        if missing:
+            missing_set = set(missing)
+            with self._lock:
+                self.misses += sum(1 for h in hashes if h in missing_set)
+            text_by_hash = dict(zip(hashes, texts))
+            computed = compute([text_by_hash[h] for h in missing])
+            for h, embedding in zip(missing, computed):
+                found[h] = embedding
+                self._put_memory((model_name, h), embedding)
+            if db is not None and settings.embedding_cache_persistent:
+                self._put_persistent(db, model_name, missing, computed)
+
+        return np.stack([found[h] for h in hashes]).astype(np.float32, copy=False)
+
+    def _put_persistent(self, db: Session, model_name: str, hashes: list[str], embeddings: np.ndarray):
+        """Write to the embeddingcache table in a separate session, leaving the caller's transaction alone."""
+        statement = insert(models.EmbeddingCacheEntry).values([
+            {"model_name": model_name, "content_hash": h, "embedding": embedding.tolist()}
+            for h, embedding in zip(hashes, embeddings)
+        ]).on_conflict_do_nothing()
+        with Session(db.get_bind()) as cache_db:
+            try:
+                cache_db.execute(statement)
+                cache_db.commit()
+            except Exception as e:
+                cache_db.rollback()
+                print(f"Error writing embeddings to the persistent cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "memory_entries": len(self._entries),
+                "max_memory_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+embedding_cache = EmbeddingCache(settings.embedding_cache_size)
@@ -0,0 +1,176 @@
+# app/embedding_transport.py
+"""
+Content negotiation for endpoints that return embeddings.
+
+Clients pick the encoding with the Accept header:
+
+    application/json                          embeddings as lists of floats (default)
+    application/vnd.veevee.base64+json        embeddings as base64 strings of little-endian float32
+    application/x-npy                         the embedding matrix as a .npy file (embedding-only endpoints)
+    application/msgpack                       msgpack, embeddings as raw little-endian float32 bytes
+
+Request bodies may carry embeddings either as lists of floats or as base64 strings; see decode_embedding.
+"""
+import base64
+import io
+import json
+from typing import Optional, Union
+
+import numpy as np
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+
+JSON = "application/json"
+BASE64_JSON = "application/vnd.veevee.base64+json"
+NPY = "application/x-npy"
+MSGPACK = "application/msgpack"
+
+MEDIA_TYPES = (JSON, BASE64_JSON, NPY, MSGPACK)
+
+# dimension of the chunk_embedding column (models.DocumentChunk)
+EMBEDDING_DIMENSION = 768
+
+# float32, little-endian, regardless of the server's byte order
+DTYPE = np.dtype("<f4")
+
+
+def negotiate(accept: Optional[str], supported=MEDIA_TYPES) -> str:
+    """
+    Choose the response media type from an Accept header, honoring q-values. Defaults to JSON.
+
+    Raises:
+        HTTPException: 406 if the header only lists media types that are not supported.
+    """
+    if not accept:
+        return JSON
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.lower().split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type == "application/x-msgpack":
+            media_type = MSGPACK
+        if q > 0:
+            candidates.append((-q, position, media_type))
+    for _, _, media_type in sorted(candidates):
+        if media_type in supported:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON
+    raise HTTPException(
+        status_code=status.HTTP_406_NOT_ACCEPTABLE,
+        detail=f"Supported media types: {', '.join(supported)}",
+    )
+
+
+def as_matrix(embeddings) -> np.ndarray:
+    """Stack embeddings (arrays, lists or pgvector values) into a contiguous little-endian float32 matrix."""
+    if len(embeddings) == 0:
+        return np.empty((0, 0), dtype=DTYPE)
+    return np.ascontiguousarray(np.asarray(embeddings, dtype=DTYPE))
+
+
+def encode_base64(embedding) -> str:
+    return base64.b64encode(np.asarray(embedding, dtype=DTYPE).tobytes()).decode("ascii")
+
+
+def decode_embedding(value: Union[str, bytes, list, np.ndarray, None]) -> Optional[np.ndarray]:
+    """
+    Decode an embedding received in a request body. Accepts a list of floats, a base64 string of
+    little-endian float32 values, or raw float32 bytes.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = base64.b64decode(value, validate=True)
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype=DTYPE).astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def validate_embedding(value: Union[str, list]) -> Union[str, list]:
+    """
+    Check that an embedding from a request body decodes to EMBEDDING_DIMENSION finite floats. Used as a pydantic
+    validator on schemas.Embedding, which accepts lists unvalidated so they are converted in one numpy call
+    rather than item by item; malformed base64, non-numeric items or a wrong dimension are rejected with a 422.
+    """
+    try:
+        decoded = decode_embedding(value)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid embedding: {e}")
+    if decoded.shape != (EMBEDDING_DIMENSION,):
+        raise ValueError(f"Embeddings must have {EMBEDDING_DIMENSION} dimensions, got {decoded.size}")
+    # null items convert to NaN, which pgvector rejects
+    if not np.isfinite(decoded).all():
+        raise ValueError("Embeddings must only contain finite numbers")
+    return value
+
+
+def _msgpack_response(content, headers: dict = None) -> Response:
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="msgpack is not installed on the server")
+    return Response(content=msgpack.packb(content, use_bin_type=True), media_type=MSGPACK, headers=headers)
+
+
+def _json_response(content, media_type: str, headers: dict = None) -> Response:
+    return Response(content=json.dumps(content, separators=(",", ":")), media_type=media_type, headers=headers)
+
+
+def _npy_response(matrix: np.ndarray, headers: dict = None) -> Response:
+    buffer = io.BytesIO()
+    np.save(buffer, matrix, allow_pickle=False)
+    return Response(content=buffer.getvalue(), media_type=NPY, headers=headers)
+
+
+def embeddings_response(media_type: str, model_name: str, embeddings) -> Response:
+    """
+    Encode an embedding matrix. JSON responses have the shape of schemas.EmbedResponse;
+    .npy responses carry the model name in the X-Embedding-Model header.
+    """
+    matrix = as_matrix(embeddings)
+    headers = {"Vary": "Accept", "X-Embedding-Model": model_name}
+    if media_type == NPY:
+        return _npy_response(matrix, headers)
+    if media_type == MSGPACK:
+        return _msgpack_response(
+            {"model_name": model_name, "dtype": DTYPE.str, "shape": list(matrix.shape), "embeddings": matrix.tobytes()},
+            headers,
+        )
+    if media_type == BASE64_JSON:
+        return _json_response({"model_name": model_name, "embeddings": [encode_base64(e) for e in matrix]}, media_type, headers)
+    return _json_response({"model_name": model_name, "embeddings": matrix.tolist()}, media_type, headers)
+
+
+def chunks_response(media_type: str, chunks: list[dict]) -> Response:
+    """
+    Encode a list of chunks shaped like schemas.DocumentChunk, whose chunk_embedding may be any array-like.
+    .npy cannot carry the chunk text, so it is only offered for embedding-only endpoints.
+    """
+    if media_type == NPY:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Supported media types: {', '.join(t for t in MEDIA_TYPES if t != NPY)}",
+        )
+
+    def encode(chunk, embedding_encoder):
+        return {
+            "chunk_id": str(chunk["chunk_id"]),
+            "document_id": str(chunk["document_id"]),
+            "chunk_text": chunk["chunk_text"],
+            "chunk_metadata": chunk.get("chunk_metadata"),
+            "chunk_embedding": embedding_encoder(chunk["chunk_embedding"]),
+        }
+
+    headers = {"Vary": "Accept"}
+    if media_type == MSGPACK:
+        return _msgpack_response([encode(c, lambda e: np.asarray(e, dtype=DTYPE).tobytes()) for c in chunks], headers)
+    if media_type == BASE64_JSON:
+        return _json_response([encode(c, encode_base64) for c in chunks], media_type, headers)
+    return _json_response([encode(c, lambda e: np.asarray(e, dtype=np.float32).tolist()) for c in chunks], media_type, headers)
@@ -0,0 +1,107 @@
+# app/embeddings.py
+import threading
+import time
+from typing import Dict, Optional
+
+from .config import settings
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of sentence-transformers models. Each model is loaded at most once, under a per-model
+    lock so concurrent requests for a cold model wait for a single load, and kept warm for the process lifetime.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, object] = {}
+        self._stats: Dict[str, dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _model_lock(self, model_name: str) -> threading.Lock:
+        with self._registry_lock:
+            if model_name not in self._locks:
+                self._locks[model_name] = threading.Lock()
+            return self._locks[model_name]
+
+    def get(self, model_name: Optional[str] = None):
+        """Return the warm model with the given name (default settings.embedding_model), loading it on first use."""
+        model_name = model_name or self.default_model_name()
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._model_lock(model_name):
+            # another thread may have finished loading while we waited on the lock
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._load(model_name)
+        return model
+
+    def default_model_name(self) -> str:
+        return settings.embedding_model
+
+    def _load(self, model_name: str):
+        import sentence_transformers
+
+        start = time.perf_counter()
+        model = sentence_transformers.SentenceTransformer(model_name)
+        load_seconds = time.perf_counter() - start
+        self._stats[model_name] = {
+            "model_name": model_name,
+            "load_seconds": round(load_seconds, 3),
+            "memory_bytes": _model_memory_bytes(model),
+            "embedding_dimension": model.get_sentence_embedding_dimension(),
+            "max_seq_length": model.max_seq_length,
+            "loaded_at": time.time(),
+        }
+        self._models[model_name] = model
+        return model
+
+    def preload(self, *model_names: str):
+        """Load the given models (or the default model) ahead of the first request."""
+        for model_name in model_names or (self.default_model_name(),):
+            self.get(model_name)
+
+    def is_loaded(self, model_name: Optional[str] = None) -> bool:
+        return (model_name or self.default_model_name()) in self._models
+
+    def stats(self) -> list[dict]:
+        """Return load time and memory statistics for every loaded model."""
+        return [dict(s) for s in self._stats.values()]
+
+
+class CrossEncoderRegistry(ModelRegistry):
+    """Process-wide registry of sentence-transformers cross-encoders, used to re-rank retrieved chunks."""
+
+    def default_model_name(self) -> str:
+        return settings.rerank_model
+
+    def _load(self, model_name: str):
+        import sentence_transformers
+
+        start = time.perf_counter()
+        model = sentence_transformers.CrossEncoder(model_name, device="cpu")
+        load_seconds = time.perf_counter() - start
+        self._stats[model_name] = {
+            "model_name": model_name,
+            "load_seconds": round(load_seconds, 3),
+            "memory_bytes": _model_memory_bytes(model.model),
+            "embedding_dimension": None,
+            "max_seq_length": model.max_length,
+            "loaded_at": time.time(),
+        }
+        self._models[model_name] = model
+        return model
+
+
+def _model_memory_bytes(model) -> int:
+    """Approximate the memory held by a model's parameters and buffers."""
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+
+registry = ModelRegistry()
+cross_encoders = CrossEncoderRegistry()
@@ -0,0 +1,44 @@
+# app/fieldsets.py
+"""
+Sparse fieldsets for read endpoints: ?fields=a,b,c selects only the columns behind those fields, so heavy
+columns are neither loaded nor serialized unless requested. List endpoints leave them out by default.
+"""
+from typing import Iterable, Optional, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def default_fields(schema: Type[BaseModel], exclude: Iterable[str] = ()) -> list[str]:
+    """Fields of a response schema, minus the heavy ones that must be requested explicitly."""
+    exclude = set(exclude)
+    return [name for name in schema.model_fields if name not in exclude]
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel], default: Iterable[str]) -> list[str]:
+    """Parse a comma-separated ?fields= value into schema fields, in request order; 400 on unknown fields."""
+    if fields is None:
+        return list(default)
+    requested = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in schema.model_fields]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid fields: {', '.join(unknown) or '(none)'}. Available fields: {', '.join(schema.model_fields)}",
+        )
+    return requested
+
+
+def selected_columns(model, fields: Iterable[str], *keys: str) -> list:
+    """Mapped columns of a model for the requested fields, always including the key columns the endpoint needs."""
+    columns = model.__table__.columns
+    names = list(dict.fromkeys([*keys, *(name for name in fields if name in columns)]))
+    return [getattr(model, name) for name in names]
+
+
+def fieldset_response(rows: Iterable[dict], fields: list[str], single: bool = False) -> JSONResponse:
+    """Serialize rows with only the requested fields, as a list or, with single, the first row."""
+    content = [{name: row[name] for name in fields} for row in rows]
+    return JSONResponse(jsonable_encoder(content[0] if single else content))
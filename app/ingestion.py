@@ -0,0 +1,486 @@
+# app/ingestion.py
+"""
+Background document ingestion. Uploads are spooled to disk and queued as ingestionjobs rows, which a pool
+of worker threads claims and runs through extract, chunk, embed and insert, recording progress on the row.
+Jobs of a worker that died are requeued once their heartbeat goes stale.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterator
+
+from sqlalchemy import func, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .rag_utils import chunk_pages, texts_to_embeddings
+from .pdf_extraction import open_pdf_pages
+from .response_cache import invalidate_knowledge_base
+
+STAGES = ("extract", "chunk", "embed", "insert")
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+# arbitrary constant used to serialize job claims so per-user concurrency limits hold across workers
+CLAIM_LOCK_ID = 726_574_658
+
+# number of chunks embedded and inserted together, between progress updates and cancellation checks
+EMBED_BATCH = 256
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLost(Exception):
+    """The job was requeued or finished while this worker was still running it, so this attempt's work is discarded."""
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def spool_upload(upload_file, file_name: str, max_bytes: int = None) -> str:
+    """
+    Copy an upload into its own spool file block by block and return its path. Raises UploadTooLarge, leaving
+    nothing behind, if it exceeds max_bytes (default settings.upload_max_bytes).
+    """
+    max_bytes = max_bytes or settings.upload_max_bytes
+    os.makedirs(settings.ingest_spool_dir, exist_ok=True)
+    file_path = os.path.abspath(os.path.join(settings.ingest_spool_dir, f"{uuid.uuid4()}_{os.path.basename(file_name)}"))
+    written = 0
+    try:
+        with open(file_path, "wb") as f:
+            while block := upload_file.read(settings.upload_block_size):
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Uploaded file is larger than {max_bytes} bytes")
+                f.write(block)
+    except BaseException:
+        remove_spool_file(file_path)
+        raise
+    return file_path
+
+
+def enqueue_job(db: Session, owner_id, chatbot_id, file_name: str, file_path: str, context: str = None) -> models.IngestionJob:
+    """Record a new queued ingestion job and wake up the worker pool."""
+    job = models.IngestionJob(
+        job_id=uuid.uuid4(),
+        owner_id=owner_id,
+        chatbot_id=chatbot_id,
+        document_id=uuid.uuid4(),
+        file_name=file_name,
+        file_path=file_path,
+        context=context,
+        status="queued",
+        progress={},
+        attempts=0,
+        cancel_requested=False,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    pool.notify()
+    return job
+
+
+def cancel_job(db: Session, job: models.IngestionJob) -> models.IngestionJob:
+    """
+    Cancel a job. Queued jobs are cancelled immediately; running jobs stop at their next progress update.
+
+    Both changes are conditional updates on the job's current status, so a worker claiming the job at the same
+    time either sees it cancelled or is asked to stop.
+    """
+    cancelled = db.execute(
+        update(models.IngestionJob)
+        .where(models.IngestionJob.job_id == job.job_id, models.IngestionJob.status == "queued")
+        .values(status="cancelled", finished_at=utcnow())
+        .returning(models.IngestionJob.file_path)
+    ).first()
+    if cancelled is None:
+        db.execute(
+            update(models.IngestionJob)
+            .where(models.IngestionJob.job_id == job.job_id, models.IngestionJob.status == "running")
+            .values(cancel_requested=True)
+        )
+    db.commit()
+    if cancelled is not None:
+        remove_spool_file(cancelled.file_path)
+    db.refresh(job)
+    return job
+
+
+def job_throughput(job: models.IngestionJob) -> dict:
+    """Items processed per second for every stage that has started."""
+    throughput = {}
+    for stage, stage_progress in (job.progress or {}).items():
+        seconds = stage_progress.get("seconds") or 0
+        throughput[stage] = round(stage_progress.get("done", 0) / seconds, 2) if seconds else None
+    return throughput
+
+
+def remove_spool_file(file_path: str):
+    try:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as e:
+        print(f"Error removing spooled file {file_path}: {e}")
+
+
+class NoProgress:
+    """Progress recorder for ingestion that is not tracked by a job, e.g. synchronous uploads."""
+
+    def start(self, stage: str, total: int = None):
+        pass
+
+    def update(self, stage: str, done: int, total: int = None, force: bool = False):
+        pass
+
+    def record(self, stage: str, done: int, total: int = None):
+        pass
+
+
+class JobProgress(NoProgress):
+    """
+    Records stage progress and the heartbeat on the job row, in a short-lived session of its own so the
+    ingestion transaction stays open. Raises JobCancelled once cancellation is requested, and JobLost once
+    the job is no longer running under the attempt that created this recorder.
+    """
+
+    # minimum seconds between progress writes within a stage
+    min_interval = 1.0
+
+    def __init__(self, db: Session, job: models.IngestionJob):
+        self.bind = db.get_bind()
+        self.job_id = job.job_id
+        self.attempt = job.attempts
+        self.stage = None
+        self.progress = {}
+        self._stage_started = {}
+        self._last_write = 0.0
+
+    def start(self, stage: str, total: int = None):
+        self._stage_started[stage] = time.perf_counter()
+        self.stage = stage
+        self._set(stage, done=0, total=total, force=True)
+
+    def update(self, stage: str, done: int, total: int = None, force: bool = False):
+        self._set(stage, done=done, total=total, force=force)
+
+    def record(self, stage: str, done: int, total: int = None):
+        """Record progress without writing it to the job row."""
+        stage_progress = {"done": done, "total": total, "seconds": round(time.perf_counter() - self._stage_started[stage], 3)}
+        self.progress = {**self.progress, stage: stage_progress}
+
+    def _set(self, stage: str, done: int, total: int = None, force: bool = False):
+        self.record(stage, done, total)
+        now = time.perf_counter()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        with Session(self.bind) as db:
+            job = db.execute(
+                update(models.IngestionJob)
+                .where(models.IngestionJob.job_id == self.job_id, models.IngestionJob.status == "running",
+                       models.IngestionJob.attempts == self.attempt)
+                .values(stage=self.stage, progress=self.progress, heartbeat_at=utcnow())
+                .returning(models.IngestionJob.cancel_requested)
+            ).first()
+            db.commit()
+        self._last_write = now
+        if job is None:
+            raise JobLost()
+        if job.cancel_requested:
+            raise JobCancelled()
+
+
+class JobHeartbeat:
+    """
+    Refreshes a running job's heartbeat from a separate thread and session while the worker is busy, so a
+    single long step (a slow embedding batch, a large PDF page) does not make a live job look stale.
+    Only the row of the same attempt is touched, so a job that was requeued in the meantime is left alone.
+    """
+
+    def __init__(self, job_id, attempt: int, interval: float = None):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.interval = interval or settings.ingest_job_stale_seconds / 3
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f"ingestion-heartbeat-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        # not joined: a heartbeat in flight may be waiting on the job row lock held by the worker's transaction
+        self._stopping.set()
+
+    def _run(self):
+        from .database import SessionLocal
+
+        while not self._stopping.wait(self.interval):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(models.IngestionJob)
+                    .where(models.IngestionJob.job_id == self.job_id, models.IngestionJob.status == "running",
+                           models.IngestionJob.attempts == self.attempt)
+                    .values(heartbeat_at=utcnow())
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Error sending the heartbeat of ingestion job {self.job_id}: {e}")
+            finally:
+                db.close()
+
+
+def extract_pages(file_path: str, file_name: str) -> tuple[int, Iterator[tuple[int, str]]]:
+    """
+    Open the spooled file and return its page count and an iterator of (page_number, text) tuples. PDF pages
+    are extracted in parallel as they are consumed; other files are read as a single page of UTF-8 text.
+    """
+    if os.path.splitext(file_name)[1].lower() == ".pdf":
+        return open_pdf_pages(file_path)
+    with open(file_path, "rb") as f:
+        document_text = f.read().decode(encoding="utf-8")
+    return 1, iter([(1, document_text)])
+
+
+def ingest_file(db: Session, document_id, chatbot_id, file_name: str, file_path: str, context: str = None,
+                progress: NoProgress = None) -> models.KnowledgeBaseDocument:
+    """
+    Extract, chunk and embed a spooled file into a new document of a chatbot's knowledge base and return it.
+    Chunks are embedded and inserted in batches of EMBED_BATCH as pages stream in. Nothing is committed.
+    """
+    progress = progress or NoProgress()
+
+    page_count, pages = extract_pages(file_path, file_name)
+    progress.start("extract", total=page_count)
+    page_texts = []
+
+    def extracted_pages():
+        for page_number, page_text in pages:
+            page_texts.append(page_text)
+            progress.update("extract", len(page_texts), page_count)
+            yield page_number, page_text
+
+    # the document row goes first so the chunks can reference it; its text is filled in at the end
+    document = models.KnowledgeBaseDocument(
+        document_id=document_id,
+        chatbot_id=chatbot_id,
+        file_name=file_name,
+        raw_text="",
+        context=context,
+        created_at=utcnow(),
+        document_metadata={},
+    )
+    db.add(document)
+    db.flush()
+
+    chunks = chunk_pages(extracted_pages(), chunk_size=settings.chunk_size)
+    chunk_count = 0
+    while batch := list(islice(chunks, EMBED_BATCH)):
+        if chunk_count == 0:
+            for stage in ("chunk", "embed", "insert"):
+                progress.start(stage)
+        progress.record("chunk", chunk_count + len(batch))
+        embeddings = texts_to_embeddings([c for c, _ in batch], db=db)
+        progress.record("embed", chunk_count + len(batch))
+        db.execute(insert(models.DocumentChunk).values([
+            {
+                "chunk_id": uuid.uuid4(),
+                "document_id": document_id,
+                "chatbot_id": chatbot_id,
+                "chunk_text": c,
+                "chunk_metadata": chunk_metadata,
+                "chunk_embedding": embedding.tolist(),
+            }
+            for (c, chunk_metadata), embedding in zip(batch, embeddings)
+        ]))
+        chunk_count += len(batch)
+        progress.update("insert", chunk_count, force=True)
+
+    document.raw_text = "".join(page_texts)
+    document.document_metadata = {"pages": len(page_texts), "chunks": chunk_count}
+    progress.record("extract", len(page_texts), page_count)
+    if chunk_count:
+        for stage in ("chunk", "embed", "insert"):
+            progress.record(stage, chunk_count, chunk_count)
+    invalidate_knowledge_base(db, chatbot_id)
+    return document
+
+
+def run_job(db: Session, job: models.IngestionJob):
+    """
+    Run a claimed job through every stage. The document and its chunks are inserted in a single transaction,
+    which marks the job succeeded only if it still belongs to this attempt; otherwise JobLost is raised and
+    nothing is inserted.
+    """
+    attempt = job.attempts
+    progress = JobProgress(db, job)
+    with JobHeartbeat(job.job_id, attempt):
+        ingest_file(db, job.document_id, job.chatbot_id, job.file_name, job.file_path, context=job.context,
+                    progress=progress)
+        succeeded = db.execute(
+            update(models.IngestionJob)
+            .where(models.IngestionJob.job_id == job.job_id, models.IngestionJob.status == "running",
+                   models.IngestionJob.attempts == attempt)
+            .values(status="succeeded", stage=None, progress=progress.progress, finished_at=utcnow())
+        ).rowcount
+        if not succeeded:
+            raise JobLost()
+        db.commit()
+
+
+def claim_job(db: Session):
+    """
+    Claim the oldest queued job whose owner is below the per-user concurrency limit.
+
+    Returns:
+        models.IngestionJob: The claimed job, now marked as running, or None if there is nothing to run.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": CLAIM_LOCK_ID})
+    busy_owners = (
+        db.query(models.IngestionJob.owner_id)
+        .filter(models.IngestionJob.status == "running")
+        .group_by(models.IngestionJob.owner_id)
+        .having(func.count() >= settings.ingest_max_jobs_per_user)
+    )
+    job = (
+        db.query(models.IngestionJob)
+        .filter(models.IngestionJob.status == "queued")
+        .filter(models.IngestionJob.owner_id.not_in(busy_owners))
+        .order_by(models.IngestionJob.created_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.commit()
+        return None
+    job.status = "running"
+    job.started_at = utcnow()
+    job.heartbeat_at = job.started_at
+    job.attempts = (job.attempts or 0) + 1
+    job.progress = {}
+    db.commit()
+    return job
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """
+    Requeue running jobs whose worker stopped sending heartbeats, failing those that ran out of attempts.
+    If the old worker is still alive, run_job and _finish_job see that the attempt changed and discard its work.
+    """
+    stale_before = utcnow() - timedelta(seconds=settings.ingest_job_stale_seconds)
+    stale = (
+        db.query(models.IngestionJob)
+        .filter(models.IngestionJob.status == "running")
+        .filter(models.IngestionJob.heartbeat_at < stale_before)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in stale:
+        if job.cancel_requested:
+            job.status = "cancelled"
+        elif (job.attempts or 0) >= settings.ingest_max_attempts:
+            job.status = "failed"
+            job.error = "Worker stopped responding too many times"
+        else:
+            job.status = "queued"
+            continue
+        job.finished_at = utcnow()
+        remove_spool_file(job.file_path)
+    db.commit()
+    return len(stale)
+
+
+class IngestionWorkerPool:
+    """A fixed number of daemon threads that claim and run ingestion jobs."""
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def notify(self):
+        """Wake up idle workers so a newly queued job starts without waiting for the next poll."""
+        self._wakeup.set()
+
+    def _worker_loop(self):
+        from .database import SessionLocal
+
+        while not self._stopping.is_set():
+            db = SessionLocal()
+            job = None
+            try:
+                requeue_stale_jobs(db)
+                job = claim_job(db)
+                if job is not None:
+                    job_id, attempt, file_path = job.job_id, job.attempts, job.file_path
+                    run_job(db, job)
+                    remove_spool_file(file_path)
+            except JobCancelled:
+                db.rollback()
+                _finish_job(db, job_id, attempt, file_path, "cancelled")
+            except JobLost:
+                db.rollback()
+                print(f"Ingestion job {job_id} was requeued while attempt {attempt} was running; discarding the attempt")
+            except Exception as e:
+                db.rollback()
+                print(f"Error running ingestion job: {e}")
+                if job is not None:
+                    _finish_job(db, job_id, attempt, file_path, "failed", error=str(e))
+            finally:
+                db.close()
+
+            if job is None:
+                self._wakeup.wait(timeout=settings.ingest_poll_seconds)
+                self._wakeup.clear()
+
+
+def _finish_job(db: Session, job_id, attempt: int, file_path: str, status: str, error: str = None):
+    """Record the final status of an attempt, unless the job was requeued in the meantime and belongs to another one."""
+    try:
+        finished = db.execute(
+            update(models.IngestionJob)
+            .where(models.IngestionJob.job_id == job_id, models.IngestionJob.status == "running",
+                   models.IngestionJob.attempts == attempt)
+            .values(status=status, error=error, finished_at=utcnow())
+        ).rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error recording the final status of ingestion job {job_id}: {e}")
+        return
+    if finished:
+        remove_spool_file(file_path)
+
+
+pool = IngestionWorkerPool(settings.ingest_workers)
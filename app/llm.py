@@ -1,17 +1,65 @@
 # app/llm.py
 import sys
-from typing import Optional, Iterator
+import threading
+from collections import OrderedDict
+from typing import Optional
 from .config import settings
 
-from huggingface_hub import InferenceClient
+from huggingface_hub import InferenceClient, AsyncInferenceClient
 from ollama import Client as OllamaClient
+from ollama import AsyncClient as AsyncOllamaClient
 from ollama import ChatResponse
-from collections.abc import Iterator
+from collections.abc import AsyncIterator
+
+# provider clients are shared between services so their keep-alive connections are reused across turns;
+# the least recently used ones are dropped beyond settings.llm_client_cache_size
+_clients: OrderedDict = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def get_client(inference_provider: str, inference_url: Optional[str], model_name: str, token: Optional[str], asynchronous: bool = False):
+    """
+    Return the pooled provider client for the given settings, creating it on first use.
+
+    Args:
+        inference_provider (str): Either "ollama" or "huggingface".
+        inference_url (str, optional): Host of the ollama server.
+        model_name (str): The model the client is used for.
+        token (str, optional): Hugging Face API token.
+        asynchronous (bool): Whether to return an asyncio client.
+
+    Returns:
+        The ollama or huggingface client.
+    """
+    key = (inference_provider, inference_url, model_name, token, asynchronous)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+        if inference_provider == "ollama":
+            client = AsyncOllamaClient(host=inference_url) if asynchronous else OllamaClient(host=inference_url)
+        elif inference_provider == "huggingface":
+            client_class = AsyncInferenceClient if asynchronous else InferenceClient
+            client = client_class(model=model_name, token=token, timeout=60)
+        else:
+            raise ValueError("Invalid inference provider")
+        _clients[key] = client
+        while len(_clients) > max(settings.llm_client_cache_size, 1):
+            _clients.popitem(last=False)
+    return client
+
+
+def response_text(inference_provider: str, response) -> Optional[str]:
+    """Text of a complete (non-streamed) provider response."""
+    if inference_provider == "ollama":
+        return response.message.content
+    return response.choices[0].message.content if response.choices else None
 
 
 class LLMService:
 
-    # Load environment variables from .env file
+    asynchronous = False
 
     def __init__(self, 
                  model_name: str, 
@@ -22,24 +70,37 @@ class LLMService:
                  temperature: float = 0.7,
                  max_response_tokens: int = 2000,
                  system_context_allowed: bool = False,
-                 top_p: float = 0.9):
-        self.inference_provider = inference_provider
+                 top_p: float = 0.9,
+                 context_window: Optional[int] = None):
+        # chatbots that do not configure a provider use the server's
+        self.inference_provider = inference_provider or settings.inference_provider
         self.token = token if token else settings.hf_token
-        self.inference_url = inference_url
+        self.inference_url = inference_url or settings.inference_url
         self.stream = stream
         self.temperature = temperature
         self.max_response_tokens = max_response_tokens
         self.system_context_allowed = system_context_allowed
         self.top_p = top_p
-        if inference_provider == "ollama":
+        self.context_window = context_window or settings.default_context_window
+        if self.inference_provider == "ollama":
             self.model_name = model_name if model_name else settings.default_ollama_model
-            self.client = OllamaClient(host=inference_url)
-        elif inference_provider == "huggingface":
+        elif self.inference_provider == "huggingface":
             # default case is to use huggingface inference.
             self.model_name = model_name if model_name else settings.default_hf_model
-            self.client = InferenceClient(model=self.model_name, token=self.token, timeout=60)
         else:
             raise ValueError("Invalid inference provider")
+        self.client = get_client(self.inference_provider, self.inference_url, self.model_name, self.token, asynchronous=self.asynchronous)
+
+    def ollama_options(self) -> dict:
+        options = {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "num_predict": self.max_response_tokens,
+        }
+        # ollama truncates prompts to its default context size unless told otherwise, so the window the
+        # prompt was budgeted for is always sent
+        options["num_ctx"] = self.context_window
+        return options
 
     def generate(self, prompt):
         """
@@ -63,11 +124,7 @@ class LLMService:
                     model=self.model_name,
                     messages=prompt, 
                     stream=self.stream,
-                    options={
-                        "temperature": self.temperature,
-                        "top_p": self.top_p,
-                        "num_predict": self.max_response_tokens,
-                    }
+                    options=self.ollama_options(),
                 )
                 return response
             except Exception as e:
@@ -85,4 +142,92 @@ class LLMService:
                 return response
             except Exception as e:
                 print(f"Error generating response from huggingface: {e}")
-                return None
\ No newline at end of file
+                return None
+
+
+    def generate_text(self, prompt) -> Optional[str]:
+        """Generates a complete response without streaming and returns its text, or None if the request failed."""
+        stream, self.stream = self.stream, False
+        try:
+            response = self.generate(prompt)
+        finally:
+            self.stream = stream
+        if response is None:
+            return None
+        return response_text(self.inference_provider, response)
+
+
+class AsyncLLMService(LLMService):
+    """
+    LLMService variant built on the asyncio provider clients, so a single worker can serve many
+    concurrent streaming generations without a thread per request.
+    """
+
+    asynchronous = True
+
+    async def generate(self, prompt):
+        """
+        Generates a response from the LLM based on the given prompt.
+
+        Args:
+            prompt (List[Dict]): The prompt to send to the LLM.
+
+        Returns:
+            The provider response, or an async iterator of response chunks if streaming. None if the request failed.
+        """
+        if isinstance(self.client, AsyncOllamaClient):
+            try:
+                return await self.client.chat(
+                    model=self.model_name,
+                    messages=prompt,
+                    stream=self.stream,
+                    options=self.ollama_options(),
+                )
+            except Exception as e:
+                print(f"Error generating response from ollama: {e}")
+                return None
+        elif isinstance(self.client, AsyncInferenceClient):
+            try:
+                return await self.client.chat_completion(
+                    messages=prompt,
+                    max_tokens=self.max_response_tokens,
+                    temperature=self.temperature,
+                    stream=self.stream,
+                    top_p=self.top_p
+                )
+            except Exception as e:
+                print(f"Error generating response from huggingface: {e}")
+                return None
+
+    async def generate_text(self, prompt) -> Optional[str]:
+        """Generates a complete response without streaming and returns its text, or None if the request failed."""
+        stream, self.stream = self.stream, False
+        try:
+            response = await self.generate(prompt)
+        finally:
+            self.stream = stream
+        if response is None:
+            return None
+        return response_text(self.inference_provider, response)
+
+    async def iter_text(self, prompt) -> AsyncIterator[str]:
+        """
+        Generates a response and yields its text as it arrives, hiding the differences between provider response formats.
+        Yields nothing if the request failed.
+        """
+        response = await self.generate(prompt)
+        if response is None:
+            return
+        if not self.stream:
+            content = response_text(self.inference_provider, response)
+            if content:
+                yield content
+            return
+        async for chunk in response:
+            if self.inference_provider == "ollama":
+                content = chunk.message.content
+            else:
+                # Hugging Face streams can include chunks without choices, e.g. a final usage chunk
+                content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                yield content
\ No newline at end of file
@@ -1,20 +1,95 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends
 from sqlalchemy.orm import Session
 from datetime import datetime
-from .routers import users, auth, chatbots, conversations, documents
+from .routers import users, auth, chatbots, conversations, documents, jobs
+from .config import settings
+from .embeddings import registry, cross_encoders
+from .database import engine
+from .vector_index import create_vector_indexes
+from .migrations import run_migrations
+from .ingestion import pool as ingestion_pool
+from .pdf_extraction import shutdown_executor as shutdown_pdf_extraction
+from .reranking import shutdown_executor as shutdown_reranking
+
+def preload_embedding_model():
+    # load the embedding model once at startup so the first ingest or chat turn doesn't pay for it
+    if settings.preload_embedding_model:
+        registry.preload()
+    if settings.preload_rerank_model:
+        cross_encoders.preload()
+
+def apply_migrations():
+    if settings.run_migrations_on_startup:
+        run_migrations(engine)
+
+def ensure_vector_indexes():
+    if settings.manage_vector_indexes:
+        create_vector_indexes(engine)
+
+def start_ingestion_workers():
+    if settings.ingest_workers > 0:
+        ingestion_pool.start()
+
+def stop_ingestion_workers():
+    ingestion_pool.stop()
+    shutdown_pdf_extraction()
+    shutdown_reranking()
+
+async def close_async_engine():
+    if settings.database_mode == "async":
+        from .async_database import async_engine
+        await async_engine.dispose()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    preload_embedding_model()
+    apply_migrations()
+    ensure_vector_indexes()
+    start_ingestion_workers()
+    yield
+    stop_ingestion_workers()
+    await close_async_engine()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="VeeVee",
     description= """
         Chatbot VeeVee
         """
 )
 
-app.include_router(users.router)
-app.include_router(auth.router)
-app.include_router(chatbots.router)
-app.include_router(conversations.router)
-app.include_router(documents.router)
+def without_routes(router: APIRouter, replacement: APIRouter) -> APIRouter:
+    """The routes of a router that the replacement router does not define for the same path and method."""
+    replaced = {(route.path, method) for route in replacement.routes for method in route.methods}
+    remaining = APIRouter()
+    remaining.routes = [
+        route for route in router.routes
+        if not any((route.path, method) in replaced for method in route.methods)
+    ]
+    return remaining
+
+if settings.database_mode == "async":
+    # database-only routes are served by async handlers; the rest keep running on the sync engine
+    from .routers.aio import users as async_users, chatbots as async_chatbots, conversations as async_conversations, documents as async_documents, jobs as async_jobs
+
+    for sync_router, async_router in (
+        (users.router, async_users.router),
+        (chatbots.router, async_chatbots.router),
+        (conversations.router, async_conversations.router),
+        (documents.router, async_documents.router),
+        (jobs.router, async_jobs.router),
+    ):
+        app.include_router(async_router)
+        app.include_router(without_routes(sync_router, async_router))
+    app.include_router(auth.router)
+else:
+    app.include_router(users.router)
+    app.include_router(auth.router)
+    app.include_router(chatbots.router)
+    app.include_router(conversations.router)
+    app.include_router(documents.router)
+    app.include_router(jobs.router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,144 @@
+# app/migrations.py
+"""
+Ordered, idempotent schema migrations for tables that already exist in deployed databases, each recorded in
+schema_migrations so it runs once. Applied at startup (settings.run_migrations_on_startup) or with:
+
+    python -m app.migrations
+"""
+from sqlalchemy import text
+
+from . import models
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+# arbitrary constant used to serialize migrations when several API workers start at once
+MIGRATION_LOCK_ID = 726_574_657
+
+
+def _create_embedding_cache(conn):
+    models.EmbeddingCacheEntry.__table__.create(bind=conn, checkfirst=True)
+
+
+def _denormalize_chunk_chatbot_id(conn):
+    conn.execute(text(
+        "ALTER TABLE documentchunks ADD COLUMN IF NOT EXISTS chatbot_id UUID "
+        "REFERENCES chatbots (chatbot_id) ON DELETE CASCADE"
+    ))
+    # backfill existing rows from their parent document
+    conn.execute(text(
+        "UPDATE documentchunks AS c SET chatbot_id = d.chatbot_id "
+        "FROM knowledgebasedocuments AS d "
+        "WHERE c.document_id = d.document_id AND c.chatbot_id IS DISTINCT FROM d.chatbot_id"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_documentchunks_chatbot_id_document_id "
+        "ON documentchunks (chatbot_id, document_id)"
+    ))
+
+
+def _track_indexed_messages(conn):
+    conn.execute(text("ALTER TABLE messages ADD COLUMN IF NOT EXISTS indexed_at TIMESTAMPTZ"))
+    # remembered conversations used to be fully re-indexed on every turn, so their existing messages are already indexed
+    conn.execute(text(
+        "UPDATE messages AS m SET indexed_at = now() "
+        "FROM conversations AS c "
+        "WHERE m.conversation_id = c.conversation_id AND c.is_remembered AND m.indexed_at IS NULL"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_unindexed "
+        "ON messages (conversation_id) WHERE indexed_at IS NULL"
+    ))
+
+
+def _create_ingestion_jobs(conn):
+    models.IngestionJob.__table__.create(bind=conn, checkfirst=True)
+
+
+def _add_chunk_search_vector(conn):
+    # rewrites documentchunks once to compute the column for existing rows
+    conn.execute(text(
+        "ALTER TABLE documentchunks ADD COLUMN IF NOT EXISTS chunk_tsv TSVECTOR "
+        f"GENERATED ALWAYS AS (to_tsvector('{models.TEXT_SEARCH_CONFIG}', coalesce(chunk_text, ''))) STORED"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_documentchunks_chunk_tsv ON documentchunks USING gin (chunk_tsv)"
+    ))
+
+
+def _add_chatbot_knowledge_version(conn):
+    conn.execute(text("ALTER TABLE chatbots ADD COLUMN IF NOT EXISTS knowledge_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_conversation_summary(conn):
+    conn.execute(text(
+        "ALTER TABLE conversations "
+        "ADD COLUMN IF NOT EXISTS summary TEXT, "
+        "ADD COLUMN IF NOT EXISTS summary_message_id UUID, "
+        "ADD COLUMN IF NOT EXISTS summary_timestamp TIMESTAMPTZ, "
+        "ADD COLUMN IF NOT EXISTS summary_updated_at TIMESTAMPTZ"
+    ))
+    # chat turns load the messages after the summary in (timestamp, message_id) order
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_timestamp_message_id "
+        "ON messages (conversation_id, timestamp, message_id)"
+    ))
+
+
+def _add_conversation_list_indexes(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user_id_start_time_conversation_id "
+        "ON conversations (user_id, start_time, conversation_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_conversations_chatbot_id_start_time_conversation_id "
+        "ON conversations (chatbot_id, start_time, conversation_id)"
+    ))
+
+
+MIGRATIONS = [
+    ("0001_create_embedding_cache", _create_embedding_cache),
+    ("0002_denormalize_chunk_chatbot_id", _denormalize_chunk_chatbot_id),
+    ("0003_track_indexed_messages", _track_indexed_messages),
+    ("0004_create_ingestion_jobs", _create_ingestion_jobs),
+    ("0005_add_chunk_search_vector", _add_chunk_search_vector),
+    ("0006_add_chatbot_knowledge_version", _add_chatbot_knowledge_version),
+    ("0007_add_conversation_summary", _add_conversation_summary),
+    ("0008_add_conversation_list_indexes", _add_conversation_list_indexes),
+]
+
+
+def run_migrations(engine) -> list[str]:
+    """
+    Apply every migration that has not been recorded yet, each in its own transaction.
+
+    Returns:
+        list[str]: IDs of the migrations applied by this call.
+    """
+    applied_now = []
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+            "migration_id VARCHAR PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+    for migration_id, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+            already_applied = conn.execute(
+                text(f"SELECT 1 FROM {MIGRATIONS_TABLE} WHERE migration_id = :migration_id"),
+                {"migration_id": migration_id},
+            ).first()
+            if already_applied:
+                continue
+            migrate(conn)
+            conn.execute(
+                text(f"INSERT INTO {MIGRATIONS_TABLE} (migration_id) VALUES (:migration_id)"),
+                {"migration_id": migration_id},
+            )
+            applied_now.append(migration_id)
+    return applied_now
+
+
+if __name__ == "__main__":
+    from .database import engine
+    applied = run_migrations(engine)
+    print(f"> Applied {len(applied)} migration(s): {', '.join(applied) if applied else 'database is up to date'}")
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Index, Integer, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from pgvector.sqlalchemy import Vector
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
@@ -33,9 +33,10 @@ class Chatbot(Base):
     model_name = Column(String, nullable=True) # Can be an ollama model name or a huggingface model name
     chatbot_name = Column(String)
     description = Column(String, nullable=True)
-    configuration = Column(JSONB, nullable=True)
+    configuration = deferred(Column(JSONB, nullable=True)) # loaded on access, or up front with undefer()
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True)
+    knowledge_version = Column(Integer, nullable=False, default=0, server_default="0") # bumped on every knowledge base change
     owner = relationship("User", back_populates="chatbots")
     documents = relationship("KnowledgeBaseDocument", back_populates="chatbot")
     conversations = relationship("Conversation", back_populates="chatbot")
@@ -51,7 +52,7 @@ class KnowledgeBaseDocument(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     document_metadata = Column(JSONB, nullable=True)
     context = Column(String, nullable=True)
-    raw_text = Column(Text, nullable=True)
+    raw_text = deferred(Column(Text, nullable=True)) # full extracted text, loaded on access
     chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
     chatbot = relationship("Chatbot", back_populates="documents")
 
@@ -66,10 +67,20 @@ class Conversation(Base):
     start_time = Column(DateTime(timezone=True), server_default=func.now())
     last_modified = Column(DateTime(timezone=True), nullable=True)
     is_remembered = Column(Boolean, default=False)
+    summary = Column(Text, nullable=True) # rolling summary of the messages up to summary_message_id
+    summary_message_id = Column(UUID(as_uuid=True), nullable=True)
+    summary_timestamp = Column(DateTime(timezone=True), nullable=True) # timestamp of summary_message_id
+    summary_updated_at = Column(DateTime(timezone=True), nullable=True)
     chatbot = relationship("Chatbot", back_populates="conversations")
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True)
 
+    __table_args__ = (
+        # keyset pagination of the conversation lists, newest first
+        Index("ix_conversations_user_id_start_time_conversation_id", "user_id", "start_time", "conversation_id"),
+        Index("ix_conversations_chatbot_id_start_time_conversation_id", "chatbot_id", "start_time", "conversation_id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -79,14 +90,60 @@ class Message(Base):
     message_text = Column(Text)
     role = Column(String)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    indexed_at = Column(DateTime(timezone=True), nullable=True) # when the message was added to the knowledge base of a remembered conversation
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_conversation_id_timestamp_message_id", "conversation_id", "timestamp", "message_id"),
+    )
+
+# text search configuration of the lexical index on document chunks
+TEXT_SEARCH_CONFIG = "english"
+
 class DocumentChunk(Base):
     __tablename__ = "documentchunks"
 
     chunk_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("knowledgebasedocuments.document_id", ondelete="CASCADE"))
+    chatbot_id = Column(UUID(as_uuid=True), ForeignKey("chatbots.chatbot_id", ondelete="CASCADE")) # denormalized from the parent document
     chunk_text = Column(String)
     chunk_metadata = Column(JSONB, nullable=True)
-    chunk_embedding = Column(Vector(768))
-    document = relationship("KnowledgeBaseDocument", back_populates="chunks")
\ No newline at end of file
+    chunk_embedding = deferred(Column(Vector(768))) # searched in SQL, loaded on access
+    # maintained by Postgres for lexical search, and only loaded when accessed
+    chunk_tsv = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(chunk_text, ''))", persisted=True)))
+    document = relationship("KnowledgeBaseDocument", back_populates="chunks")
+
+    __table_args__ = (
+        Index("ix_documentchunks_chatbot_id_document_id", "chatbot_id", "document_id"),
+        Index("ix_documentchunks_chunk_tsv", "chunk_tsv", postgresql_using="gin"),
+    )
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embeddingcache"
+
+    model_name = Column(String, primary_key=True)
+    content_hash = Column(String(64), primary_key=True) # SHA-256 of the normalized text
+    embedding = Column(Vector())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestionjobs"
+
+    job_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), index=True)
+    chatbot_id = Column(UUID(as_uuid=True), ForeignKey("chatbots.chatbot_id", ondelete="CASCADE"))
+    document_id = Column(UUID(as_uuid=True), default=uuid.uuid4)
+    file_name = Column(String)
+    file_path = Column(String) # spooled upload, deleted once the job finishes
+    context = Column(String, nullable=True)
+    status = Column(String, default="queued", index=True) # queued, running, succeeded, failed or cancelled
+    stage = Column(String, nullable=True) # extract, chunk, embed or insert while running
+    progress = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
@@ -1,23 +1,20 @@
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
 from . import schemas, database, models
 from sqlalchemy.orm import Session
 from .config import settings
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+from .dependencies import oauth2_scheme
+from .user_cache import user_cache
 
 SECRET_KEY = settings.secret_key
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 10
+ALGORITHM = settings.algorithm
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 def verify_token(token: str, credentials_exception):
     try:
@@ -28,19 +25,32 @@ def verify_token(token: str, credentials_exception):
         if user_id is None:
             raise credentials_exception
         token_data = schemas.TokenData(user_id=user_id, username=username, issued_at=issued_at)
-    except JWTError:
+    except (JWTError, ValueError):
         raise credentials_exception
     return token_data
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> schemas.TokenData:
+    """
+    Claims-only authentication for endpoints that need nothing but the caller's user id.
 
-    token_data = verify_token(token, credentials_exception)
+    The token's signature and expiry are verified, but the user is not looked up, so no database
+    session is opened for the request. It does no I/O, so it runs on the event loop instead of the threadpool.
+    """
+    return verify_token(token, credentials_exception())
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> schemas.User:
+    """
+    Authenticate a request and resolve its user, from the user cache when possible.
+
+    Returns:
+        schemas.User: A snapshot of the user. It is shared with other requests, so it must not be modified;
+            query models.User when the row itself is needed.
+    """
+    token_data = verify_token(token, credentials_exception())
+    user = user_cache.get(token_data.user_id)
+    if user is not None:
+        return user
     user = db.query(models.User).filter(models.User.user_id == token_data.user_id).first()
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise credentials_exception()
+    return user_cache.put(user)
@@ -0,0 +1,86 @@
+# app/pdf_extraction.py
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+from .config import settings
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# (file_path, PdfReader) of the file a worker process is extracting, reused for every range it gets of that file
+_worker_reader = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn rather than fork: the API process is multi-threaded and holds the embedding model
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.pdf_extract_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _clean(page_text: Optional[str]) -> str:
+    return (page_text or "").replace('\x00', '')
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> list[str]:
+    """Extract the text of pages [start, end) in a worker process, opening the file once per process."""
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != file_path:
+        from pypdf import PdfReader
+        _worker_reader = (file_path, PdfReader(file_path))
+    reader = _worker_reader[1]
+    return [_clean(reader.pages[i].extract_text()) for i in range(start, end)]
+
+
+def open_pdf_pages(file_path: str, processes: int = None, pages_per_task: int = None) -> tuple[int, Iterator[tuple[int, str]]]:
+    """
+    Return a PDF's page count and an iterator of (page_number, text) in order, with 1-based page numbers.
+    Page ranges are extracted in a process pool; small files, or a pool of 1, are read from a single reader.
+    """
+    from pypdf import PdfReader
+    processes = processes or settings.pdf_extract_processes
+    pages_per_task = pages_per_task or settings.pdf_pages_per_task
+    reader = PdfReader(file_path)
+    n = len(reader.pages)
+    ranges = [(start, min(start + pages_per_task, n)) for start in range(0, n, pages_per_task)]
+    if processes <= 1 or len(ranges) <= 1:
+        return n, ((i + 1, _clean(page.extract_text())) for i, page in enumerate(reader.pages))
+    return n, _iter_page_ranges(file_path, ranges, processes)
+
+
+def _iter_page_ranges(file_path: str, ranges: list[tuple[int, int]], processes: int) -> Iterator[tuple[int, str]]:
+    executor = _get_executor()
+    remaining = iter(ranges)
+    in_flight = deque()
+    for start, end in remaining:
+        in_flight.append((start, executor.submit(_extract_page_range, file_path, start, end)))
+        if len(in_flight) >= processes * 2:
+            break
+    try:
+        while in_flight:
+            start, future = in_flight.popleft()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                in_flight.append((next_range[0], executor.submit(_extract_page_range, file_path, *next_range)))
+            for offset, page_text in enumerate(future.result()):
+                yield start + offset + 1, page_text
+    finally:
+        # stop queued work if the consumer stops early, e.g. when the job is cancelled
+        for _, future in in_flight:
+            future.cancel()
@@ -0,0 +1,100 @@
+# app/quantization.py
+"""
+Quantized representations of chunk embeddings, and a numpy reproduction of the quantized search and
+re-ranking pipeline to measure the recall of each mode before deploying it.
+"""
+import numpy as np
+
+# modes the coarse search can run on in Postgres
+QUANTIZATION_MODES = ("none", "halfvec", "binary")
+
+# modes covered by the report; pgvector has no int8 vector type, so int8 is only measured here
+REPORT_MODES = ("none", "halfvec", "int8", "binary")
+
+
+def bytes_per_vector(mode: str, dimension: int) -> int:
+    """Storage of one quantized vector, excluding the per-row overhead of Postgres."""
+    if mode == "none":
+        return 4 * dimension
+    if mode == "halfvec":
+        return 2 * dimension
+    if mode == "int8":
+        # one byte per dimension plus a float32 scale per vector
+        return dimension + 4
+    if mode == "binary":
+        return (dimension + 7) // 8
+    raise ValueError(f"Invalid quantization mode: {mode}")
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization. Returns the int8 codes and the scale of each vector."""
+    scales = np.abs(matrix).max(axis=1, keepdims=True) / 127
+    scales = np.where(scales == 0, 1, scales)
+    return np.round(matrix / scales).astype(np.int8), scales.astype(np.float32)
+
+
+def coarse_similarities(corpus: np.ndarray, queries: np.ndarray, mode: str) -> np.ndarray:
+    """
+    Similarity of every query to every corpus vector as seen by the coarse search of a mode; higher is closer.
+    Queries stay in full precision, as they do in Postgres, except for binary mode where both sides are quantized.
+    """
+    if mode == "none":
+        return normalize(queries) @ normalize(corpus).T
+    if mode == "halfvec":
+        return normalize(queries) @ normalize(corpus.astype(np.float16).astype(np.float32)).T
+    if mode == "int8":
+        codes, _ = quantize_int8(corpus)
+        # cosine similarity does not depend on the per-vector scale
+        return normalize(queries) @ normalize(codes.astype(np.float32)).T
+    if mode == "binary":
+        corpus_bits = (corpus > 0).astype(np.float32)
+        query_bits = (queries > 0).astype(np.float32)
+        # matching bits, i.e. the dimension minus the hamming distance
+        return query_bits @ corpus_bits.T + (1 - query_bits) @ (1 - corpus_bits).T
+    raise ValueError(f"Invalid quantization mode: {mode}")
+
+
+def top_k(similarities: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k most similar corpus vectors for each query, most similar first."""
+    k = min(k, similarities.shape[1])
+    candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(similarities, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall_report(corpus: np.ndarray, queries: np.ndarray, k: int = 5, rerank_factor: int = 4,
+                  modes=REPORT_MODES) -> list[dict]:
+    """
+    Measure recall@k of each mode against exact search, before and after re-ranking k * rerank_factor
+    candidates at full precision. The coarse search is exhaustive, so only the quantization loss is measured.
+    """
+    exact_similarities = normalize(queries) @ normalize(corpus).T
+    exact = top_k(exact_similarities, k)
+    dimension = corpus.shape[1]
+
+    def recall(found: np.ndarray) -> float:
+        hits = [len(set(f) & set(e)) for f, e in zip(found.tolist(), exact.tolist())]
+        return round(sum(hits) / (len(hits) * exact.shape[1]), 4)
+
+    report = []
+    for mode in modes:
+        candidates = top_k(coarse_similarities(corpus, queries, mode), k * rerank_factor)
+        reranked = np.take_along_axis(
+            candidates,
+            top_k(np.take_along_axis(exact_similarities, candidates, axis=1), k),
+            axis=1,
+        )
+        report.append({
+            "mode": mode,
+            "bytes_per_vector": bytes_per_vector(mode, dimension),
+            "memory_ratio": round(bytes_per_vector(mode, dimension) / bytes_per_vector("none", dimension), 4),
+            "coarse_recall": recall(candidates[:, :k]),
+            "reranked_recall": recall(reranked),
+        })
+    return report
@@ -1,20 +1,20 @@
 import streamlit as st
 from .config import settings
-import os
 import uuid
 import numpy as np
 from .models import DocumentChunk, KnowledgeBaseDocument
-from pypdf import PdfReader
-from streamlit.runtime.uploaded_file_manager import UploadedFile
+from .embeddings import registry
+from .embedding_cache import embedding_cache
+from .chunking import iter_chunks
+from typing import Iterator
 import io
 
-def get_embedded_chunks(document_text, document_id, chunk_metadata=None) -> list[dict]:
+def get_embedded_chunks(document_text, document_id, chunk_metadata=None, db=None) -> list[dict]:
     
     chunks = chunk_text(document_text, chunk_size=settings.chunk_size)
+    embeddings = texts_to_embeddings(chunks, db=db)
     embedded_chunks = []
-    n = len(chunks)
-    for i, c in enumerate(chunks):
-        emb = text_to_embedding(c)
+    for c, emb in zip(chunks, embeddings):
         embedded_chunk = {
             "document_id": str(document_id),
             "chunk_id": str(uuid.uuid4()),
@@ -28,74 +28,61 @@ def get_embedded_chunks(document_text, document_id, chunk_metadata=None) -> list
 
     return embedded_chunks
 
-def read_text_file(text_file: UploadedFile):
-    """Reads the content of a text file and returns it as a string."""
-    try:
-        return text_file.read().decode(encoding='utf-8')
-    except Exception as e:
-        print(f"Error reading text file: {e}")
-        return None
+def chunk_text(text: str, chunk_size: int = settings.chunk_size, max_tokens: int = None):
+    """
+    Splits text into sentence-aligned chunks of at most chunk_size characters that also fit the embedding
+    model's token budget. See chunking.iter_chunks.
+    """
+    return [c for c, _ in iter_chunks([text], max_tokens=max_tokens, max_chars=chunk_size)]
+
+def chunk_pages(pages, chunk_size: int = settings.chunk_size) -> Iterator[tuple[str, dict]]:
+    """
+    Chunks a stream of pages, recording the pages each chunk spans so it can be cited.
+
+    Args:
+        pages (Iterable[tuple[int, str]]): (page_number, text) tuples, e.g. from pdf_extraction.open_pdf_pages.
 
-def read_pdf_file(pdf_file: UploadedFile):
-    """Reads the content of a PDF file and returns it as a string."""
+    Yields:
+        tuple[str, dict]: (chunk_text, chunk_metadata) tuples, where the metadata holds page_start and page_end.
+    """
+    return iter_chunks(((page_text, {"page": page_number}) for page_number, page_text in pages), max_chars=chunk_size)
+
+def text_to_embedding(chunk: str, model=None, db=None):
+    if model:
+        return np.array(model.encode(chunk))
     try:
-        # prog = st.progress(0, "reading pdf...")
-        pdf_reader = PdfReader(pdf_file)
-        text = ""
-        n = len(pdf_reader.pages)
-        for i, page in enumerate(pdf_reader.pages):
-            # prog.progress(float(i/n), f"({i} / {n}) reading pdf...")
-            text += page.extract_text().replace('\x00', '')
-        return text
+        return texts_to_embeddings([chunk], db=db)[0]
     except Exception as e:
-        print(f"Error reading PDF file: {e}")
+        print(f"Error loading Sentence Transformers: {e}")
         return None
 
-def delete_cache():
-    cache_dir = os.path.join(settings.app_dir, "tmp")
-    for file_name in os.listdir(cache_dir):
-        os.remove(os.path.join(cache_dir, file_name))
-
-def chunk_text(text: str, chunk_size: int = settings.chunk_size, chunking_progress=None):
-    # if not chunking_progress:
-    #     chunking_progress = st.progress(0, "chunking text...")
 
-    import nltk
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except Exception:
-        nltk.download('punkt')
-        nltk.download('punkt_tab')
-    from nltk.tokenize import sent_tokenize
-    
-    sentences = sent_tokenize(text)
-    n = len(sentences)
-    chunks = []
-    current_chunk = ""
-    previous_sentence = ""
+def texts_to_embeddings(texts: list[str], model_name: str = None, batch_size: int = None, db=None) -> np.ndarray:
+    """
+    Encodes a list of texts in batches and returns the embeddings as a single float32 matrix.
+    Texts that have been embedded before are served from the embedding cache without touching the model.
 
-    for i, sentence in enumerate(sentences):
-        # chunking_progress.progress(float(i/n), f"({i}/{n}) chunking text...")
-        if len(current_chunk) + len(sentence) + 1 <= chunk_size:
-            current_chunk += sentence + " "
-        else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = previous_sentence + " " + sentence + " "
-        previous_sentence = sentence
+    Args:
+        texts (list[str]): The texts to embed.
+        model_name (str, optional): The model to use. Defaults to settings.embedding_model.
+        batch_size (int, optional): The number of texts per forward pass. Defaults to settings.embedding_batch_size.
+        db (Session, optional): Database session used for the persistent cache tier.
 
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    Returns:
+        np.ndarray: A (len(texts), embedding_dimension) float32 matrix.
+    """
+    model_name = model_name or settings.embedding_model
+    model = registry.get(model_name)
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
 
-    return chunks
+    def encode(uncached_texts):
+        embeddings = model.encode(
+            uncached_texts,
+            batch_size=batch_size or settings.embedding_batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
 
-def text_to_embedding(chunk: str, model=None):
-    if not model:
-        try:
-            import sentence_transformers
-            model = sentence_transformers.SentenceTransformer('all-mpnet-base-v2')
-        except Exception as e:
-            print(f"Error loading Sentence Transformers: {e}")
-            return None
-    embedding = np.array(model.encode(chunk))
-    return embedding
\ No newline at end of file
+    return embedding_cache.get_or_compute(model_name, texts, encode, db=db)
\ No newline at end of file
@@ -0,0 +1,110 @@
+# app/reranking.py
+"""
+Optional cross-encoder re-ranking of first-pass candidates, scored in one batch on a dedicated thread pool.
+If scoring misses the latency budget, the candidates keep their first-pass order.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Optional
+
+from .config import settings
+from .embeddings import cross_encoders
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.rerank_workers, thread_name_prefix="rerank")
+        return _executor
+
+
+class RerankStats:
+    """Counters for the re-ranking stage of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, outcome: str, elapsed_ms: float = 0.0):
+        with self._lock:
+            if outcome == "reranked":
+                self.reranked += 1
+                self.total_ms += elapsed_ms
+            elif outcome == "fallback":
+                self.fallbacks += 1
+            else:
+                self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "errors": self.errors,
+                "average_ms": round(self.total_ms / self.reranked, 3) if self.reranked else 0.0,
+            }
+
+
+stats = RerankStats()
+
+
+def _score(model_name: str, query_text: str, texts: list[str], batch_size: int) -> tuple[list[float], float]:
+    model = cross_encoders.get(model_name)
+    start = time.perf_counter()
+    scores = model.predict([(query_text, t) for t in texts], batch_size=batch_size, show_progress_bar=False)
+    return [float(s) for s in scores], (time.perf_counter() - start) * 1000
+
+
+def rerank_chunks(query_text: str, chunks: list[dict], k: Optional[int] = None, model_name: Optional[str] = None,
+                  budget_ms: Optional[float] = None, batch_size: Optional[int] = None) -> list[dict]:
+    """
+    Keep the top k chunks by cross-encoder relevance to the query, each with a "rerank_score". If scoring fails
+    or exceeds budget_ms, the first k chunks are returned in their first-pass order.
+    """
+    k = k or settings.num_context_chunks
+    budget_ms = budget_ms or settings.rerank_budget_ms
+    if len(chunks) <= 1:
+        return chunks[:k]
+
+    future = _get_executor().submit(
+        _score,
+        model_name or settings.rerank_model,
+        query_text,
+        [c["chunk_text"] for c in chunks],
+        batch_size or settings.rerank_batch_size,
+    )
+    try:
+        scores, elapsed_ms = future.result(timeout=budget_ms / 1000)
+    except TimeoutError:
+        # the scores are discarded when they arrive; cancelling only helps if scoring has not started yet
+        future.cancel()
+        stats.record("fallback")
+        return chunks[:k]
+    except Exception as e:
+        print(f"Error re-ranking chunks: {e}")
+        stats.record("error")
+        return chunks[:k]
+
+    stats.record("reranked", elapsed_ms)
+    reranked = sorted(
+        ({**c, "rerank_score": s} for c, s in zip(chunks, scores)),
+        key=lambda c: c["rerank_score"],
+        reverse=True,
+    )
+    return reranked[:k]
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,168 @@
+# app/response_cache.py
+"""
+Opt-in semantic cache of chatbot answers, keyed by chatbot, model and knowledge base version and searched by
+question embedding. Knowledge base writes bump chatbots.knowledge_version (see invalidate_knowledge_base),
+so stale answers are never served by any process.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+class ResponseCache:
+    """Bounded LRU of answers with a TTL, searched by cosine similarity within each bucket."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # entry_id -> entry, in LRU order
+        self._entries: OrderedDict = OrderedDict()
+        # (chatbot_id, model_name, knowledge_version) -> set of entry ids
+        self._buckets: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets.get(entry["bucket"])
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[entry["bucket"]]
+
+    def lookup(self, chatbot_id, model_name: str, knowledge_version: int, query_embedding,
+               similarity: Optional[float] = None, ttl_seconds: Optional[float] = None) -> Optional[dict]:
+        """
+        Return the stored answer to the most similar earlier question in the bucket, with its "similarity",
+        or None when none is at least similarity similar and younger than ttl_seconds.
+        """
+        similarity = similarity or settings.response_cache_similarity
+        ttl_seconds = min(ttl_seconds or self.ttl_seconds, self.ttl_seconds)
+        query = _normalize(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            entry_ids = list(self._buckets.get((str(chatbot_id), model_name, knowledge_version), ()))
+            live = []
+            for entry_id in entry_ids:
+                age = now - self._entries[entry_id]["created_at"]
+                if age > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                elif age <= ttl_seconds:
+                    live.append(entry_id)
+            if live:
+                scores = np.stack([self._entries[entry_id]["embedding"] for entry_id in live]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= similarity:
+                    self.hits += 1
+                    self._entries.move_to_end(live[best])
+                    entry = self._entries[live[best]]
+                    return {
+                        "answer": entry["answer"],
+                        "question": entry["question"],
+                        "context_chunk_ids": entry["context_chunk_ids"],
+                        "similarity": float(scores[best]),
+                    }
+            self.misses += 1
+            return None
+
+    def store(self, chatbot_id, model_name: str, knowledge_version: int, query_embedding, question: str,
+              answer: str, context_chunk_ids: list = None):
+        """Store an answer, evicting the least recently used entries beyond max_entries."""
+        bucket_key = (str(chatbot_id), model_name, knowledge_version)
+        entry_id = uuid.uuid4()
+        with self._lock:
+            self._entries[entry_id] = {
+                "bucket": bucket_key,
+                "embedding": _normalize(query_embedding),
+                "question": question,
+                "answer": answer,
+                "context_chunk_ids": [str(c) for c in context_chunk_ids or []],
+                "created_at": time.monotonic(),
+            }
+            self._buckets.setdefault(bucket_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, chatbot_id):
+        """Drop every answer of a chatbot from this process."""
+        chatbot_id = str(chatbot_id)
+        with self._lock:
+            for bucket_key in [b for b in self._buckets if b[0] == chatbot_id]:
+                for entry_id in list(self._buckets.get(bucket_key, ())):
+                    self._remove(entry_id)
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _normalize(embedding) -> np.ndarray:
+    embedding = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+def cache_enabled_for(chatbot: models.Chatbot) -> bool:
+    return bool((chatbot.configuration or {}).get("response_cache", settings.response_cache_enabled))
+
+
+def knowledge_version_bump(chatbot_ids):
+    """UPDATE statement that bumps the knowledge base version of the given chatbots."""
+    return (
+        update(models.Chatbot)
+        .where(models.Chatbot.chatbot_id.in_(chatbot_ids))
+        .values(knowledge_version=models.Chatbot.knowledge_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def invalidate_knowledge_base(db: Session, *chatbot_ids):
+    """
+    Record that the knowledge base of the given chatbots changed, so their cached answers are no longer served.
+    The version bump is part of the caller's transaction.
+    """
+    chatbot_ids = {c for c in chatbot_ids if c is not None}
+    if not chatbot_ids:
+        return
+    db.execute(knowledge_version_bump(chatbot_ids))
+    for chatbot_id in chatbot_ids:
+        response_cache.invalidate(chatbot_id)
+
+
+async def invalidate_knowledge_base_async(db, *chatbot_ids):
+    """Same as invalidate_knowledge_base, for an AsyncSession."""
+    chatbot_ids = {c for c in chatbot_ids if c is not None}
+    if not chatbot_ids:
+        return
+    await db.execute(knowledge_version_bump(chatbot_ids))
+    for chatbot_id in chatbot_ids:
+        response_cache.invalidate(chatbot_id)
+
+
+response_cache = ResponseCache(settings.response_cache_size, settings.response_cache_ttl_seconds)
@@ -0,0 +1,217 @@
+# app/retrieval.py
+from typing import Optional
+
+from sqlalchemy import Float, func, literal, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .vector_index import set_search_params, coarse_distance
+from .rag_utils import text_to_embedding
+from .reranking import rerank_chunks
+
+
+def search_chunks(db: Session, chatbot_id, query_embedding, k: Optional[int] = None, similarity_threshold: float = 0.0,
+                  ef_search: Optional[int] = None, probes: Optional[int] = None, quantization: Optional[str] = None,
+                  rerank_factor: Optional[int] = None) -> list[dict]:
+    """
+    The k chunks of a chatbot's knowledge base most similar to the query embedding, ordered and limited in
+    Postgres, each with a "score". With a quantized index, k * rerank_factor candidates are re-ranked by their
+    full-precision distance in the same query. Unset parameters default to the settings.
+    """
+    k = k or settings.num_context_chunks
+    set_search_params(db, ef_search=ef_search or settings.hnsw_ef_search, probes=probes or settings.ivfflat_probes,
+                      iterative_scan=settings.vector_iterative_scan)
+    distance = models.DocumentChunk.chunk_embedding.cosine_distance(query_embedding)
+    query = (
+        db.query(
+            models.DocumentChunk.chunk_id,
+            models.DocumentChunk.document_id,
+            models.DocumentChunk.chunk_text,
+            models.DocumentChunk.chunk_metadata,
+            distance.label("distance"),
+        )
+        .filter(models.DocumentChunk.chatbot_id == chatbot_id)
+    )
+    coarse = coarse_distance(query_embedding, quantization)
+    if coarse is None:
+        # a relaxed iterative scan may return the rows slightly out of order
+        rows = sorted(query.order_by(distance).limit(k).all(), key=lambda row: row.distance)
+    else:
+        candidates = query.order_by(coarse).limit(k * (rerank_factor or settings.quantization_rerank_factor)).subquery()
+        rows = db.execute(select(candidates).order_by(candidates.c.distance).limit(k)).all()
+
+    results = []
+    for row in rows:
+        score = 1.0 - float(row.distance)
+        if score > similarity_threshold:
+            results.append({
+                "chunk_id": row.chunk_id,
+                "document_id": row.document_id,
+                "chunk_text": row.chunk_text,
+                "chunk_metadata": row.chunk_metadata,
+                "score": score,
+                "similarity": score,
+            })
+    return results
+
+
+def hybrid_search_chunks(db: Session, chatbot_id, query_text: str, query_embedding, k: Optional[int] = None,
+                         similarity_threshold: float = 0.0, vector_weight: Optional[float] = None,
+                         lexical_weight: Optional[float] = None, rrf_k: Optional[int] = None,
+                         candidates: Optional[int] = None, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                         quantization: Optional[str] = None, rerank_factor: Optional[int] = None) -> list[dict]:
+    """
+    The k chunks that best match the query by reciprocal rank fusion of the vector ranking and a ts_rank_cd
+    ranking on chunk_tsv, in one SQL statement. Each chunk scores weight / (rrf_k + rank) summed over the
+    rankings it appears in; vector-only matches must pass the similarity threshold.
+    """
+    k = k or settings.num_context_chunks
+    vector_weight = settings.hybrid_vector_weight if vector_weight is None else vector_weight
+    lexical_weight = settings.hybrid_lexical_weight if lexical_weight is None else lexical_weight
+    rrf_k = rrf_k or settings.rrf_k
+    candidates = max(candidates or settings.hybrid_candidates, k)
+    set_search_params(db, ef_search=ef_search or settings.hnsw_ef_search, probes=probes or settings.ivfflat_probes,
+                      iterative_scan=settings.vector_iterative_scan)
+    chunk = models.DocumentChunk
+    distance = chunk.chunk_embedding.cosine_distance(query_embedding)
+
+    vector = select(chunk.chunk_id, distance.label("distance")).where(chunk.chatbot_id == chatbot_id)
+    coarse = coarse_distance(query_embedding, quantization)
+    if coarse is None:
+        vector = vector.order_by(distance).limit(candidates).subquery("vector_candidates")
+    else:
+        coarse_candidates = vector.order_by(coarse).limit(candidates * (rerank_factor or settings.quantization_rerank_factor)).subquery()
+        vector = select(coarse_candidates).order_by(coarse_candidates.c.distance).limit(candidates).subquery("vector_candidates")
+    vector_ranked = select(
+        vector.c.chunk_id,
+        func.row_number().over(order_by=vector.c.distance).label("rank"),
+    ).cte("vector_ranked")
+
+    ts_query = func.websearch_to_tsquery(models.TEXT_SEARCH_CONFIG, query_text)
+    # 1: divide by 1 + log(length), 32: rank / (rank + 1)
+    lexical_score = func.ts_rank_cd(chunk.chunk_tsv, ts_query, 33)
+    lexical = (
+        select(chunk.chunk_id, lexical_score.label("lexical_score"))
+        .where(chunk.chatbot_id == chatbot_id)
+        .where(chunk.chunk_tsv.op("@@")(ts_query))
+        .order_by(lexical_score.desc())
+        .limit(candidates)
+        .subquery("lexical_candidates")
+    )
+    lexical_ranked = select(
+        lexical.c.chunk_id,
+        func.row_number().over(order_by=lexical.c.lexical_score.desc()).label("rank"),
+    ).cte("lexical_ranked")
+
+    fused = select(
+        func.coalesce(vector_ranked.c.chunk_id, lexical_ranked.c.chunk_id).label("chunk_id"),
+        vector_ranked.c.rank.label("vector_rank"),
+        lexical_ranked.c.rank.label("lexical_rank"),
+    ).select_from(
+        vector_ranked.join(lexical_ranked, vector_ranked.c.chunk_id == lexical_ranked.c.chunk_id, full=True)
+    ).cte("fused")
+    score = (
+        func.coalesce(literal(vector_weight, Float) / (rrf_k + fused.c.vector_rank), 0.0)
+        + func.coalesce(literal(lexical_weight, Float) / (rrf_k + fused.c.lexical_rank), 0.0)
+    )
+    rows = db.execute(
+        select(
+            chunk.chunk_id,
+            chunk.document_id,
+            chunk.chunk_text,
+            chunk.chunk_metadata,
+            distance.label("distance"),
+            fused.c.vector_rank,
+            fused.c.lexical_rank,
+            score.label("score"),
+        )
+        .join(fused, chunk.chunk_id == fused.c.chunk_id)
+        .where(or_(fused.c.lexical_rank.isnot(None), distance < 1.0 - similarity_threshold))
+        .order_by(score.desc())
+        .limit(k)
+    ).all()
+
+    return [
+        {
+            "chunk_id": row.chunk_id,
+            "document_id": row.document_id,
+            "chunk_text": row.chunk_text,
+            "chunk_metadata": row.chunk_metadata,
+            "score": float(row.score),
+            "similarity": 1.0 - float(row.distance),
+            "vector_rank": row.vector_rank,
+            "lexical_rank": row.lexical_rank,
+        }
+        for row in rows
+    ]
+
+
+def search_chatbot_chunks(db: Session, chatbot: models.Chatbot, query_text: Optional[str] = None, query_embedding=None,
+                          k: Optional[int] = None, similarity_threshold: Optional[float] = None,
+                          ef_search: Optional[int] = None, probes: Optional[int] = None,
+                          retrieval_mode: Optional[str] = None, rerank: Optional[bool] = None) -> list[dict]:
+    """
+    Search a chatbot's knowledge base with its configured retrieval mode, re-ranking and index parameters,
+    embedding query_text if no embedding is given. Raises ValueError if there is nothing to search with.
+    """
+    if query_embedding is None:
+        if not query_text:
+            raise ValueError("Either query_text or query_embedding is required")
+        embedding = text_to_embedding(query_text, db=db)
+        if embedding is None:
+            raise ValueError("Failed to generate embedding")
+        query_embedding = embedding.tolist()
+
+    configuration = chatbot.configuration or {}
+    retrieval_mode = retrieval_mode or configuration.get("retrieval_mode") or settings.retrieval_mode
+    if retrieval_mode not in ("hybrid", "vector"):
+        raise ValueError(f"Invalid retrieval mode: {retrieval_mode}")
+    k = k or settings.num_context_chunks
+    similarity_threshold = settings.context_similarity_threshold if similarity_threshold is None else similarity_threshold
+    ef_search = ef_search or configuration.get("hnsw_ef_search")
+    probes = probes or configuration.get("ivfflat_probes")
+    rerank_factor = configuration.get("quantization_rerank_factor")
+    if rerank is None:
+        rerank = configuration.get("rerank", settings.rerank_enabled)
+    # the cross-encoder scores the query text, so there is nothing to re-rank against without it
+    rerank = bool(rerank and query_text)
+    first_pass_k = max(configuration.get("rerank_candidates") or settings.rerank_candidates, k) if rerank else k
+
+    if retrieval_mode == "hybrid" and query_text:
+        chunks = hybrid_search_chunks(
+            db,
+            chatbot.chatbot_id,
+            query_text,
+            query_embedding,
+            k=first_pass_k,
+            similarity_threshold=similarity_threshold,
+            vector_weight=configuration.get("hybrid_vector_weight"),
+            lexical_weight=configuration.get("hybrid_lexical_weight"),
+            rrf_k=configuration.get("rrf_k"),
+            candidates=configuration.get("hybrid_candidates"),
+            ef_search=ef_search,
+            probes=probes,
+            rerank_factor=rerank_factor,
+        )
+    else:
+        chunks = search_chunks(
+            db,
+            chatbot.chatbot_id,
+            query_embedding,
+            k=first_pass_k,
+            similarity_threshold=similarity_threshold,
+            ef_search=ef_search,
+            probes=probes,
+            rerank_factor=rerank_factor,
+        )
+
+    if rerank:
+        return rerank_chunks(
+            query_text,
+            chunks,
+            k=k,
+            model_name=configuration.get("rerank_model"),
+            budget_ms=configuration.get("rerank_budget_ms"),
+        )
+    return chunks
@@ -0,0 +1,4 @@
+"""
+Async versions of the database-only routes, served on the async engine when settings.database_mode is "async".
+Each module's router replaces the routes with the same path and method in the sync router of the same name.
+"""
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, undefer
+from ... import schemas, models
+from ...async_database import get_async_db
+from ...fieldsets import fieldset_response, parse_fields, selected_columns
+from ...oauth2 import get_token_claims
+from ...response_cache import invalidate_knowledge_base_async
+from ..chatbots import CHATBOT_LIST_FIELDS
+
+router = APIRouter(
+    prefix="/chatbots",
+    tags=["chatbots"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/", response_model=List[schemas.Chatbot])
+async def get_chatbots(limit: int = 10, offset: int = 0, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    List chatbots. Pass fields, e.g. "chatbot_id,chatbot_name,configuration", to choose the returned fields;
+    by default every field except configuration is returned.
+    """
+    fields = parse_fields(fields, schemas.Chatbot, CHATBOT_LIST_FIELDS)
+    chatbots = await db.execute(select(*selected_columns(models.Chatbot, fields, "chatbot_id")).offset(offset).limit(limit))
+    return fieldset_response(chatbots.mappings(), fields)
+
+@router.get("/{chatbot_id}", response_model=schemas.Chatbot)
+async def get_chatbot(chatbot_id, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Retrieve a chatbot. Pass fields to choose the returned fields; by default every field is returned.
+    """
+    fields = parse_fields(fields, schemas.Chatbot, schemas.Chatbot.model_fields)
+    chatbot = (await db.execute(
+        select(*selected_columns(models.Chatbot, fields, "chatbot_id")).where(models.Chatbot.chatbot_id == chatbot_id)
+    )).mappings().first()
+    if not chatbot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    return fieldset_response([chatbot], fields, single=True)
+
+@router.post("/", response_model=schemas.Chatbot)
+async def create_chatbot(chatbot: schemas.ChatbotCreate, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    new_chatbot = models.Chatbot(**chatbot.model_dump())
+    db.add(new_chatbot)
+    await db.commit()
+    # load the columns the client did not set, deferred ones included, which would otherwise be lazy loaded outside the event loop
+    await db.refresh(new_chatbot, attribute_names=list(schemas.Chatbot.model_fields))
+    return new_chatbot
+
+@router.patch("/{chatbot_id}", response_model=schemas.Chatbot)
+async def update_chatbot(chatbot_id, chatbot: schemas.ChatbotUpdate, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    db_chatbot = await db.scalar(
+        select(models.Chatbot).options(undefer(models.Chatbot.configuration)).where(models.Chatbot.chatbot_id == chatbot_id)
+    )
+    if not db_chatbot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    for key, value in chatbot.model_dump(exclude_unset=True).items():
+        setattr(db_chatbot, key, value)
+    # cached answers were generated with the old settings
+    await invalidate_knowledge_base_async(db, db_chatbot.chatbot_id)
+    await db.commit()
+    return db_chatbot
+
+@router.delete("/{chatbot_id}", response_model=schemas.Chatbot)
+async def delete_chatbot(chatbot_id, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    # the ORM detaches the chatbot's documents and conversations on delete, so they are loaded up front
+    # instead of lazily, which an AsyncSession cannot do
+    db_chatbot = await db.scalar(
+        select(models.Chatbot)
+        .options(
+            undefer(models.Chatbot.configuration),
+            selectinload(models.Chatbot.documents),
+            selectinload(models.Chatbot.conversations),
+        )
+        .where(models.Chatbot.chatbot_id == chatbot_id)
+    )
+    if not db_chatbot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    await db.delete(db_chatbot)
+    await db.commit()
+    return db_chatbot
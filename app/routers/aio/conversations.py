@@ -0,0 +1,189 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import schemas, database, models
+from app.async_database import get_async_db, get_current_user
+from app.config import settings
+from app.fieldsets import fieldset_response, parse_fields, selected_columns
+from app.routers.conversations import CONVERSATION_LIST_FIELDS
+
+router = APIRouter(
+    prefix="/conversations",
+    tags=["Conversations"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+async def conversation_rows(db: AsyncSession, statement, fields: List[str]) -> List[dict]:
+    """Async counterpart of routers.conversations.conversation_rows."""
+    rows = [dict(row) for row in (await db.execute(statement)).mappings()]
+    if "messages" in fields and rows:
+        messages = {}
+        for message in await db.scalars(
+            select(models.Message)
+            .where(models.Message.conversation_id.in_([row["conversation_id"] for row in rows]))
+            .order_by(models.Message.conversation_id, models.Message.timestamp, models.Message.message_id)
+        ):
+            messages.setdefault(message.conversation_id, []).append(schemas.Message.model_validate(message))
+        for row in rows:
+            row["messages"] = messages.get(row["conversation_id"], [])
+    return rows
+
+
+async def conversation_cursor_filter(db: AsyncSession, statement, cursor: Optional[str]):
+    """Async counterpart of routers.conversations.conversation_cursor_filter."""
+    if cursor is None:
+        return statement
+    position = (await db.execute(
+        select(models.Conversation.start_time, models.Conversation.conversation_id).where(models.Conversation.conversation_id == cursor)
+    )).first()
+    if position is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor: conversation not found")
+    return statement.where(
+        tuple_(models.Conversation.start_time, models.Conversation.conversation_id)
+        < tuple_(position.start_time, position.conversation_id)
+    )
+
+
+async def message_position(db: AsyncSession, conversation_id: str, message_id: str):
+    """Async counterpart of routers.conversations.message_position."""
+    position = (await db.execute(
+        select(models.Message.timestamp, models.Message.message_id)
+        .where(models.Message.conversation_id == conversation_id, models.Message.message_id == message_id)
+    )).first()
+    if position is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor: message not found in this conversation")
+    return tuple_(position.timestamp, position.message_id)
+
+
+@router.post("/", response_model=schemas.Conversation)
+async def create_conversation(conversation: schemas.ConversationCreate, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Create a new conversation.
+    """
+    # a new conversation has no messages; setting the collection keeps the response from lazy loading it
+    db_conversation = models.Conversation(**conversation.model_dump(), messages=[])
+    db.add(db_conversation)
+    await db.commit()
+    # load the columns the client did not set, which would otherwise be lazy loaded outside the event loop
+    await db.refresh(db_conversation, attribute_names=CONVERSATION_LIST_FIELDS)
+    return db_conversation
+
+
+@router.get("/{conversation_id}", response_model=schemas.Conversation)
+async def read_conversation(conversation_id: str, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve a conversation by its ID. See the sync route for the fields parameter.
+    """
+    fields = parse_fields(fields, schemas.Conversation, schemas.Conversation.model_fields)
+    statement = (
+        select(*selected_columns(models.Conversation, fields, "conversation_id"))
+        .where(models.Conversation.conversation_id == conversation_id)
+    )
+    rows = await conversation_rows(db, statement, fields)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return fieldset_response(rows, fields, single=True)
+
+
+@router.get("/", response_model=List[schemas.Conversation])
+async def read_conversations(cursor: Optional[str] = None, limit: int = Query(100, ge=1), fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve a page of the current user's conversations, newest first.
+    """
+    fields = parse_fields(fields, schemas.Conversation, CONVERSATION_LIST_FIELDS)
+    statement = (
+        select(*selected_columns(models.Conversation, fields, "conversation_id"))
+        .where(models.Conversation.user_id == current_user.user_id)
+    )
+    statement = await conversation_cursor_filter(db, statement, cursor)
+    statement = (
+        statement.order_by(models.Conversation.start_time.desc(), models.Conversation.conversation_id.desc())
+        .limit(min(limit, settings.max_page_size))
+    )
+    return fieldset_response(await conversation_rows(db, statement, fields), fields)
+
+@router.get("/by_chatbot/{chatbot_id}", response_model=List[schemas.Conversation])
+async def read_conversations_by_chatbot(chatbot_id: str, db: AsyncSession = Depends(get_async_db), cursor: Optional[str] = None, limit: int = Query(10, ge=1), fields: Optional[str] = None, current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve a page of a chatbot's conversations, newest first.
+    """
+    fields = parse_fields(fields, schemas.Conversation, CONVERSATION_LIST_FIELDS)
+    owner_id = await db.scalar(select(models.Chatbot.owner_id).where(models.Chatbot.chatbot_id == chatbot_id))
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+    if current_user.user_id != owner_id:
+        raise HTTPException(status_code=403, detail="Forbidden: You are not the owner of this chatbot")
+    statement = (
+        select(*selected_columns(models.Conversation, fields, "conversation_id"))
+        .where(models.Conversation.chatbot_id == chatbot_id)
+    )
+    statement = await conversation_cursor_filter(db, statement, cursor)
+    statement = (
+        statement.order_by(models.Conversation.start_time.desc(), models.Conversation.conversation_id.desc())
+        .limit(min(limit, settings.max_page_size))
+    )
+    return fieldset_response(await conversation_rows(db, statement, fields), fields)
+
+
+@router.get("/{conversation_id}/messages", response_model=List[schemas.Message])
+async def read_messages(conversation_id: str, before: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve a page of a conversation's messages, keyed on (timestamp, message_id). See the sync route for
+    the cursor semantics.
+    """
+    user_id = await db.scalar(select(models.Conversation.user_id).where(models.Conversation.conversation_id == conversation_id))
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to read this conversation")
+    limit = min(limit or settings.message_page_size, settings.max_page_size)
+
+    key = tuple_(models.Message.timestamp, models.Message.message_id)
+    statement = select(models.Message).where(models.Message.conversation_id == conversation_id)
+    if before is not None:
+        statement = statement.where(key < await message_position(db, conversation_id, before))
+    if after is not None:
+        statement = statement.where(key > await message_position(db, conversation_id, after))
+
+    if after is not None:
+        return (await db.scalars(statement.order_by(models.Message.timestamp, models.Message.message_id).limit(limit))).all()
+    # walk the index backwards from the end of the page and return the page oldest first
+    messages = (await db.scalars(
+        statement.order_by(models.Message.timestamp.desc(), models.Message.message_id.desc()).limit(limit)
+    )).all()
+    return messages[::-1]
+
+
+@router.post("/{conversation_id}/messages", response_model=List[schemas.Message])
+async def append_messages(conversation_id: str, append_request: schemas.ConversationMessagesAppend, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Append new messages to a conversation with a single INSERT; see database.append_messages_statement.
+    """
+    user_id = await db.scalar(select(models.Conversation.user_id).where(models.Conversation.conversation_id == conversation_id))
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to modify this conversation")
+
+    conversation_values = append_request.model_dump(exclude_unset=True, exclude={"messages"})
+    statement = database.append_messages_statement(conversation_id, [m.model_dump() for m in append_request.messages], **conversation_values)
+    messages = (await db.execute(statement)).all() if statement is not None else []
+    await db.commit()
+    return messages
+
+
+@router.delete("/{conversation_id}", response_model=schemas.ConversationDeletionConfirmation)
+async def delete_conversation(conversation_id: str, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Delete a conversation. Its messages are deleted by the database.
+    """
+    conversation = await db.scalar(select(models.Conversation).where(models.Conversation.conversation_id == conversation_id))
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    await db.delete(conversation)
+    await db.commit()
+    return schemas.ConversationDeletionConfirmation(conversation_id=conversation.conversation_id)
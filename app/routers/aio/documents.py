@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app import models, schemas
+from app.async_database import get_async_db, get_current_user
+from app.fieldsets import fieldset_response, parse_fields, selected_columns
+from app.response_cache import invalidate_knowledge_base_async
+from app.routers.documents import DOCUMENT_LIST_FIELDS
+
+router = APIRouter(
+    prefix="/documents",
+    tags=["Documents"],
+    responses={404: {"description": "Not found"}},
+)
+
+async def chatbot_owner_id(db: AsyncSession, chatbot_id):
+    return await db.scalar(select(models.Chatbot.owner_id).where(models.Chatbot.chatbot_id == chatbot_id))
+
+@router.get("/{document_id}", response_model=schemas.KnowledgeBaseDocument)
+async def read_document(document_id: str, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve a document by its ID. See the sync route for the fields parameter.
+    """
+    fields = parse_fields(fields, schemas.KnowledgeBaseDocument, schemas.KnowledgeBaseDocument.model_fields)
+    db_document = (await db.execute(
+        select(*selected_columns(models.KnowledgeBaseDocument, fields, "document_id", "chatbot_id"))
+        .where(models.KnowledgeBaseDocument.document_id == document_id)
+    )).mappings().first()
+    if db_document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
+    # Verify that the current user owns the chatbot associated with the document
+    if await chatbot_owner_id(db, db_document["chatbot_id"]) != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this document")
+
+    return fieldset_response([db_document], fields, single=True)
+
+@router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(document_id: str, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Delete a document. Its chunks are deleted by the database.
+    """
+    chatbot_id = await db.scalar(
+        select(models.KnowledgeBaseDocument.chatbot_id).where(models.KnowledgeBaseDocument.document_id == document_id)
+    )
+    if chatbot_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
+    # Verify that the current user owns the chatbot associated with the document
+    if await chatbot_owner_id(db, chatbot_id) != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this document")
+
+    await db.execute(delete(models.KnowledgeBaseDocument).where(models.KnowledgeBaseDocument.document_id == document_id))
+    await invalidate_knowledge_base_async(db, chatbot_id)
+    await db.commit()
+    return
+
+@router.get("/by_chatbot/{chatbot_id}", response_model=List[schemas.KnowledgeBaseDocument])
+async def read_documents_by_chatbot(chatbot_id: str, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve all documents associated with a given chatbot ID. By default every field except raw_text is returned.
+    """
+    fields = parse_fields(fields, schemas.KnowledgeBaseDocument, DOCUMENT_LIST_FIELDS)
+    # Verify that the chatbot exists and the current user owns it
+    owner_id = await chatbot_owner_id(db, chatbot_id)
+    if owner_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    if owner_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view documents for this chatbot")
+
+    documents = await db.execute(
+        select(*selected_columns(models.KnowledgeBaseDocument, fields, "document_id"))
+        .where(models.KnowledgeBaseDocument.chatbot_id == chatbot_id)
+    )
+    return fieldset_response(documents.mappings(), fields)
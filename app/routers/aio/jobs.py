@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from app import models, schemas
+from app.async_database import get_async_db, get_current_user
+from app.routers.jobs import job_response
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/", response_model=List[schemas.IngestionJob])
+async def read_jobs(skip: int = 0, limit: int = 20, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve the current user's most recent ingestion jobs.
+    """
+    jobs = await db.scalars(
+        select(models.IngestionJob)
+        .where(models.IngestionJob.owner_id == current_user.user_id)
+        .order_by(models.IngestionJob.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return [job_response(job) for job in jobs]
+
+
+@router.get("/{job_id}", response_model=schemas.IngestionJob)
+async def read_job(job_id: str, db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve an ingestion job with its per-stage progress and throughput.
+    """
+    job = await db.scalar(select(models.IngestionJob).where(models.IngestionJob.job_id == job_id))
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job.owner_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this job")
+    return job_response(job)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+import uuid
+from ... import async_database, schemas
+from ...async_database import get_async_db
+from ...oauth2 import get_token_claims
+
+router = APIRouter(
+    prefix="/users",
+    tags=["users"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.post("/", response_model=schemas.User)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_database.create_user(db, user)
+
+
+@router.patch("/{user_id}", response_model=schemas.User)
+async def modify_user(user_id: uuid.UUID, user: schemas.UserModify, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    if user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to modify this user")
+    return await async_database.modify_user(db, user_id, user)
+
+
+@router.get("/", response_model=List[schemas.User])
+async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    return await async_database.get_users(db, skip, limit)
+
+
+@router.get("/{user_id}", response_model=schemas.User)
+async def read_user(user_id: str, db: AsyncSession = Depends(get_async_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    return await async_database.get_user(db, user_id)
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from typing import List, Optional
+from sqlalchemy.orm import undefer
 import uuid
 from .. import schemas, models
-from ..dependencies import oauth2_scheme
+from ..oauth2 import get_token_claims
 from ..database import get_db
+from ..fieldsets import default_fields, fieldset_response, parse_fields, selected_columns
+from ..response_cache import invalidate_knowledge_base, response_cache
 
 router = APIRouter(
     prefix="/chatbots",
@@ -11,20 +14,32 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# chatbots listed without a fields parameter leave out their configuration
+CHATBOT_LIST_FIELDS = default_fields(schemas.Chatbot, exclude={"configuration"})
+
 @router.get("/", response_model=List[schemas.Chatbot])
-def get_chatbots(limit: int = 10, offset: int = 0, db = Depends(get_db), current_user=Depends(oauth2_scheme)):
-    chatbots = db.query(models.Chatbot).offset(offset).limit(limit).all()
-    return chatbots
+def get_chatbots(limit: int = 10, offset: int = 0, fields: Optional[str] = None, db = Depends(get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    List chatbots. Pass fields, e.g. "chatbot_id,chatbot_name,configuration", to choose the returned fields;
+    by default every field except configuration is returned.
+    """
+    fields = parse_fields(fields, schemas.Chatbot, CHATBOT_LIST_FIELDS)
+    chatbots = db.query(*selected_columns(models.Chatbot, fields, "chatbot_id")).offset(offset).limit(limit).all()
+    return fieldset_response((chatbot._mapping for chatbot in chatbots), fields)
 
 @router.get("/{chatbot_id}", response_model=schemas.Chatbot)
-def get_chatbot(chatbot_id, db = Depends(get_db), current_user=Depends(oauth2_scheme)):
-    chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
+def get_chatbot(chatbot_id, fields: Optional[str] = None, db = Depends(get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Retrieve a chatbot. Pass fields to choose the returned fields; by default every field is returned.
+    """
+    fields = parse_fields(fields, schemas.Chatbot, schemas.Chatbot.model_fields)
+    chatbot = db.query(*selected_columns(models.Chatbot, fields, "chatbot_id")).filter(models.Chatbot.chatbot_id == chatbot_id).first()
     if not chatbot:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
-    return chatbot
+    return fieldset_response([chatbot._mapping], fields, single=True)
 
 @router.post("/", response_model=schemas.Chatbot)
-def create_chatbot(chatbot: schemas.ChatbotCreate, db = Depends(get_db), current_user=Depends(oauth2_scheme)):
+def create_chatbot(chatbot: schemas.ChatbotCreate, db = Depends(get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
     new_chatbot = models.Chatbot(**chatbot.model_dump())
     db.add(new_chatbot)
     db.commit()
@@ -32,21 +47,31 @@ def create_chatbot(chatbot: schemas.ChatbotCreate, db = Depends(get_db), current
     return new_chatbot
 
 @router.patch("/{chatbot_id}", response_model=schemas.Chatbot)
-def update_chatbot(chatbot_id, chatbot: schemas.ChatbotUpdate, db = Depends(get_db), current_user=Depends(oauth2_scheme)):
+def update_chatbot(chatbot_id, chatbot: schemas.ChatbotUpdate, db = Depends(get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
     db_chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
     if not db_chatbot:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
     for key, value in chatbot.model_dump(exclude_unset=True).items():
         setattr(db_chatbot, key, value)
+    # cached answers were generated with the old settings
+    invalidate_knowledge_base(db, db_chatbot.chatbot_id)
     db.commit()
     db.refresh(db_chatbot)
     return db_chatbot
 
 @router.delete("/{chatbot_id}", response_model=schemas.Chatbot)
-def delete_chatbot(chatbot_id, db = Depends(get_db), current_user=Depends(oauth2_scheme)):
-    db_chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
+def delete_chatbot(chatbot_id, db = Depends(get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    # the deleted chatbot is returned, so its configuration has to be loaded before it is deleted
+    db_chatbot = db.query(models.Chatbot).options(undefer(models.Chatbot.configuration)).filter(models.Chatbot.chatbot_id == chatbot_id).first()
     if not db_chatbot:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
     db.delete(db_chatbot)
     db.commit()
-    return db_chatbot
\ No newline at end of file
+    return db_chatbot
+
+@router.get("/response_cache/stats", response_model=schemas.ResponseCacheStats)
+def get_response_cache_stats(current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Report hit, miss, eviction and invalidation counters of the response cache in this process.
+    """
+    return response_cache.stats()
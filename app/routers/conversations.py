@@ -1,10 +1,25 @@
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
+import time
+import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTasks
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload
 
 from app import schemas, database, models
+from app.chat import answer_pieces, assemble_prompt, llm_service_for_chatbot, prompt_token_budget, sse_event
+from app.config import settings
+from app.conversation_index import index_remembered_conversation
+from app.conversation_memory import memory_enabled_for, summarize_conversation_task, unsummarized_messages_query
+from app.fieldsets import default_fields, fieldset_response, parse_fields, selected_columns
 from app.oauth2 import get_current_user
+from app.rag_utils import text_to_embedding
+from app.response_cache import cache_enabled_for, response_cache
+from app.retrieval import search_chatbot_chunks
 
 router = APIRouter(
     prefix="/conversations",
@@ -12,9 +27,12 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# conversations listed without a fields parameter leave out their messages
+CONVERSATION_LIST_FIELDS = default_fields(schemas.Conversation, exclude={"messages"})
+
 
 @router.post("/", response_model=schemas.Conversation)
-def create_conversation(conversation: schemas.ConversationCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def create_conversation(conversation: schemas.ConversationCreate, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Create a new conversation.
     """
@@ -25,39 +43,116 @@ def create_conversation(conversation: schemas.ConversationCreate, db: Session =
     return db_conversation
 
 
+def conversation_rows(db: Session, query, fields: List[str]) -> List[dict]:
+    """
+    Run a query over conversation columns and attach the messages of each conversation if they were requested,
+    loading them for the whole page in one query.
+    """
+    rows = [dict(row._mapping) for row in query]
+    if "messages" in fields and rows:
+        messages = {}
+        for message in (
+            db.query(models.Message)
+            .filter(models.Message.conversation_id.in_([row["conversation_id"] for row in rows]))
+            .order_by(models.Message.conversation_id, models.Message.timestamp, models.Message.message_id)
+        ):
+            messages.setdefault(message.conversation_id, []).append(schemas.Message.model_validate(message))
+        for row in rows:
+            row["messages"] = messages.get(row["conversation_id"], [])
+    return rows
+
+
 @router.get("/{conversation_id}", response_model=schemas.Conversation)
-def read_conversation(conversation_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def read_conversation(conversation_id: str, fields: Optional[str] = None, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Retrieve a conversation by its ID.
+
+    Args:
+        conversation_id (str): ID of the conversation.
+        fields (str, optional): Comma-separated fields to return, e.g. "description,is_remembered".
+            Defaults to all fields, including every message; see GET /conversations/{conversation_id}/messages
+            for paging through the messages instead.
     """
-    conversation = db.query(models.Conversation).filter(models.Conversation.conversation_id == conversation_id).first()
-    if conversation is None:
+    fields = parse_fields(fields, schemas.Conversation, schemas.Conversation.model_fields)
+    query = (
+        db.query(*selected_columns(models.Conversation, fields, "conversation_id"))
+        .filter(models.Conversation.conversation_id == conversation_id)
+    )
+    rows = conversation_rows(db, query, fields)
+    if not rows:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation
+    return fieldset_response(rows, fields, single=True)
+
+
+def conversation_cursor_filter(db: Session, query, cursor: Optional[str]):
+    """
+    Restrict a conversation list, ordered newest first by (start_time, conversation_id), to the conversations
+    after the cursor, which is the ID of the last conversation of the previous page.
+    """
+    if cursor is None:
+        return query
+    position = db.query(models.Conversation.start_time, models.Conversation.conversation_id).filter(models.Conversation.conversation_id == cursor).first()
+    if position is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor: conversation not found")
+    return query.filter(
+        tuple_(models.Conversation.start_time, models.Conversation.conversation_id)
+        < tuple_(position.start_time, position.conversation_id)
+    )
 
 
 @router.get("/", response_model=List[schemas.Conversation])
-def read_conversations(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def read_conversations(cursor: Optional[str] = None, limit: int = Query(100, ge=1), fields: Optional[str] = None, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
     """
-    Retrieve a list of conversations.
+    Retrieve a page of the current user's conversations, newest first.
+
+    Args:
+        cursor (str, optional): ID of the last conversation of the previous page.
+        limit (int): Maximum number of conversations, capped at settings.max_page_size.
+        fields (str, optional): Comma-separated fields to return. Defaults to every field except messages.
     """
-    conversations = db.query(models.Conversation).filter(models.Conversation.user_id == current_user.user_id).offset(skip).limit(limit).all()
-    return conversations
+    fields = parse_fields(fields, schemas.Conversation, CONVERSATION_LIST_FIELDS)
+    query = (
+        db.query(*selected_columns(models.Conversation, fields, "conversation_id"))
+        .filter(models.Conversation.user_id == current_user.user_id)
+    )
+    query = conversation_cursor_filter(db, query, cursor)
+    query = (
+        query.order_by(models.Conversation.start_time.desc(), models.Conversation.conversation_id.desc())
+        .limit(min(limit, settings.max_page_size))
+    )
+    return fieldset_response(conversation_rows(db, query, fields), fields)
 
 @router.get("/by_chatbot/{chatbot_id}", response_model=List[schemas.Conversation])
-def read_conversations_by_chatbot(chatbot_id: str, db: Session = Depends(database.get_db), skip: int = 0, limit: int = 10, current_user: models.User = Depends(get_current_user)):
+def read_conversations_by_chatbot(chatbot_id: str, db: Session = Depends(database.get_db), cursor: Optional[str] = None, limit: int = Query(10, ge=1), fields: Optional[str] = None, current_user: schemas.User = Depends(get_current_user)):
     """
-    Retrieve a list of conversations by chatbot ID.
+    Retrieve a page of a chatbot's conversations, newest first.
+
+    Args:
+        chatbot_id (str): ID of the chatbot.
+        cursor (str, optional): ID of the last conversation of the previous page.
+        limit (int): Maximum number of conversations, capped at settings.max_page_size.
+        fields (str, optional): Comma-separated fields to return. Defaults to every field except messages.
     """
+    fields = parse_fields(fields, schemas.Conversation, CONVERSATION_LIST_FIELDS)
     chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
+    if chatbot is None:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
     if current_user.user_id != chatbot.owner_id:
         raise HTTPException(status_code=403, detail="Forbidden: You are not the owner of this chatbot")
-    conversations = db.query(models.Conversation).filter(models.Conversation.chatbot_id == chatbot_id).offset(skip).limit(limit).all()
-    return conversations
+    query = (
+        db.query(*selected_columns(models.Conversation, fields, "conversation_id"))
+        .filter(models.Conversation.chatbot_id == chatbot_id)
+    )
+    query = conversation_cursor_filter(db, query, cursor)
+    query = (
+        query.order_by(models.Conversation.start_time.desc(), models.Conversation.conversation_id.desc())
+        .limit(min(limit, settings.max_page_size))
+    )
+    return fieldset_response(conversation_rows(db, query, fields), fields)
 
 
 @router.put("/", response_model=schemas.Conversation)
-def update_conversation(conversation: schemas.ConversationUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def update_conversation(conversation: schemas.ConversationUpdate, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Update a conversation.
     """
@@ -65,31 +160,127 @@ def update_conversation(conversation: schemas.ConversationUpdate, db: Session =
     if db_conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    if conversation.messages:
-        messages = [schemas.MessageCreate(**message.model_dump()) for message in conversation.messages]
+    messages = [schemas.MessageCreate(**message.model_dump()) for message in conversation.messages or []]
 
     # Update the conversation object with all values except for messages
     for key, value in conversation.model_dump(exclude_unset=True, exclude={"messages"}).items():
         setattr(db_conversation, key, value)
 
-    # update the Messages in the conversation by updating the Messages table in the database
+    # update the Messages in the conversation by adding the ones that are not in the Messages table yet,
+    # looking up the existing message IDs in a single query
+    message_ids = [message.message_id for message in messages if message.message_id is not None]
+    existing_ids = set()
+    if message_ids:
+        existing_ids = {row.message_id for row in db.query(models.Message.message_id).filter(models.Message.message_id.in_(message_ids))}
     for message in messages:
-        if message.message_id is None:
+        if message.message_id not in existing_ids:
             db_message = models.Message(**message.model_dump())
             db.add(db_message)
-        else:
-            db_message = db.query(models.Message).filter(models.Message.message_id == message.message_id).first()
-            if db_message is None:
-                db_message = models.Message(**message.model_dump())
-                db.add(db_message)
 
     db.commit()
     db.refresh(db_conversation)
     return db_conversation
 
 
+def message_position(db: Session, conversation_id: str, message_id: str):
+    """The (timestamp, message_id) key of a message used as a pagination cursor."""
+    position = (
+        db.query(models.Message.timestamp, models.Message.message_id)
+        .filter(models.Message.conversation_id == conversation_id, models.Message.message_id == message_id)
+        .first()
+    )
+    if position is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor: message not found in this conversation")
+    return tuple_(position.timestamp, position.message_id)
+
+
+@router.get("/{conversation_id}/messages", response_model=List[schemas.Message])
+def read_messages(conversation_id: str, before: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve a page of a conversation's messages. Pages are keyed on (timestamp, message_id) instead of an offset,
+    so loading a page of a long conversation costs the same wherever it is, and clients that already show some
+    messages can fetch only the ones they have not seen.
+
+    Args:
+        conversation_id (str): ID of the conversation.
+        before (str, optional): ID of a message; only messages before it are returned.
+        after (str, optional): ID of a message; only messages after it are returned.
+        limit (int, optional): Maximum number of messages. Defaults to settings.message_page_size and is capped
+            at settings.max_page_size.
+
+    Returns:
+        List[schemas.Message]: Messages oldest first. With after, the earliest messages after it; otherwise the
+            latest messages before `before`, or the latest messages of the conversation. A page shorter than
+            limit means there are no more messages in that direction.
+    """
+    conversation = db.query(models.Conversation.user_id).filter(models.Conversation.conversation_id == conversation_id).first()
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to read this conversation")
+    limit = min(limit or settings.message_page_size, settings.max_page_size)
+
+    key = tuple_(models.Message.timestamp, models.Message.message_id)
+    query = db.query(models.Message).filter(models.Message.conversation_id == conversation_id)
+    if before is not None:
+        query = query.filter(key < message_position(db, conversation_id, before))
+    if after is not None:
+        query = query.filter(key > message_position(db, conversation_id, after))
+
+    if after is not None:
+        return query.order_by(models.Message.timestamp, models.Message.message_id).limit(limit).all()
+    # walk the index backwards from the end of the page and return the page oldest first
+    messages = query.order_by(models.Message.timestamp.desc(), models.Message.message_id.desc()).limit(limit).all()
+    return messages[::-1]
+
+
+@router.post("/{conversation_id}/messages", response_model=List[schemas.Message])
+def append_messages(conversation_id: str, append_request: schemas.ConversationMessagesAppend, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Append new messages to a conversation. Only the new messages are sent and inserted, so the cost of saving a
+    turn does not grow with the length of the conversation.
+    """
+    conversation = db.query(models.Conversation.user_id).filter(models.Conversation.conversation_id == conversation_id).first()
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to modify this conversation")
+
+    conversation_values = append_request.model_dump(exclude_unset=True, exclude={"messages"})
+    messages = database.append_messages(db, conversation_id, [m.model_dump() for m in append_request.messages], **conversation_values)
+    db.commit()
+    return messages
+
+
+@router.post("/{conversation_id}/remember", response_model=schemas.RememberedConversationIndex)
+def remember_conversation(conversation_id: str, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Mark a conversation as remembered and add any messages that are not indexed yet to the chatbot's knowledge base.
+    """
+    conversation = db.query(models.Conversation).filter(models.Conversation.conversation_id == conversation_id).first()
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to modify this conversation")
+    conversation.is_remembered = True
+    db.commit()
+    indexed_messages = index_remembered_conversation(db, conversation.conversation_id)
+    return schemas.RememberedConversationIndex(conversation_id=conversation.conversation_id, indexed_messages=indexed_messages)
+
+
+def index_remembered_conversation_task(conversation_id):
+    db = database.SessionLocal()
+    try:
+        index_remembered_conversation(db, conversation_id)
+    except Exception as e:
+        db.rollback()
+        print(f"Error indexing remembered conversation {conversation_id}: {e}")
+    finally:
+        db.close()
+
+
 @router.delete("/{conversation_id}", response_model=schemas.ConversationDeletionConfirmation)
-def delete_conversation(conversation_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(get_current_user)):
+def delete_conversation(conversation_id: str, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Delete a conversation.
     """
@@ -100,3 +291,170 @@ def delete_conversation(conversation_id: str, db: Session = Depends(database.get
     db.delete(conversation)
     db.commit()
     return schemas.ConversationDeletionConfirmation(conversation_id=conversation.conversation_id)
+
+
+@router.post("/{conversation_id}/chat")
+def chat(conversation_id: str, chat_request: schemas.ChatRequest, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Run one chat turn server-side: retrieve knowledge base context, generate the response and persist both messages.
+
+    The response is streamed as Server-Sent Events: one "token" event per generated piece of text, then a single
+    "summary" event with the persisted message IDs and timings, or an "error" event if generation failed.
+    Chatbots with the response cache enabled answer near-duplicates of earlier questions from the cache,
+    streamed in the same format.
+    """
+    started = time.perf_counter()
+    conversation = (
+        db.query(models.Conversation)
+        .options(joinedload(models.Conversation.chatbot).undefer(models.Chatbot.configuration))
+        .filter(models.Conversation.conversation_id == conversation_id)
+        .first()
+    )
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to chat in this conversation")
+    chatbot = conversation.chatbot
+    conversation_id = conversation.conversation_id
+
+    # only the messages after the rolling summary are loaded; the summary stands in for the rest
+    use_memory = memory_enabled_for(chatbot)
+    summary = conversation.summary if use_memory else None
+    if summary:
+        messages = unsummarized_messages_query(db, conversation)
+    else:
+        messages = (
+            db.query(models.Message)
+            .filter(models.Message.conversation_id == conversation_id)
+            .order_by(models.Message.timestamp, models.Message.message_id)
+        )
+    history = [{"role": m.role, "message_text": m.message_text} for m in messages]
+    is_first_turn = not history and not conversation.summary
+    configuration = chatbot.configuration or {}
+    cache_key = (chatbot.chatbot_id, chatbot.model_name, chatbot.knowledge_version)
+    use_cache = cache_enabled_for(chatbot) and (is_first_turn or not settings.response_cache_first_turn_only)
+    query_embedding = None
+    cached = None
+    if use_cache:
+        # the embedding is reused by retrieval on a miss
+        query_embedding = text_to_embedding(chat_request.message_text, db=db)
+        if query_embedding is not None:
+            cached = response_cache.lookup(
+                *cache_key,
+                query_embedding,
+                similarity=configuration.get("response_cache_similarity"),
+                ttl_seconds=configuration.get("response_cache_ttl_seconds"),
+            )
+
+    context_chunks = []
+    if cached is None:
+        try:
+            context_chunks = search_chatbot_chunks(db, chatbot, query_text=chat_request.message_text, query_embedding=query_embedding)
+        except Exception as e:
+            print(f"Error retrieving knowledge base context: {e}")
+    context_chunk_ids = cached["context_chunk_ids"] if cached else [chunk["chunk_id"] for chunk in context_chunks]
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    try:
+        service = llm_service_for_chatbot(chatbot, asynchronous=True, stream=True)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Chatbot configuration error: {e}")
+    prompt, prompt_report = assemble_prompt(
+        history,
+        chat_request.message_text,
+        context_chunks,
+        prompt_token_budget(chatbot),
+        system_context_allowed=service.system_context_allowed,
+        summary=summary,
+    )
+    if cached is None:
+        context_chunk_ids = [c for c in context_chunk_ids if c not in prompt_report["dropped_chunk_ids"]]
+    user_message = {
+        "message_id": uuid.uuid4(),
+        "role": "user",
+        "message_text": chat_request.message_text,
+        "timestamp": datetime.now(timezone.utc),
+    }
+    is_remembered = conversation.is_remembered if chat_request.is_remembered is None else chat_request.is_remembered
+    description = conversation.description
+    if is_first_turn:
+        description = chat_request.message_text[:30]+"..." if len(chat_request.message_text) > 30 else chat_request.message_text
+
+    def save_turn(saved_messages: list[dict]):
+        # the request's session is closed once streaming starts, so the turn is persisted with its own session
+        write_db = database.SessionLocal()
+        try:
+            values = {"description": description}
+            if chat_request.is_remembered is not None:
+                values["is_remembered"] = chat_request.is_remembered
+            database.append_messages(write_db, conversation_id, saved_messages, **values)
+            write_db.commit()
+        except Exception:
+            write_db.rollback()
+            raise
+        finally:
+            write_db.close()
+
+    async def generate():
+        if cached is not None:
+            for piece in answer_pieces(cached["answer"]):
+                yield piece
+        else:
+            async for piece in service.iter_text(prompt):
+                yield piece
+
+    async def event_stream():
+        pieces = []
+        first_token_ms = None
+        try:
+            async for piece in generate():
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                pieces.append(piece)
+                yield sse_event("token", {"content": piece})
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield sse_event("error", {"detail": "Response generation was interrupted"})
+            return
+        if not pieces:
+            yield sse_event("error", {"detail": "Failed to generate response from the chatbot"})
+            return
+        response_text = "".join(pieces)
+
+        assistant_message = {
+            "message_id": uuid.uuid4(),
+            "role": "assistant",
+            "message_text": response_text,
+            "timestamp": datetime.now(timezone.utc),
+        }
+        try:
+            await run_in_threadpool(save_turn, [user_message, assistant_message])
+        except Exception as e:
+            print(f"Error saving chat turn: {e}")
+            yield sse_event("error", {"detail": "Failed to save the conversation"})
+            return
+        if use_cache and cached is None and query_embedding is not None:
+            response_cache.store(*cache_key, query_embedding, chat_request.message_text, response_text, context_chunk_ids)
+
+        yield sse_event("summary", {
+            "conversation_id": conversation_id,
+            "description": description,
+            "user_message": user_message,
+            "assistant_message": assistant_message,
+            "context_chunk_ids": context_chunk_ids,
+            "cached": cached is not None,
+            "cache_similarity": cached["similarity"] if cached else None,
+            "prompt": None if cached else prompt_report,
+            "retrieval_ms": round(retrieval_ms, 1),
+            "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    background = BackgroundTasks()
+    # new messages of remembered conversations are indexed into the knowledge base after the response is sent
+    if is_remembered:
+        background.add_task(index_remembered_conversation_task, conversation_id)
+    # older turns are folded into the summary once enough of them have accumulated
+    if use_memory and len(history) + 2 > settings.summary_trigger_messages:
+        background.add_task(summarize_conversation_task, conversation_id)
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}, background=background)
\ No newline at end of file
@@ -1,23 +1,82 @@
 from ..database import get_db
-from ..rag_utils import get_embedded_chunks, text_to_embedding
+from ..rag_utils import get_embedded_chunks, text_to_embedding, texts_to_embeddings
+from ..embeddings import registry, cross_encoders
+from ..reranking import stats as rerank_stats
+from ..embedding_cache import embedding_cache
+from ..config import settings
+from ..retrieval import search_chatbot_chunks
+from ..embedding_transport import negotiate, decode_embedding, embeddings_response, chunks_response, JSON
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from ..response_cache import invalidate_knowledge_base
+from ..ingestion import spool_upload, enqueue_job, ingest_file, UploadTooLarge, remove_spool_file
+
+from ..fieldsets import default_fields, parse_fields, selected_columns, fieldset_response
+
+from fastapi import APIRouter, Depends, HTTPException, status, File, Form, UploadFile, Request
+from fastapi.routing import APIRoute
+from sqlalchemy.orm import Session, selectinload, undefer
+from typing import List, Optional
 
 from app import models, schemas
-from app.oauth2 import get_current_user
+from app.oauth2 import get_current_user, get_token_claims
+from app.routers.jobs import job_response
 
 import uuid
 
+# room for the multipart boundaries and the other form fields next to the file
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Route that answers 413 to a multipart upload whose Content-Length header is over settings.upload_max_bytes
+    before the body is read, so an oversized file is not spooled by the form parser first. Uploads sent without
+    a Content-Length (chunked) are still limited by spool_upload.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def upload_limit_handler(request: Request):
+            content_length = request.headers.get("content-length", "")
+            if (request.headers.get("content-type", "").startswith("multipart/form-data") and content_length.isdigit()
+                    and int(content_length) > settings.upload_max_bytes + UPLOAD_FORM_OVERHEAD_BYTES):
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                    detail=f"Uploaded file is larger than {settings.upload_max_bytes} bytes")
+            return await handler(request)
+
+        return upload_limit_handler
+
+
 router = APIRouter(
     prefix="/documents",
     tags=["Documents"],
     responses={404: {"description": "Not found"}},
+    route_class=UploadLimitRoute,
 )
 
+# documents listed without a fields parameter leave out their full text
+DOCUMENT_LIST_FIELDS = default_fields(schemas.KnowledgeBaseDocument, exclude={"raw_text"})
+
+def build_chunk_objects(chunks, document_id, chatbot_id) -> List[models.DocumentChunk]:
+    """
+    Convert chunk schemas into DocumentChunk rows, copying the parent document's chatbot_id onto each chunk.
+    Embeddings may be lists of floats or base64 strings.
+    """
+    return [
+        models.DocumentChunk(
+            chunk_id=uuid.uuid4(),
+            document_id=document_id,
+            chatbot_id=chatbot_id,
+            chunk_text=chunk.chunk_text,
+            chunk_metadata=chunk.chunk_metadata,
+            chunk_embedding=decode_embedding(chunk.chunk_embedding),
+        )
+        for chunk in chunks or []
+    ]
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
-def create_document(document: schemas.KnowledgeBaseDocumentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def create_document(document: schemas.KnowledgeBaseDocumentCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Create a new document.
     """
@@ -29,15 +88,7 @@ def create_document(document: schemas.KnowledgeBaseDocumentCreate, db: Session =
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add documents to this chatbot")
 
     # convert the list of dictionaries from the document into a list of DocumentChunk objects
-    chunk_objects = []
-    if document.chunks:
-        for chunk in document.chunks:
-            chunk_objects.append(models.DocumentChunk(
-                chunk_id=uuid.uuid4(),
-                document_id=document.document_id,
-                chunk_text=chunk.chunk_text,
-                chunk_embedding=chunk.chunk_embedding,
-            ))
+    chunk_objects = build_chunk_objects(document.chunks, document.document_id, document.chatbot_id)
 
     # create a sqlalchemy object with the same fields but using the DocumentChunk objects instead of the dictionaries
     db_document = models.KnowledgeBaseDocument(
@@ -51,16 +102,77 @@ def create_document(document: schemas.KnowledgeBaseDocumentCreate, db: Session =
         )
     
     db.add(db_document)
+    invalidate_knowledge_base(db, document.chatbot_id)
     db.commit()
     db.refresh(db_document)
     return db_document
 
+@router.post("/ingest", response_model=schemas.IngestionJob, status_code=status.HTTP_202_ACCEPTED)
+def ingest_document(chatbot_id: uuid.UUID = Form(...), context: str = Form(""), file: UploadFile = File(...), db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Queue an uploaded file for background ingestion into a chatbot's knowledge base.
+    Returns the job right away; its progress can be followed at /jobs/{job_id}.
+    """
+    chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
+    if not chatbot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    if chatbot.owner_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add documents to this chatbot")
+
+    try:
+        file_path = spool_upload(file.file, file.filename)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    job = enqueue_job(db, current_user.user_id, chatbot.chatbot_id, file.filename, file_path, context=context)
+    return job_response(job)
+
+@router.post("/upload", response_model=schemas.KnowledgeBaseDocumentInfo, status_code=status.HTTP_201_CREATED)
+def upload_document(chatbot_id: uuid.UUID = Form(...), context: str = Form(""), file: UploadFile = File(...), db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Upload a raw file and add it to a chatbot's knowledge base in the same request.
+    The file is spooled to disk and extracted, chunked and embedded on the server; only the document metadata is returned.
+    """
+    chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
+    if not chatbot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    if chatbot.owner_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add documents to this chatbot")
+
+    try:
+        file_path = spool_upload(file.file, file.filename)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    try:
+        db_document = ingest_file(db, uuid.uuid4(), chatbot.chatbot_id, file.filename, file_path, context=context)
+        db.commit()
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File is neither a PDF nor UTF-8 text")
+    except Exception as e:
+        db.rollback()
+        print(f"Error ingesting uploaded file {file.filename}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to ingest the uploaded file")
+    finally:
+        remove_spool_file(file_path)
+
+    db.refresh(db_document)
+    return db_document
+
 @router.get("/{document_id}", response_model=schemas.KnowledgeBaseDocument)
-def read_document(document_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_document(document_id: str, fields: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Retrieve a document by its ID.
+
+    Args:
+        document_id (str): ID of the document.
+        fields (str, optional): Comma-separated fields to return, e.g. "file_name,context". Defaults to all fields.
     """
-    db_document = db.query(models.KnowledgeBaseDocument).filter(models.KnowledgeBaseDocument.document_id == document_id).first()
+    fields = parse_fields(fields, schemas.KnowledgeBaseDocument, schemas.KnowledgeBaseDocument.model_fields)
+    db_document = (
+        db.query(*selected_columns(models.KnowledgeBaseDocument, fields, "document_id", "chatbot_id"))
+        .filter(models.KnowledgeBaseDocument.document_id == document_id)
+        .first()
+    )
     if db_document is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
 
@@ -69,10 +181,10 @@ def read_document(document_id: str, db: Session = Depends(get_db), current_user:
     if chatbot.owner_id != current_user.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this document")
 
-    return db_document
+    return fieldset_response([db_document._mapping], fields, single=True)
 
 @router.put("/{document_id}", response_model=schemas.KnowledgeBaseDocumentUpdate)
-def update_document(document_id: str, document: schemas.KnowledgeBaseDocumentUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def update_document(document_id: str, document: schemas.KnowledgeBaseDocumentUpdate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Update a document.
     """
@@ -86,16 +198,33 @@ def update_document(document_id: str, document: schemas.KnowledgeBaseDocumentUpd
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to modify this document")
 
     # Update the document with the new values
-    for key, value in document.model_dump().items():
+    for key, value in document.model_dump(exclude={"chunks"}).items():
         if value is not None:
             setattr(db_document, key, value)
 
+    # chunks are only replaced when the request explicitly includes them
+    if "chunks" in document.model_fields_set:
+        db_document.chunks = build_chunk_objects(document.chunks, db_document.document_id, db_document.chatbot_id)
+    elif "chatbot_id" in document.model_fields_set:
+        db.query(models.DocumentChunk).filter(models.DocumentChunk.document_id == db_document.document_id).update(
+            {models.DocumentChunk.chatbot_id: db_document.chatbot_id}, synchronize_session=False
+        )
+
+    invalidate_knowledge_base(db, chatbot.chatbot_id, db_document.chatbot_id)
     db.commit()
-    db.refresh(db_document)
-    return db_document
+    # the response includes the heavy columns, so load them with the document instead of one query per chunk
+    return (
+        db.query(models.KnowledgeBaseDocument)
+        .options(
+            undefer(models.KnowledgeBaseDocument.raw_text),
+            selectinload(models.KnowledgeBaseDocument.chunks).undefer(models.DocumentChunk.chunk_embedding),
+        )
+        .filter(models.KnowledgeBaseDocument.document_id == db_document.document_id)
+        .one()
+    )
 
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_document(document_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def delete_document(document_id: str, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Delete a document.
     """
@@ -109,14 +238,20 @@ def delete_document(document_id: str, db: Session = Depends(get_db), current_use
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this document")
 
     db.delete(db_document)
+    invalidate_knowledge_base(db, db_document.chatbot_id)
     db.commit()
     return
 
 @router.get("/by_chatbot/{chatbot_id}", response_model=List[schemas.KnowledgeBaseDocument])
-def read_documents_by_chatbot(chatbot_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_documents_by_chatbot(chatbot_id: str, fields: Optional[str] = None, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Retrieve all documents associated with a given chatbot ID.
+
+    Args:
+        chatbot_id (str): ID of the chatbot.
+        fields (str, optional): Comma-separated fields to return. Defaults to every field except raw_text.
     """
+    fields = parse_fields(fields, schemas.KnowledgeBaseDocument, DOCUMENT_LIST_FIELDS)
     # Verify that the chatbot exists and the current user owns it
     chatbot = db.query(models.Chatbot).filter(models.Chatbot.chatbot_id == chatbot_id).first()
     if not chatbot:
@@ -124,50 +259,131 @@ def read_documents_by_chatbot(chatbot_id: str, db: Session = Depends(get_db), cu
     if chatbot.owner_id != current_user.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view documents for this chatbot")
 
-    documents = db.query(models.KnowledgeBaseDocument).filter(models.KnowledgeBaseDocument.chatbot_id == chatbot_id).all()
-    return documents
+    documents = (
+        db.query(*selected_columns(models.KnowledgeBaseDocument, fields, "document_id"))
+        .filter(models.KnowledgeBaseDocument.chatbot_id == chatbot_id)
+        .all()
+    )
+    return fieldset_response((document._mapping for document in documents), fields)
 
 @router.post("/document_chunks", response_model=List[schemas.DocumentChunk])
-def get_document_chunks(document_ids: List[str], db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_document_chunks(document_ids: List[str], request: Request, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Retrieve document chunks by document IDs.
+    Embeddings are encoded according to the Accept header; see embedding_transport.
     """
-
-    chunks = db.query(models.DocumentChunk).filter(models.DocumentChunk.document_id.in_(document_ids)).all()
-    return chunks
+    media_type = negotiate(request.headers.get("accept"))
+    chunks = (
+        db.query(models.DocumentChunk)
+        .options(undefer(models.DocumentChunk.chunk_embedding))
+        .filter(models.DocumentChunk.document_id.in_(document_ids))
+        .all()
+    )
+    return chunks_response(media_type, [
+        {
+            "chunk_id": chunk.chunk_id,
+            "document_id": chunk.document_id,
+            "chunk_text": chunk.chunk_text,
+            "chunk_metadata": chunk.chunk_metadata,
+            "chunk_embedding": chunk.chunk_embedding,
+        }
+        for chunk in chunks
+    ])
 
 @router.post("/create_embedded_document_chunks", response_model=List[schemas.DocumentChunk])
-def create_embedded_document_chunks(embedded_document_request: schemas.CreateEmbeddedDocumentChunks, db: Session = Depends(get_db)):
+def create_embedded_document_chunks(embedded_document_request: schemas.CreateEmbeddedDocumentChunks, request: Request, db: Session = Depends(get_db)):
     """
     Create embedded document chunks from the provided text.
+    Embeddings are encoded according to the Accept header; see embedding_transport.
     """
+    media_type = negotiate(request.headers.get("accept"))
     embedded_chunks = get_embedded_chunks(
         embedded_document_request.document_text,
         embedded_document_request.document_id,
         embedded_document_request.chunk_metadata,
+        db=db,
     )
-
-    # Convert the list of dictionaries to a list of DocumentChunk objects
-    document_chunks = []
-    for chunk in embedded_chunks:
-        document_chunks.append(
-            schemas.DocumentChunk(
-                chunk_id=uuid.UUID(chunk["chunk_id"]),
-                document_id=uuid.UUID(chunk["document_id"]),
-                chunk_text=chunk["chunk_text"],
-                chunk_embedding=chunk["chunk_embedding"],
-                chunk_metadata=chunk.get("chunk_metadata"),
-            )
-        )
-    return document_chunks
+    return chunks_response(media_type, embedded_chunks)
 
 @router.post("/get_chunk_embedding", response_model=schemas.ChunkEmbedding)
-def get_chunk_embedding(chunk_embedding_request: schemas.ChunkEmbedding):
+def get_chunk_embedding(chunk_embedding_request: schemas.ChunkEmbedding, request: Request, db: Session = Depends(get_db)):
     """
     Generate an embedding for the given text.
+    With an application/x-npy, application/msgpack or base64 JSON Accept header only the embedding is returned,
+    encoded like the /embed response; see embedding_transport.
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    embedding = text_to_embedding(chunk_embedding_request.chunk_text, db=db)
+    if embedding is None:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate embedding")
+    if media_type != JSON:
+        return embeddings_response(media_type, settings.embedding_model, embedding[None, :])
+    return schemas.ChunkEmbedding(chunk_text=chunk_embedding_request.chunk_text, chunk_embedding=embedding.tolist())
+
+@router.post("/search", response_model=List[schemas.ChunkSearchResult])
+def search_document_chunks(search_request: schemas.ChunkSearchRequest, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve the top k chunks of a chatbot's knowledge base that are most similar to the query.
+    Either query_text or query_embedding must be provided.
+    """
+    chatbot = (
+        db.query(models.Chatbot)
+        .options(undefer(models.Chatbot.configuration))
+        .filter(models.Chatbot.chatbot_id == search_request.chatbot_id)
+        .first()
+    )
+    if not chatbot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chatbot not found")
+    if chatbot.owner_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to search documents for this chatbot")
+
+    try:
+        return search_chatbot_chunks(
+            db,
+            chatbot,
+            query_text=search_request.query_text,
+            query_embedding=decode_embedding(search_request.query_embedding),
+            k=search_request.k,
+            similarity_threshold=search_request.similarity_threshold,
+            ef_search=search_request.ef_search,
+            probes=search_request.probes,
+            retrieval_mode=search_request.retrieval_mode,
+            rerank=search_request.rerank,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+@router.post("/embed", response_model=schemas.EmbedResponse)
+def embed_texts(embed_request: schemas.EmbedRequest, request: Request, db: Session = Depends(get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Generate embeddings for a batch of texts in a single call. Embeddings are returned in the same order as the texts,
+    encoded according to the Accept header; see embedding_transport.
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    try:
+        embeddings = texts_to_embeddings(embed_request.texts, db=db)
+    except Exception as e:
+        print(f"Error generating embeddings: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate embeddings")
+    return embeddings_response(media_type, settings.embedding_model, embeddings)
+
+@router.get("/embeddings/models", response_model=List[schemas.EmbeddingModelStats])
+def get_embedding_model_stats(current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Report load time and memory usage of the embedding and re-ranking models loaded in this process.
+    """
+    return registry.stats() + cross_encoders.stats()
+
+@router.get("/embeddings/cache", response_model=schemas.EmbeddingCacheStats)
+def get_embedding_cache_stats(current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Report hit, miss and eviction counters of the embedding cache in this process.
+    """
+    return embedding_cache.stats()
+
+@router.get("/rerank/stats", response_model=schemas.RerankStats)
+def get_rerank_stats(current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Report how often re-ranking finished within its latency budget in this process, and how long it took.
     """
-    embedding = text_to_embedding(chunk_embedding_request.chunk_text)
-    if embedding is not None:
-        return schemas.ChunkEmbedding(chunk_text=chunk_embedding_request.chunk_text, chunk_embedding=embedding.tolist())
-    else:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate embedding")
\ No newline at end of file
+    return rerank_stats.snapshot()
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from app import models, schemas
+from app.database import get_db
+from app.ingestion import cancel_job, job_throughput
+from app.oauth2 import get_current_user
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+def job_response(job: models.IngestionJob) -> schemas.IngestionJob:
+    response = schemas.IngestionJob.model_validate(job)
+    response.throughput = job_throughput(job)
+    return response
+
+
+def get_owned_job(job_id: str, db: Session, current_user: schemas.User) -> models.IngestionJob:
+    job = db.query(models.IngestionJob).filter(models.IngestionJob.job_id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job.owner_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this job")
+    return job
+
+
+@router.get("/", response_model=List[schemas.IngestionJob])
+def read_jobs(skip: int = 0, limit: int = 20, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve the current user's most recent ingestion jobs.
+    """
+    jobs = (
+        db.query(models.IngestionJob)
+        .filter(models.IngestionJob.owner_id == current_user.user_id)
+        .order_by(models.IngestionJob.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [job_response(job) for job in jobs]
+
+
+@router.get("/{job_id}", response_model=schemas.IngestionJob)
+def read_job(job_id: str, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieve an ingestion job with its per-stage progress and throughput.
+    """
+    return job_response(get_owned_job(job_id, db, current_user))
+
+
+@router.post("/{job_id}/cancel", response_model=schemas.IngestionJob)
+def cancel_ingestion_job(job_id: str, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    """
+    Cancel an ingestion job. Running jobs stop at their next progress update.
+    """
+    job = get_owned_job(job_id, db, current_user)
+    return job_response(cancel_job(db, job))
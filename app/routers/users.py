@@ -3,7 +3,9 @@ from sqlalchemy.orm import Session
 from .. import database, schemas
 from ..database import get_db
 from typing import List
-from ..dependencies import oauth2_scheme
+import uuid
+from ..oauth2 import get_token_claims
+from ..user_cache import user_cache
 
 router = APIRouter(
     prefix="/users",
@@ -17,17 +19,25 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)
 
 
 @router.patch("/{user_id}", response_model=schemas.User)
-def modify_user(user_id: str, user: schemas.UserModify, db: Session = Depends(database.get_db), current_user=Depends(oauth2_scheme)):
-    if user.user_id != current_user.user_id:
+def modify_user(user_id: uuid.UUID, user: schemas.UserModify, db: Session = Depends(database.get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
+    if user_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="Not authorized to modify this user")
     return database.modify_user(db, user_id, user)
 
 
+@router.get("/cache/stats", response_model=schemas.UserCacheStats)
+def get_user_cache_stats(current_user: schemas.TokenData = Depends(get_token_claims)):
+    """
+    Report hit, miss, eviction and invalidation counters of the authentication user cache in this process.
+    """
+    return user_cache.stats()
+
+
 @router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user=Depends(oauth2_scheme)):
+def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
     return database.get_users(db, skip, limit)
 
 
 @router.get("/{user_id}", response_model=schemas.User)
-def read_user(user_id: str, db: Session = Depends(database.get_db), current_user=Depends(oauth2_scheme)):
+def read_user(user_id: str, db: Session = Depends(database.get_db), current_user: schemas.TokenData = Depends(get_token_claims)):
     return database.get_user(db, user_id)
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import AfterValidator, BaseModel, Field, conint, constr
+from typing import Annotated, Optional, List, Union
 import uuid
 from datetime import datetime
+from .config import settings
+from .embedding_transport import validate_embedding
 
 """User schemas"""
 
@@ -62,6 +64,11 @@ class ChatbotUpdate(BaseModel):
 
 """Document chunk schemas"""
 
+# embeddings in request bodies are either lists of floats or base64 strings of little-endian float32 values,
+# which are decoded by embedding_transport.decode_embedding; validate_embedding checks they decode to the right dimension.
+# Lists are taken as raw JSON arrays and converted by numpy in one call instead of validating each float.
+Embedding = Annotated[Union[list, str], AfterValidator(validate_embedding)]
+
 class DocumentChunkBase(BaseModel):
     chunk_id: uuid.UUID
     document_id: uuid.UUID
@@ -69,7 +76,7 @@ class DocumentChunkBase(BaseModel):
 
 class DocumentChunk(DocumentChunkBase):
     chunk_text: str
-    chunk_embedding: List[float]
+    chunk_embedding: Embedding
 
 class DocumentChunkText(DocumentChunkBase):
     chunk_text: str
@@ -84,7 +91,69 @@ class CreateEmbeddedDocumentChunks(BaseModel):
 
 class ChunkEmbedding(BaseModel):
     chunk_text: str
-    chunk_embedding: Optional[List[float]] = None
+    chunk_embedding: Optional[Embedding] = None
+
+class ChunkSearchRequest(BaseModel):
+    chatbot_id: uuid.UUID
+    query_text: Optional[str] = None
+    query_embedding: Optional[Embedding] = None
+    k: Optional[conint(ge=1, le=settings.max_page_size)] = None
+    similarity_threshold: Optional[float] = None
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    retrieval_mode: Optional[str] = None
+    rerank: Optional[bool] = None
+
+class ChunkSearchResult(BaseModel):
+    chunk_id: uuid.UUID
+    document_id: uuid.UUID
+    chunk_text: str
+    chunk_metadata: Optional[dict] = None
+    score: float
+    similarity: Optional[float] = None
+    vector_rank: Optional[int] = None
+    lexical_rank: Optional[int] = None
+    rerank_score: Optional[float] = None
+
+class EmbedRequest(BaseModel):
+    texts: List[constr(max_length=settings.embed_max_text_chars)] = Field(max_length=settings.embed_max_texts)
+
+class EmbedResponse(BaseModel):
+    model_name: str
+    embeddings: List[List[float]]
+
+class EmbeddingModelStats(BaseModel):
+    model_name: str
+    load_seconds: float
+    memory_bytes: int
+    embedding_dimension: Optional[int] = None
+    max_seq_length: Optional[int] = None
+    loaded_at: float
+
+class RerankStats(BaseModel):
+    reranked: int
+    fallbacks: int
+    errors: int
+    average_ms: float
+
+class ResponseCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    hit_rate: float
+
+class EmbeddingCacheStats(BaseModel):
+    memory_entries: int
+    max_memory_entries: int
+    memory_hits: int
+    persistent_hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
 
 """RAG document schemas"""
 
@@ -100,6 +169,14 @@ class KnowledgeBaseDocument(KnowledgeBaseDocumentBase):
     document_metadata: Optional[dict] = None
     raw_text: Optional[str] = None
 
+class KnowledgeBaseDocumentInfo(KnowledgeBaseDocumentBase):
+    created_at: datetime
+    context: Optional[str] = None
+    document_metadata: Optional[dict] = None
+
+    class Config:
+        from_attributes = True
+
 class KnowledgeBaseDocumentCreate(KnowledgeBaseDocumentBase):
     context: str
     created_at: datetime
@@ -131,6 +208,10 @@ class MessageCreate(MessageBase):
     conversation_id: uuid.UUID
     timestamp: datetime
 
+class MessageAppend(MessageBase):
+    message_id: Optional[uuid.UUID] = None
+    timestamp: Optional[datetime] = None
+
 class Message(MessageBase):
     conversation_id: uuid.UUID
     message_id: uuid.UUID
@@ -151,6 +232,8 @@ class Conversation(ConversationBase):
     start_time: datetime
     last_modified: Optional[datetime] = None
     is_remembered: Optional[bool] = None
+    summary: Optional[str] = None
+    summary_message_id: Optional[uuid.UUID] = None
     messages: List[Message] = []
 
     class Config:
@@ -173,13 +256,60 @@ class ConversationUpdate(ConversationBase):
 class ConversationDeletionConfirmation(ConversationBase):
     pass
 
+class ConversationMessagesAppend(BaseModel):
+    messages: List[MessageAppend]
+    description: Optional[str] = None
+    is_remembered: Optional[bool] = None
+
+class RememberedConversationIndex(ConversationBase):
+    indexed_messages: int
+
+class ChatRequest(BaseModel):
+    message_text: str
+    is_remembered: Optional[bool] = None
+
+"""Ingestion job schemas"""
+
+class StageProgress(BaseModel):
+    done: int = 0
+    total: Optional[int] = None
+    seconds: float = 0.0
+
+class IngestionJob(BaseModel):
+    job_id: uuid.UUID
+    chatbot_id: uuid.UUID
+    document_id: uuid.UUID
+    file_name: str
+    status: str
+    stage: Optional[str] = None
+    progress: dict[str, StageProgress] = {}
+    throughput: dict[str, Optional[float]] = {}
+    error: Optional[str] = None
+    attempts: int = 0
+    cancel_requested: bool = False
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 """JWT and auth schemas"""
 
 class TokenData(BaseModel):
-    user_id: str
+    user_id: uuid.UUID
     username: str
     issued_at: int
 
+class UserCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    hit_rate: float
+
 class Token(BaseModel):
     access_token: str
     token_type: str
\ No newline at end of file
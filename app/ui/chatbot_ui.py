@@ -61,6 +61,7 @@ def chatbot_page():
         st.session_state.conversation_id = conversation['conversation_id']
         st.session_state.conversation_description = conversation['description']
         st.session_state.conversation_start_time = conversation['start_time']
+        st.session_state.remember_conversation = conversation.get('is_remembered') or False
         st.session_state.conversations_loaded = False  # Reset when navigating away
         st.session_state.current_page = "conversation_page"
 
@@ -1,26 +1,8 @@
 import streamlit as st
-import os
 import datetime
 import requests
-import uuid
-import os
+import time
 from pprint import pprint
-from ..rag_utils import delete_cache, read_text_file, read_pdf_file
-from ..config import settings
-
-
-def cache_file(upload_file):
-    # set temp dir and file path
-    temp_dir = os.path.join(settings.app_dir, "tmp")
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-    file_path = os.path.join(temp_dir, upload_file["file_name"])
-
-    # save file to temp dir
-    with open(file_path, "wb") as f:
-        f.write(upload_file["file_buffer"])
-
-    return os.path.abspath(file_path)
 
 
 def get_knowledge_base_documents(chatbot_id):
@@ -52,6 +34,33 @@ def format_upload_date(date_str):
         return date_str
 
 
+def wait_for_ingestion_jobs(job_ids):
+    """Polls the ingestion jobs and shows their progress until all of them have finished."""
+    progress_bars = {job_id: st.progress(0.0, "queued...") for job_id in job_ids}
+    pending = set(job_ids)
+    while pending:
+        for job_id in list(pending):
+            response = requests.get(
+                f"http://localhost:8000/jobs/{job_id}",
+                headers={"Authorization": f"Bearer {st.session_state.access_token}"},
+            )
+            if response.status_code != 200:
+                pending.discard(job_id)
+                continue
+            job = response.json()
+            if job["status"] in ("succeeded", "failed", "cancelled"):
+                pending.discard(job_id)
+                if job["status"] == "failed":
+                    st.error(f"Failed to ingest {job['file_name']}: {job['error']}")
+                progress_bars[job_id].progress(1.0, f"{job['file_name']}: {job['status']}")
+            elif job["stage"]:
+                stage_progress = job["progress"].get(job["stage"], {})
+                fraction = stage_progress["done"] / stage_progress["total"] if stage_progress.get("total") else 0.0
+                progress_bars[job_id].progress(min(fraction, 1.0), f"{job['file_name']}: {job['stage']} ({stage_progress.get('done', 0)}/{stage_progress.get('total') or '?'})")
+        if pending:
+            time.sleep(1)
+
+
 def knowledge_base_page():
     """
     Streamlit UI for managing knowledge base documents.
@@ -137,56 +146,34 @@ def knowledge_base_page():
         if st.button("⬅️ Back to Chatbot Page", use_container_width=True):
             del st.session_state.uploaded_documents
             st.session_state.new_documents = []
-            delete_cache()
             st.session_state.current_page = "chatbot_page"
             st.rerun()
     with col2:
         if st.button("Save"):
             try:
                 with st.spinner("Uploading document..."):
+                    job_ids = []
                     for document in st.session_state.new_documents:
                         with st.spinner(f"uploading {document['file_name']}"):
-                            new_document_id = str(uuid.uuid4())
-                            if os.path.splitext(document['file_name'])[1] == ".pdf":
-                                document_text = read_pdf_file(document['file_content'])
-                            else:
-                                document_text = read_text_file(document['file_content'])
-                            # chunks = get_embedded_chunks(document_text, new_document_id)
-                            # replaced get_embedded_chunks with a call to the create_embedded_document_chunks route
-                        with st.spinner(f"embedding document chunks for {document['file_name']}"):
-                            chunks_response = requests.post(
-                                "http://localhost:8000/documents/create_embedded_document_chunks",
-                                json={
-                                    "document_id": new_document_id,
-                                    "document_text": document_text,
+                            # the API extracts, chunks and embeds the file in the background
+                            response = requests.post(
+                                "http://localhost:8000/documents/ingest",
+                                data={
+                                    "chatbot_id": st.session_state.chatbot_id,
+                                    "context": document["context"],
                                 },
+                                files={"file": (document["file_name"], document["file_content"])},
                                 headers={
                                     "Authorization": f"Bearer {st.session_state.access_token}"
                                 },
                             )
-                            if chunks_response.status_code == 200:
-                                chunks = chunks_response.json()
+                            if response.status_code == 202:
+                                job_ids.append(response.json()["job_id"])
                             else:
                                 raise Exception(
-                                    f"Failed to create embedded document chunks: {chunks_response.status_code} - {chunks_response.text}"
+                                    f"Failed to upload {document['file_name']}: {response.status_code} - {response.text}"
                                 )
-                        with st.spinner(f"saving {document['file_name']} to database..."):
-                            json_params = {
-                                "document_id": new_document_id,
-                                "chatbot_id": st.session_state.chatbot_id,
-                                "file_name": document["file_name"],
-                                "raw_text": document_text,
-                                "context": document["context"],
-                                "created_at": document["created_at"],
-                                "chunks": chunks,
-                            }
-                            requests.post(
-                                "http://localhost:8000/documents/",
-                                json=json_params,
-                                headers={
-                                    "Authorization": f"Bearer {st.session_state.access_token}"
-                                },
-                            )
+                    wait_for_ingestion_jobs(job_ids)
                 del st.session_state.uploaded_documents
                 st.session_state.new_documents = []
             except Exception as e:
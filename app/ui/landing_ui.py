@@ -66,6 +66,7 @@ def landing_page():
     try:
         response = requests.get(
             "http://localhost:8000/chatbots/",
+            params={"fields": "chatbot_id,chatbot_name,description,model_name,configuration"},
             headers={"Authorization": f"Bearer {st.session_state.access_token}"}
         )
         if response.status_code == 200:
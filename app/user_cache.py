@@ -0,0 +1,74 @@
+# app/user_cache.py
+"""
+Cache of the users resolved from access tokens, as schemas.User snapshots. database.modify_user drops the
+modified user in this process; other processes serve it for at most user_cache_ttl_seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import schemas
+from .config import settings
+
+
+class UserCache:
+    """Bounded LRU of users with a TTL, keyed by user id."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # user_id -> (created_at, user), in LRU order
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id) -> Optional[schemas.User]:
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, user) -> schemas.User:
+        """Store a snapshot of a user (a models.User or schemas.User) and return it."""
+        snapshot = schemas.User.model_validate(user)
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return snapshot
+        with self._lock:
+            self._entries[str(snapshot.user_id)] = (time.monotonic(), snapshot)
+            self._entries.move_to_end(str(snapshot.user_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(str(user_id), None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
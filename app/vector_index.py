@@ -0,0 +1,265 @@
+# app/vector_index.py
+"""
+Management of the approximate nearest-neighbour indexes on documentchunks.chunk_embedding, e.g.:
+
+    python -m app.vector_index create
+    python -m app.vector_index rebuild --type ivfflat --quantization binary
+    python -m app.vector_index report --sample 5000
+
+With embedding_quantization "halfvec" or "binary" (pgvector 0.7+), the indexes are built on a compact
+expression of the embedding and retrieval re-ranks their candidates at full precision. Expression indexes
+avoid storing, backfilling and syncing a quantized copy of each embedding; changing modes is only a rebuild.
+
+An approximate index cannot apply the chatbot_id filter during the scan, so a chatbot with a small share of
+the table can get fewer than k results. vector_iterative_scan (pgvector 0.8+) keeps scanning until enough
+rows pass the filter; on older versions, raise ef_search or probes.
+"""
+import argparse
+from typing import Optional
+
+import numpy as np
+from pgvector.sqlalchemy import BIT, HALFVEC
+from sqlalchemy import Index, cast, func, text
+from sqlalchemy.schema import CreateIndex
+
+from . import models
+from .config import settings
+from .quantization import QUANTIZATION_MODES, REPORT_MODES, recall_report
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+
+OPERATOR_CLASSES = {
+    "none": "vector_cosine_ops",
+    "halfvec": "halfvec_cosine_ops",
+    "binary": "bit_hamming_ops",
+}
+
+# Index objects attach themselves to the table when constructed, so each one is only built once
+_indexes = {}
+
+# (major, minor) version of the vector extension in the database, looked up once per process
+_pgvector_version = None
+
+
+def index_name(index_type: str, quantization: str = None) -> str:
+    quantization = quantization or settings.embedding_quantization
+    if quantization == "none":
+        return f"ix_documentchunks_chunk_embedding_{index_type}"
+    return f"ix_documentchunks_chunk_embedding_{index_type}_{quantization}"
+
+
+def indexed_expression(quantization: str = None):
+    """The expression the vector indexes are built on for a quantization mode."""
+    quantization = quantization or settings.embedding_quantization
+    column = models.DocumentChunk.chunk_embedding
+    dimension = column.type.dim
+    if quantization == "none":
+        return column
+    if quantization == "halfvec":
+        return cast(column, HALFVEC(dimension))
+    if quantization == "binary":
+        return cast(func.binary_quantize(column), BIT(dimension))
+    raise ValueError(f"Invalid embedding quantization: {quantization}")
+
+
+def coarse_distance(query_embedding, quantization: str = None):
+    """
+    Distance between the indexed expression and the query for a quantization mode, so the search can use
+    that mode's index. Returns None for full precision, where the cosine distance itself is indexed.
+    """
+    quantization = quantization or settings.embedding_quantization
+    if quantization == "none":
+        return None
+    expression = indexed_expression(quantization)
+    if quantization == "halfvec":
+        return expression.cosine_distance(query_embedding)
+    # binary_quantize sets a bit for every positive dimension
+    query_bits = "".join("1" if x > 0 else "0" for x in np.asarray(query_embedding, dtype=np.float32))
+    return expression.hamming_distance(query_bits)
+
+
+def build_index(index_type: str, quantization: str = None) -> Index:
+    """The SQLAlchemy definition of a vector index with the configured build parameters, bound to documentchunks."""
+    quantization = quantization or settings.embedding_quantization
+    if (index_type, quantization) in _indexes:
+        return _indexes[(index_type, quantization)]
+    if index_type == "hnsw":
+        params = {"m": settings.hnsw_m, "ef_construction": settings.hnsw_ef_construction}
+    elif index_type == "ivfflat":
+        params = {"lists": settings.ivfflat_lists}
+    else:
+        raise ValueError(f"Invalid vector index type: {index_type}")
+    if quantization == "none":
+        expression, key = models.DocumentChunk.chunk_embedding, "chunk_embedding"
+    else:
+        key = f"chunk_embedding_{quantization}"
+        expression = indexed_expression(quantization).label(key)
+    _indexes[(index_type, quantization)] = Index(
+        index_name(index_type, quantization),
+        expression,
+        postgresql_using=index_type,
+        postgresql_with=params,
+        postgresql_ops={key: OPERATOR_CLASSES[quantization]},
+        postgresql_concurrently=True,
+    )
+    return _indexes[(index_type, quantization)]
+
+
+def configured_index_types(index_type: str = None) -> tuple:
+    index_type = index_type or settings.vector_index_type
+    if index_type == "none":
+        return ()
+    if index_type == "all":
+        return INDEX_TYPES
+    return (index_type,)
+
+
+def index_is_valid(conn, name: str) -> Optional[bool]:
+    """Whether an index exists and is usable; False if a failed concurrent build left it invalid, None if it is missing."""
+    return conn.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name}).scalar()
+
+
+def create_index_concurrently(conn, index: Index, name: str):
+    """Build an index definition under the given name with CREATE INDEX CONCURRENTLY, which does not block writes."""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+    conn.execute(text(ddl.replace(f" {index.name} ON ", f" {name} ON ", 1)))
+
+
+def create_vector_indexes(engine, index_type: str = None, quantization: str = None):
+    """Create the configured vector indexes concurrently if they do not already exist, replacing invalid leftovers."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for t in configured_index_types(index_type):
+            index = build_index(t, quantization)
+            valid = index_is_valid(conn, index.name)
+            if valid:
+                continue
+            if valid is False:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+            create_index_concurrently(conn, index, index.name)
+
+
+def reindex_vector_indexes(engine, index_type: str = None, quantization: str = None):
+    """Rebuild the configured vector indexes in place without blocking writes."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for t in configured_index_types(index_type):
+            conn.execute(text(f"REINDEX INDEX CONCURRENTLY {index_name(t, quantization)}"))
+        conn.execute(text(f"ANALYZE {models.DocumentChunk.__tablename__}"))
+
+
+def rebuild_vector_indexes(engine, index_type: str = None, quantization: str = None):
+    """
+    Recreate the configured vector indexes with the current build parameters. Each new index is built
+    concurrently under a temporary name and swapped in, so searches keep an index and writes are not blocked.
+    IVFFlat indexes should be rebuilt after bulk loads so their lists are trained on the new data.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for t in configured_index_types(index_type):
+            index = build_index(t, quantization)
+            new_name = f"{index.name}_new"
+            # left over from an interrupted rebuild
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))
+            create_index_concurrently(conn, index, new_name)
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+            conn.execute(text(f"ALTER INDEX {new_name} RENAME TO {index.name}"))
+        conn.execute(text(f"ANALYZE {models.DocumentChunk.__tablename__}"))
+
+
+def quantization_report(db, chatbot_id=None, sample: int = 2000, queries: int = 100, k: int = None,
+                        rerank_factor: int = None) -> dict:
+    """
+    Recall and memory of every quantization mode, measured on a random sample of stored embeddings with part
+    held out as queries, plus the sizes of the vector indexes that exist.
+    """
+    k = k or settings.num_context_chunks
+    rerank_factor = rerank_factor or settings.quantization_rerank_factor
+    query = db.query(models.DocumentChunk.chunk_embedding).filter(models.DocumentChunk.chunk_embedding.isnot(None))
+    if chatbot_id:
+        query = query.filter(models.DocumentChunk.chatbot_id == chatbot_id)
+    embeddings = np.asarray([row.chunk_embedding for row in query.order_by(func.random()).limit(sample + queries)], dtype=np.float32)
+    if len(embeddings) <= queries:
+        raise ValueError(f"Need more than {queries} stored embeddings, found {len(embeddings)}")
+    total_chunks = db.query(func.count(models.DocumentChunk.chunk_id)).scalar()
+
+    modes = recall_report(embeddings[queries:], embeddings[:queries], k=k, rerank_factor=rerank_factor, modes=REPORT_MODES)
+    for row in modes:
+        row["projected_bytes"] = row["bytes_per_vector"] * total_chunks
+    index_sizes = db.execute(text(
+        "SELECT indexname, pg_relation_size(indexname::regclass) AS bytes FROM pg_indexes "
+        "WHERE tablename = :table AND indexname LIKE 'ix_documentchunks_chunk_embedding_%'"
+    ), {"table": models.DocumentChunk.__tablename__}).all()
+    return {
+        "chunks": total_chunks,
+        "sampled": len(embeddings) - queries,
+        "queries": queries,
+        "k": k,
+        "rerank_factor": rerank_factor,
+        "modes": modes,
+        "index_bytes": {row.indexname: row.bytes for row in index_sizes},
+    }
+
+
+def pgvector_version(db) -> tuple[int, int]:
+    global _pgvector_version
+    if _pgvector_version is None:
+        version = db.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+        _pgvector_version = tuple(int(part) for part in version.split(".")[:2]) if version else (0, 0)
+    return _pgvector_version
+
+
+def set_search_params(db, ef_search: int = None, probes: int = None, iterative_scan: str = None):
+    """
+    Set ef_search, probes and, on pgvector 0.8+, the iterative scan mode for the current transaction only.
+    With "relaxed_order" rows can come back slightly out of order, so callers must re-sort them by distance.
+    """
+    if ef_search:
+        db.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(int(ef_search))})
+    if probes:
+        db.execute(text("SELECT set_config('ivfflat.probes', :value, true)"), {"value": str(int(probes))})
+    if iterative_scan and iterative_scan != "off" and pgvector_version(db) >= (0, 8):
+        db.execute(text("SELECT set_config('hnsw.iterative_scan', :value, true)"), {"value": iterative_scan})
+        # IVFFlat only supports relaxed ordering
+        db.execute(text("SELECT set_config('ivfflat.iterative_scan', 'relaxed_order', true)"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the vector indexes on documentchunks.chunk_embedding.")
+    parser.add_argument("command", choices=["create", "reindex", "rebuild", "report"])
+    parser.add_argument("--type", choices=INDEX_TYPES + ("all",), default=None,
+                        help="Index type to operate on. Defaults to settings.vector_index_type.")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default=None,
+                        help="Representation the index is built on. Defaults to settings.embedding_quantization.")
+    parser.add_argument("--chatbot-id", default=None, help="report: only sample this chatbot's chunks.")
+    parser.add_argument("--sample", type=int, default=2000, help="report: number of embeddings searched.")
+    parser.add_argument("--queries", type=int, default=100, help="report: number of held-out query embeddings.")
+    args = parser.parse_args()
+
+    from .database import engine, SessionLocal
+    if args.command == "report":
+        db = SessionLocal()
+        try:
+            report = quantization_report(db, chatbot_id=args.chatbot_id, sample=args.sample, queries=args.queries)
+        finally:
+            db.close()
+        print(f"> {report['chunks']} chunks, {report['sampled']} sampled, {report['queries']} queries, "
+              f"recall@{report['k']} with {report['k'] * report['rerank_factor']} candidates re-ranked")
+        print(f"{'mode':<10}{'bytes/vector':>14}{'memory':>10}{'projected MB':>15}{'coarse recall':>16}{'reranked recall':>18}")
+        for row in report["modes"]:
+            print(f"{row['mode']:<10}{row['bytes_per_vector']:>14}{row['memory_ratio']:>10.2%}"
+                  f"{row['projected_bytes'] / 2**20:>15.1f}{row['coarse_recall']:>16.3f}{row['reranked_recall']:>18.3f}")
+        for name, size in report["index_bytes"].items():
+            print(f"> {name}: {size / 2**20:.1f} MB")
+        return
+
+    if args.command == "create":
+        create_vector_indexes(engine, args.type, args.quantization)
+    elif args.command == "reindex":
+        reindex_vector_indexes(engine, args.type, args.quantization)
+    elif args.command == "rebuild":
+        rebuild_vector_indexes(engine, args.type, args.quantization)
+    print(f"> {args.command} finished for: {', '.join(index_name(t, args.quantization) for t in configured_index_types(args.type))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+# settings are read from the environment on import; these only fill in what the environment does not set
+for name, value in {
+    "db_hostname": "localhost", "db_port": "5432", "db_name": "veevee", "db_username": "veevee", "db_password": "veevee",
+    "secret_key": "test-secret", "algorithm": "HS256", "access_token_expire_minutes": "10",
+    "hf_token": "", "default_hf_model": "test", "inference_provider": "ollama", "default_ollama_model": "test",
+    "inference_url": "http://localhost:11434", "chunk_size": "500", "num_context_chunks": "5",
+    "preload_embedding_model": "false", "ingest_workers": "0",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The configured Postgres database with the schema in place; tests that need it are skipped without one."""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from app import models
+    from app.database import engine
+    from app.migrations import run_migrations
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    except OperationalError as e:
+        pytest.skip(f"No database available: {e.orig}")
+    models.Base.metadata.create_all(engine)
+    run_migrations(engine)
+    return engine
@@ -0,0 +1,121 @@
+"""
+Tests of the app built with database_mode="async". The tests marked with the database fixture need Postgres;
+the others are answered before a query is sent, and async sessions only connect on their first query.
+"""
+import importlib
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from app import dependencies, models, schemas
+from app.config import settings
+from app.user_cache import user_cache
+
+
+@pytest.fixture(scope="module")
+def async_app():
+    import app.main
+
+    previous_mode = settings.database_mode
+    settings.database_mode = "async"
+    try:
+        yield importlib.reload(app.main).app
+    finally:
+        settings.database_mode = previous_mode
+        importlib.reload(app.main)
+
+
+@pytest.fixture
+def client(async_app):
+    # not used as a context manager, so the lifespan (migrations, model preloading) does not run
+    return TestClient(async_app)
+
+
+def bearer(user) -> dict:
+    token = dependencies.create_access_token({"sub": str(user.user_id), "username": user.username, "issued_at": int(time.time())})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def auth_headers():
+    # the user is served from the user cache, so routes that resolve the current user do not query for it
+    user = user_cache.put(schemas.User(
+        user_id=uuid.uuid4(), username="smoke", is_active=True, role="user", created_at=datetime.now(timezone.utc),
+    ))
+    yield bearer(user)
+    user_cache.invalidate(user.user_id)
+
+
+@pytest.fixture
+def db_user(database):
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        user = models.User(username=f"aio-{uuid.uuid4()}", password="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    return user
+
+
+def api_routes(app) -> dict:
+    return {(route.path, method): route for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+
+
+def test_no_route_is_registered_twice(async_app):
+    counts = Counter(
+        (route.path, method) for route in async_app.routes if isinstance(route, APIRoute) for method in route.methods
+    )
+    assert [key for key, count in counts.items() if count > 1] == []
+
+
+def test_database_routes_are_served_by_async_handlers(async_app):
+    routes = api_routes(async_app)
+    assert routes[("/chatbots/", "GET")].endpoint.__module__ == "app.routers.aio.chatbots"
+    assert routes[("/conversations/{conversation_id}/messages", "GET")].endpoint.__module__ == "app.routers.aio.conversations"
+    # routes that call synchronous components stay on the sync engine
+    assert routes[("/conversations/{conversation_id}/chat", "POST")].endpoint.__module__ == "app.routers.conversations"
+
+
+def test_async_route_handles_a_request(client, auth_headers):
+    response = client.get("/chatbots/", params={"fields": "not_a_field"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_async_route_validates_page_limit(client, auth_headers):
+    response = client.get(f"/conversations/{uuid.uuid4()}/messages", params={"limit": 0}, headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_async_route_requires_authentication(client):
+    assert client.get("/chatbots/").status_code == 401
+
+
+def test_async_routes_return_created_rows(async_app, db_user):
+    headers = bearer(db_user)
+    now = datetime.now(timezone.utc).isoformat()
+    # the client is entered so every request runs on the same event loop as the async engine's pool
+    with TestClient(async_app) as client:
+        chatbot_id = str(uuid.uuid4())
+        response = client.post("/chatbots/", headers=headers, json={
+            "chatbot_id": chatbot_id, "chatbot_name": "aio", "description": "", "model_name": "test",
+            "owner_id": str(db_user.user_id), "created_at": now, "configuration": {},
+        })
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["chatbot_id"] == chatbot_id
+        assert body["is_active"] is True and body["configuration"] == {}
+
+        conversation_id = str(uuid.uuid4())
+        response = client.post("/conversations/", headers=headers, json={
+            "conversation_id": conversation_id, "user_id": str(db_user.user_id), "chatbot_id": chatbot_id, "start_time": now,
+        })
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["conversation_id"] == conversation_id
+        assert body["summary"] is None and body["messages"] == []
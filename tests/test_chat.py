@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.chat import DEFAULT_MAX_RESPONSE_TOKENS, assemble_prompt, message_tokens, prompt_token_budget
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def budget_settings(monkeypatch):
+    monkeypatch.setattr(settings, "default_context_window", 4096)
+    monkeypatch.setattr(settings, "prompt_token_margin", 0.25)
+    monkeypatch.setattr(settings, "prompt_token_budget", 0)
+
+
+def chatbot(**configuration):
+    return SimpleNamespace(configuration=configuration)
+
+
+def message(role: str, text: str) -> dict:
+    return {"role": role, "message_text": text}
+
+
+def test_prompt_token_budget_leaves_room_for_the_response():
+    assert prompt_token_budget(chatbot()) == 3072 - DEFAULT_MAX_RESPONSE_TOKENS
+    assert prompt_token_budget(chatbot(context_window=8192, max_response_tokens=1000)) == 6144 - 1000
+
+
+def test_prompt_token_budget_is_capped(monkeypatch):
+    assert prompt_token_budget(chatbot(prompt_token_budget=500)) == 500
+    monkeypatch.setattr(settings, "prompt_token_budget", 700)
+    assert prompt_token_budget(chatbot()) == 700
+    assert prompt_token_budget(chatbot(max_response_tokens=5000)) == 0
+
+
+def test_everything_fits_a_large_budget():
+    history = [message("user", "Hello."), message("assistant", "Hi, how can I help?")]
+    chunks = [{"chunk_id": 1, "chunk_text": "Some context."}]
+    prompt, report = assemble_prompt(history, "A question?", chunks, 10_000, summary="Earlier talk.")
+    assert [m["role"] for m in prompt] == ["user", "user", "assistant", "user", "user"]
+    assert prompt[-1]["content"] == "A question?"
+    assert report["summary"] and report["context_chunks"] == 1 and report["history_messages"] == 2
+    assert not report["over_budget"] and report["estimated_tokens"] <= 10_000
+
+
+def test_oldest_history_is_dropped_first():
+    history = [message("user", f"Message number {i} " + "x" * 40) for i in range(10)]
+    budget = message_tokens("Now?") + 3 * message_tokens(history[0]["message_text"])
+    prompt, report = assemble_prompt(history, "Now?", [], budget)
+    assert [m["content"] for m in prompt[:-1]] == [m["message_text"] for m in history[-3:]]
+    assert report["dropped_history_messages"] == 7 and report["estimated_tokens"] <= budget
+
+
+def test_context_is_kept_before_history_and_summary():
+    chunk = {"chunk_id": "c1", "chunk_text": "Context " * 20}
+    _, full = assemble_prompt([], "Q?", [chunk], 10_000)
+    budget = full["estimated_tokens"]
+    prompt, report = assemble_prompt([message("user", "Old message.")], "Q?", [chunk, {"chunk_id": "c2", "chunk_text": "More " * 50}],
+                                     budget, summary="A summary.")
+    assert report["context_chunks"] == 1 and report["dropped_chunk_ids"] == ["c2"]
+    assert not report["summary"] and report["history_messages"] == 0
+    assert "Context" in prompt[0]["content"]
+
+
+def test_system_role_is_used_when_allowed():
+    prompt, _ = assemble_prompt([], "Q?", [], 1000, system_context_allowed=True)
+    assert prompt == [{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": "Q?"}]
+
+
+def test_over_budget_is_reported():
+    _, report = assemble_prompt([], "A long question " * 50, [], 10)
+    assert report["over_budget"]
@@ -0,0 +1,78 @@
+import pytest
+
+from app import chunking
+from app.chunking import estimate_tokens, iter_chunks, regex_split_sentences
+
+
+def count_words(texts: list[str]) -> list[int]:
+    return [len(t.split()) for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def regex_splitter(monkeypatch):
+    # the result must not depend on whether NLTK is installed
+    monkeypatch.setattr(chunking, "_splitter", regex_split_sentences)
+
+
+def chunks(segments, **kwargs) -> list[tuple[str, dict]]:
+    kwargs.setdefault("max_chars", 10_000)
+    kwargs.setdefault("overlap_sentences", 0)
+    return list(iter_chunks(segments, token_counter=count_words, **kwargs))
+
+
+def test_regex_splitter_handles_quotes_and_cjk():
+    assert regex_split_sentences('He said "stop." Then he left! Did he?') == ['He said "stop."', "Then he left!", "Did he?"]
+    assert regex_split_sentences("今日は晴れ。明日は雨。") == ["今日は晴れ。", "明日は雨。"]
+
+
+def test_sentences_are_packed_up_to_the_token_budget():
+    result = chunks(["One two three. Four five six. Seven eight nine."], max_tokens=6)
+    assert [text for text, _ in result] == ["One two three. Four five six.", "Seven eight nine."]
+
+
+def test_character_budget_applies_as_well():
+    result = chunks(["Aaaa. Bbbb. Cccc."], max_tokens=100, max_chars=11)
+    assert [text for text, _ in result] == ["Aaaa. Bbbb.", "Cccc."]
+    assert chunks(["Exactly eleven."], max_tokens=100, max_chars=15) == [("Exactly eleven.", {})]
+
+
+def test_overlap_repeats_trailing_sentences():
+    result = chunks(["A b. C d. E f."], max_tokens=4, overlap_sentences=1)
+    assert [text for text, _ in result] == ["A b. C d.", "C d. E f."]
+
+
+def test_overlap_is_dropped_when_it_leaves_no_room():
+    result = chunks(["A b. C d e f."], max_tokens=4, overlap_sentences=1)
+    assert [text for text, _ in result] == ["A b.", "C d e f."]
+
+
+def test_long_sentences_are_split_to_fit():
+    sentence = " ".join(f"w{i}" for i in range(25)) + "."
+    result = chunks([sentence], max_tokens=10)
+    assert all(count_words([text])[0] <= 10 for text, _ in result)
+    assert " ".join(text for text, _ in result) == sentence
+
+
+def test_page_metadata_spans_segments():
+    result = chunks([("First page. Still first.", {"page": 1}), ("Second page.", {"page": 2})], max_tokens=6)
+    assert result == [
+        ("First page. Still first. Second page.", {"page_start": 1, "page_end": 2}),
+    ]
+    assert chunks([("Plain text.", None)], max_tokens=6) == [("Plain text.", {})]
+
+
+def test_segments_are_consumed_lazily():
+    consumed = []
+
+    def segments():
+        for i in range(3):
+            consumed.append(i)
+            yield f"Segment {i} has five words."
+
+    iterator = iter_chunks(segments(), max_tokens=5, max_chars=1000, overlap_sentences=0, token_counter=count_words)
+    assert next(iterator)[0] == "Segment 0 has five words."
+    assert consumed == [0, 1]
+
+
+def test_estimate_tokens_counts_non_ascii_characters():
+    assert estimate_tokens(["abcdefgh", "今日は"]) == [3, 4]
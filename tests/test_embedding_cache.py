@@ -0,0 +1,77 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from app import models
+from app.embedding_cache import EmbeddingCache, content_hash
+
+
+class Encoder:
+    """Stands in for the embedding model, recording the texts of every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+
+def test_content_hash_ignores_whitespace_and_unicode_form():
+    assert content_hash("  café\n\tau lait ") == content_hash("café au lait")
+    assert content_hash("a b") != content_hash("ab")
+
+
+def test_only_uncached_texts_are_computed_once_each():
+    cache, encode = EmbeddingCache(10), Encoder()
+    first = cache.get_or_compute("m", ["aa", "b", "aa"], encode)
+    assert encode.calls == [["aa", "b"]]
+    assert first.shape == (3, 2) and np.array_equal(first[0], first[2])
+    second = cache.get_or_compute("m", ["b", "ccc"], encode)
+    assert encode.calls[1] == ["ccc"] and np.array_equal(second[0], first[1])
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 4
+
+
+def test_models_do_not_share_entries():
+    cache, encode = EmbeddingCache(10), Encoder()
+    cache.get_or_compute("m1", ["a"], encode)
+    cache.get_or_compute("m2", ["a"], encode)
+    assert len(encode.calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, encode = EmbeddingCache(2), Encoder()
+    cache.get_or_compute("m", ["a", "b"], encode)
+    cache.get_or_compute("m", ["a"], encode)
+    cache.get_or_compute("m", ["c"], encode)
+    cache.get_or_compute("m", ["a", "b"], encode)
+    assert encode.calls[-1] == ["b"]
+    assert cache.stats()["evictions"] == 2 and cache.stats()["memory_entries"] == 2
+
+
+@pytest.fixture
+def db(database):
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        yield session
+        session.rollback()
+
+
+def test_persistent_tier_serves_other_processes_without_committing_the_caller(db):
+    model_name = f"test-{uuid.uuid4()}"
+    encode = Encoder()
+    username = f"cache-{uuid.uuid4()}"
+    db.add(models.User(username=username, password="x"))
+    db.flush()
+    EmbeddingCache(10).get_or_compute(model_name, ["persisted"], encode, db=db)
+    # the cache write does not commit the caller's pending user row
+    db.rollback()
+    assert db.query(models.User).filter(models.User.username == username).first() is None
+    fresh = EmbeddingCache(10)
+    embedding = fresh.get_or_compute(model_name, ["persisted"], encode, db=db)
+    assert len(encode.calls) == 1 and embedding[0].tolist() == [9, 0]
+    assert fresh.stats()["persistent_hits"] == 1
+    db.query(models.EmbeddingCacheEntry).filter(models.EmbeddingCacheEntry.model_name == model_name).delete()
+    db.commit()
@@ -0,0 +1,78 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app import schemas
+from app.config import settings
+from app.embedding_transport import (
+    BASE64_JSON, DTYPE, EMBEDDING_DIMENSION, JSON, MSGPACK, NPY,
+    decode_embedding, embeddings_response, encode_base64, negotiate,
+)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("application/x-npy", NPY),
+    ("application/json;q=0.5, application/x-npy", NPY),
+    ("application/x-npy;q=0.2, application/vnd.veevee.base64+json;q=0.9", BASE64_JSON),
+    ("application/x-msgpack", MSGPACK),
+    ("text/html, */*;q=0.1", JSON),
+    ("application/x-npy;q=0, application/json", JSON),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_negotiate_rejects_unsupported_types():
+    with pytest.raises(HTTPException) as e:
+        negotiate("text/html")
+    assert e.value.status_code == 406
+    with pytest.raises(HTTPException):
+        negotiate("application/x-npy", supported=(JSON, BASE64_JSON))
+
+
+def test_decode_round_trips_base64_and_bytes():
+    embedding = np.linspace(-1, 1, 8, dtype=np.float32)
+    assert np.array_equal(decode_embedding(encode_base64(embedding)), embedding)
+    assert np.array_equal(decode_embedding(embedding.astype(DTYPE).tobytes()), embedding)
+    assert np.array_equal(decode_embedding(embedding.tolist()), embedding)
+    assert decode_embedding(None) is None
+
+
+def test_embedding_schema_accepts_lists_and_base64():
+    embedding = np.ones(EMBEDDING_DIMENSION, dtype=np.float32)
+    from_json = schemas.ChunkEmbedding.model_validate_json(json.dumps({"chunk_text": "a", "chunk_embedding": embedding.tolist()}))
+    assert from_json.chunk_embedding == embedding.tolist()
+    assert schemas.ChunkEmbedding(chunk_text="a", chunk_embedding=encode_base64(embedding)).chunk_embedding
+
+
+@pytest.mark.parametrize("embedding", [
+    [1.0] * 3,
+    [None] + [1.0] * (EMBEDDING_DIMENSION - 1),
+    ["a"] * EMBEDDING_DIMENSION,
+    [[1.0] * EMBEDDING_DIMENSION],
+    "not base64",
+    encode_base64(np.ones(3)),
+])
+def test_embedding_schema_rejects_malformed_embeddings(embedding):
+    with pytest.raises(ValueError):
+        schemas.ChunkEmbedding(chunk_text="a", chunk_embedding=embedding)
+
+
+def test_npy_response_carries_the_matrix():
+    matrix = np.arange(6, dtype=np.float32).reshape(2, 3)
+    response = embeddings_response(NPY, "model", matrix)
+    assert response.headers["X-Embedding-Model"] == "model"
+    assert np.array_equal(np.load(io.BytesIO(response.body)), matrix)
+
+
+def test_embed_request_is_bounded():
+    schemas.EmbedRequest(texts=["a"] * settings.embed_max_texts)
+    with pytest.raises(ValueError):
+        schemas.EmbedRequest(texts=["a"] * (settings.embed_max_texts + 1))
+    with pytest.raises(ValueError):
+        schemas.EmbedRequest(texts=["a" * (settings.embed_max_text_chars + 1)])
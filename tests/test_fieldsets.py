@@ -0,0 +1,38 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app import models, schemas
+from app.fieldsets import default_fields, fieldset_response, parse_fields, selected_columns
+
+
+def test_default_fields_exclude_heavy_fields():
+    fields = default_fields(schemas.Chatbot, exclude=["configuration"])
+    assert "configuration" not in fields and "chatbot_name" in fields
+
+
+def test_parse_fields_defaults_when_absent():
+    assert parse_fields(None, schemas.Chatbot, ["chatbot_id"]) == ["chatbot_id"]
+
+
+def test_parse_fields_keeps_request_order_without_duplicates():
+    assert parse_fields(" chatbot_name, chatbot_id,chatbot_name,", schemas.Chatbot, []) == ["chatbot_name", "chatbot_id"]
+
+
+@pytest.mark.parametrize("fields", ["not_a_field", "chatbot_id,password", "", " , "])
+def test_parse_fields_rejects_unknown_or_empty_fields(fields):
+    with pytest.raises(HTTPException) as e:
+        parse_fields(fields, schemas.Chatbot, [])
+    assert e.value.status_code == 400
+
+
+def test_selected_columns_always_include_keys():
+    columns = selected_columns(models.Chatbot, ["chatbot_name", "messages"], "chatbot_id")
+    assert [column.key for column in columns] == ["chatbot_id", "chatbot_name"]
+
+
+def test_fieldset_response_keeps_only_requested_fields():
+    rows = [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
+    assert json.loads(fieldset_response(rows, ["b"]).body) == [{"b": 2}, {"b": 4}]
+    assert json.loads(fieldset_response(rows, ["a"], single=True).body) == {"a": 1}
@@ -0,0 +1,100 @@
+import io
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app import ingestion, models
+from app.config import settings
+
+
+@pytest.fixture
+def db(database):
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def chatbot(db):
+    user = models.User(username=f"ingest-{uuid.uuid4()}", password="x")
+    db.add(user)
+    db.flush()
+    chatbot = models.Chatbot(chatbot_name="ingest", description="", model_name="test", owner_id=user.user_id,
+                             created_at=datetime.now(timezone.utc), configuration={})
+    db.add(chatbot)
+    db.commit()
+    return chatbot
+
+
+@pytest.fixture
+def embed_batches(monkeypatch):
+    """Replace the embedding model with a constant vector and record the size of every batch."""
+    batches = []
+
+    def texts_to_embeddings(texts, db=None):
+        batches.append(len(texts))
+        return np.ones((len(texts), 768), dtype=np.float32)
+
+    monkeypatch.setattr(ingestion, "texts_to_embeddings", texts_to_embeddings)
+    monkeypatch.setattr(ingestion, "EMBED_BATCH", 4)
+    return batches
+
+
+def queue_text(db, chatbot, text: str, tmp_path) -> models.IngestionJob:
+    settings_dir = settings.ingest_spool_dir
+    settings.ingest_spool_dir = str(tmp_path)
+    try:
+        file_path = ingestion.spool_upload(io.BytesIO(text.encode("utf-8")), "notes.txt")
+    finally:
+        settings.ingest_spool_dir = settings_dir
+    return ingestion.enqueue_job(db, chatbot.owner_id, chatbot.chatbot_id, "notes.txt", file_path)
+
+
+def claim(db, job) -> models.IngestionJob:
+    claimed = ingestion.claim_job(db)
+    assert claimed is not None and claimed.job_id == job.job_id
+    return claimed
+
+
+def test_job_is_embedded_and_inserted_in_batches(db, chatbot, embed_batches, tmp_path):
+    text = " ".join(f"Sentence number {i} of the test document." for i in range(200))
+    job = claim(db, queue_text(db, chatbot, text, tmp_path))
+    ingestion.run_job(db, job)
+
+    db.refresh(job)
+    assert job.status == "succeeded"
+    chunks = db.query(models.DocumentChunk).filter(models.DocumentChunk.document_id == job.document_id).count()
+    assert chunks == sum(embed_batches) and max(embed_batches) == 4 and len(embed_batches) > 1
+    document = db.get(models.KnowledgeBaseDocument, job.document_id)
+    assert document.raw_text == text
+    assert document.document_metadata == {"pages": 1, "chunks": chunks}
+    assert job.progress["insert"]["done"] == chunks
+
+
+def test_requeued_job_is_not_inserted_by_the_old_attempt(db, chatbot, embed_batches, tmp_path, monkeypatch):
+    job = claim(db, queue_text(db, chatbot, "One sentence. Another sentence.", tmp_path))
+    job_id = job.job_id
+
+    def requeue_then_embed(texts, db=None):
+        from app.database import SessionLocal
+
+        with SessionLocal() as other:
+            other.get(models.IngestionJob, job_id).attempts += 1
+            other.commit()
+        return np.ones((len(texts), 768), dtype=np.float32)
+
+    monkeypatch.setattr(ingestion, "texts_to_embeddings", requeue_then_embed)
+    with pytest.raises(ingestion.JobLost):
+        ingestion.run_job(db, job)
+    db.rollback()
+    assert db.get(models.KnowledgeBaseDocument, job.document_id) is None
+
+
+def test_cancel_queued_job(db, chatbot, tmp_path):
+    job = queue_text(db, chatbot, "Never processed.", tmp_path)
+    ingestion.cancel_job(db, job)
+    assert job.status == "cancelled" and job.finished_at is not None
+    assert ingestion.claim_job(db) is None
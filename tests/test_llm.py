@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from app import llm
+from app.config import settings
+
+
+def hf_message(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def hf_delta(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def async_hf_service(monkeypatch, response):
+    service = llm.AsyncLLMService(model_name="test", inference_provider="huggingface")
+
+    async def chat_completion(**kwargs):
+        return response(kwargs["stream"])
+
+    monkeypatch.setattr(service.client, "chat_completion", chat_completion)
+    return service
+
+
+def test_async_generate_text_awaits_the_response(monkeypatch):
+    service = async_hf_service(monkeypatch, lambda stream: hf_message("done"))
+    assert asyncio.run(service.generate_text([{"role": "user", "content": "hi"}])) == "done"
+    assert service.stream is True
+
+
+def test_iter_text_skips_chunks_without_choices(monkeypatch):
+    async def chunks():
+        for chunk in (hf_delta("a"), SimpleNamespace(choices=[]), hf_delta("b")):
+            yield chunk
+
+    service = async_hf_service(monkeypatch, lambda stream: chunks())
+
+    async def collect():
+        return [text async for text in service.iter_text([{"role": "user", "content": "hi"}])]
+
+    assert asyncio.run(collect()) == ["a", "b"]
+
+
+def test_client_pool_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "llm_client_cache_size", 2)
+    monkeypatch.setattr(llm, "_clients", llm.OrderedDict())
+    first = llm.get_client("ollama", "http://one:11434", "m", None)
+    llm.get_client("ollama", "http://two:11434", "m", None)
+    assert llm.get_client("ollama", "http://one:11434", "m", None) is first
+    llm.get_client("ollama", "http://three:11434", "m", None)
+    assert [key[1] for key in llm._clients] == ["http://one:11434", "http://three:11434"]
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.quantization import REPORT_MODES, bytes_per_vector, coarse_similarities, quantize_int8, recall_report, top_k
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((300, 64)).astype(np.float32), rng.standard_normal((20, 64)).astype(np.float32)
+
+
+def test_bytes_per_vector():
+    assert [bytes_per_vector(mode, 768) for mode in REPORT_MODES] == [3072, 1536, 772, 96]
+    with pytest.raises(ValueError):
+        bytes_per_vector("int4", 768)
+
+
+def test_top_k_orders_by_similarity():
+    similarities = np.array([[0.1, 0.9, 0.5, 0.7]])
+    assert top_k(similarities, 3).tolist() == [[1, 3, 2]]
+    assert top_k(similarities, 10).tolist() == [[1, 3, 2, 0]]
+
+
+def test_int8_codes_round_trip_within_one_step():
+    matrix = np.array([[0.5, -1.0, 0.25], [0, 0, 0]], dtype=np.float32)
+    codes, scales = quantize_int8(matrix)
+    assert codes.dtype == np.int8 and codes[0].tolist() == [64, -127, 32]
+    assert np.allclose(codes * scales, matrix, atol=scales.max())
+
+
+def test_binary_similarity_counts_matching_signs():
+    corpus = np.array([[1, -1, 1, -1], [-1, -1, -1, -1]], dtype=np.float32)
+    assert coarse_similarities(corpus, np.array([[1, -1, 1, 1]], dtype=np.float32), "binary").tolist() == [[3, 1]]
+
+
+def test_recall_report(embeddings):
+    corpus, queries = embeddings
+    report = {row["mode"]: row for row in recall_report(corpus, queries, k=5, rerank_factor=4)}
+    assert list(report) == list(REPORT_MODES)
+    assert report["none"]["coarse_recall"] == report["none"]["reranked_recall"] == 1.0
+    assert report["halfvec"]["reranked_recall"] == 1.0
+    assert report["binary"]["memory_ratio"] == round(8 / 256, 4)
+    for row in report.values():
+        assert row["coarse_recall"] <= row["reranked_recall"] <= 1.0
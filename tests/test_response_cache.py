@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+
+from app import response_cache as response_cache_module
+from app.response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def chatbot_id():
+    return uuid.uuid4()
+
+
+def store(cache, chatbot_id, embedding, answer, version=1):
+    cache.store(chatbot_id, "model", version, embedding, f"question for {answer}", answer, ["c1"])
+
+
+def test_similar_question_is_a_hit(chatbot_id, clock):
+    cache = ResponseCache(10, 60)
+    store(cache, chatbot_id, [1, 0], "east")
+    store(cache, chatbot_id, [0, 1], "north")
+    hit = cache.lookup(chatbot_id, "model", 1, [0.99, 0.05], similarity=0.95)
+    assert hit["answer"] == "east" and hit["context_chunk_ids"] == ["c1"] and hit["similarity"] > 0.95
+    assert cache.lookup(chatbot_id, "model", 1, [1, 1], similarity=0.95) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_buckets_are_separate(chatbot_id, clock):
+    cache = ResponseCache(10, 60)
+    store(cache, chatbot_id, [1, 0], "east", version=1)
+    assert cache.lookup(chatbot_id, "model", 2, [1, 0], similarity=0.9) is None
+    assert cache.lookup(chatbot_id, "other-model", 1, [1, 0], similarity=0.9) is None
+    assert cache.lookup(uuid.uuid4(), "model", 1, [1, 0], similarity=0.9) is None
+
+
+def test_least_recently_used_entry_is_evicted(chatbot_id, clock):
+    cache = ResponseCache(2, 60)
+    store(cache, chatbot_id, [1, 0, 0], "a")
+    store(cache, chatbot_id, [0, 1, 0], "b")
+    assert cache.lookup(chatbot_id, "model", 1, [1, 0, 0], similarity=0.9)["answer"] == "a"
+    store(cache, chatbot_id, [0, 0, 1], "c")
+    assert cache.lookup(chatbot_id, "model", 1, [0, 1, 0], similarity=0.9) is None
+    assert cache.lookup(chatbot_id, "model", 1, [1, 0, 0], similarity=0.9)["answer"] == "a"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["entries"] == 2
+
+
+def test_entries_expire(chatbot_id, clock):
+    cache = ResponseCache(10, 60)
+    store(cache, chatbot_id, [1, 0], "a")
+    clock.now += 30
+    # a shorter per-chatbot TTL hides the entry without dropping it
+    assert cache.lookup(chatbot_id, "model", 1, [1, 0], similarity=0.9, ttl_seconds=10) is None
+    assert cache.lookup(chatbot_id, "model", 1, [1, 0], similarity=0.9) is not None
+    clock.now += 31
+    assert cache.lookup(chatbot_id, "model", 1, [1, 0], similarity=0.9) is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_every_bucket_of_a_chatbot(chatbot_id, clock):
+    cache = ResponseCache(10, 60)
+    other = uuid.uuid4()
+    store(cache, chatbot_id, [1, 0], "a", version=1)
+    store(cache, chatbot_id, [1, 0], "b", version=2)
+    store(cache, other, [1, 0], "c")
+    cache.invalidate(chatbot_id)
+    assert cache.stats()["entries"] == 1 and cache.stats()["invalidations"] == 2
+    assert cache.lookup(other, "model", 1, [1, 0], similarity=0.9)["answer"] == "c"
@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app import schemas
+from app import user_cache as user_cache_module
+from app.user_cache import UserCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(user_cache_module.time, "monotonic", clock)
+    return clock
+
+
+def make_user(username: str = "alice") -> schemas.User:
+    return schemas.User(user_id=uuid.uuid4(), username=username, is_active=True, role="user", created_at=datetime.now(timezone.utc))
+
+
+def test_put_returns_a_snapshot_that_is_served_by_id(clock):
+    cache = UserCache(10, 60)
+    user = cache.put(make_user())
+    assert cache.get(user.user_id) == user
+    assert cache.get(str(user.user_id)) == user
+    assert cache.get(uuid.uuid4()) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_user_is_evicted(clock):
+    cache = UserCache(2, 60)
+    first, second, third = make_user("a"), make_user("b"), make_user("c")
+    cache.put(first)
+    cache.put(second)
+    cache.get(first.user_id)
+    cache.put(third)
+    assert cache.get(second.user_id) is None
+    assert cache.get(first.user_id) is not None and cache.get(third.user_id) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire(clock):
+    cache = UserCache(10, 60)
+    user = cache.put(make_user())
+    clock.now += 60
+    assert cache.get(user.user_id) is not None
+    clock.now += 1
+    assert cache.get(user.user_id) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate(clock):
+    cache = UserCache(10, 60)
+    user = cache.put(make_user())
+    cache.invalidate(user.user_id)
+    cache.invalidate(user.user_id)
+    assert cache.get(user.user_id) is None and cache.stats()["invalidations"] == 1
+
+
+@pytest.mark.parametrize("max_entries, ttl_seconds", [(0, 60), (10, 0)])
+def test_disabled_cache_stores_nothing(clock, max_entries, ttl_seconds):
+    cache = UserCache(max_entries, ttl_seconds)
+    user = cache.put(make_user())
+    assert cache.get(user.user_id) is None and cache.stats()["entries"] == 0